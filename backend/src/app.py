@@ -1,9 +1,11 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, g
 from backend.src.middlewares.auth_middleware import auth_middleware
 from backend.src.middlewares.validation_middleware import validation_middleware
 from backend.src.routes.payment_routes import payment_routes
 from backend.src.routes.subscription_routes import subscription_routes
 from backend.src.config.database_config import setup_database
+from backend.src.models.identity_map import begin_unit_of_work, end_unit_of_work
+from billing.usage.usage_ingestion import start_usage_aggregation
 from backend.src.config.env_config import load_env_variables
 from backend.src.utils.jwt_util import create_jwt_token, decode_jwt_token
 from backend.src.utils.email_util import send_email_notification
@@ -19,6 +21,9 @@ load_env_variables()
 # Database setup
 setup_database()
 
+# Flush metered usage reported through the API into usage_aggregates in the background
+start_usage_aggregation()
+
 # Configure logging
 dictConfig({
     'version': 1,
@@ -46,6 +51,17 @@ app.register_blueprint(payment_routes, url_prefix='/api/payments')
 # Register routes for subscriptions
 app.register_blueprint(subscription_routes, url_prefix='/api/subscriptions')
 
+# Request-scoped identity map so repeated model lookups within a request hit memory
+@app.before_request
+def open_unit_of_work():
+    g.unit_of_work_token = begin_unit_of_work()
+
+@app.teardown_request
+def close_unit_of_work(error=None):
+    token = g.pop('unit_of_work_token', None)
+    if token is not None:
+        end_unit_of_work(token)
+
 # Middleware for Authentication
 @app.before_request
 def apply_auth_middleware():
@@ -0,0 +1,144 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Active unit of work for the current request/task (None outside of a scope)
+_current_unit_of_work = ContextVar('current_unit_of_work', default=None)
+
+
+class NoUnitOfWork(RuntimeError):
+    """Raised when a loader is needed outside of a unit_of_work() / request scope."""
+
+
+class ModelLoader:
+    """
+    Identity map for one model, keyed by a single column.
+    Rows are fetched at most once per unit of work; load_many batches every
+    missing key into one `IN (...)` query.
+
+    Keys are coerced to the column's Python type first, so '42' from a request
+    body and 42 from a foreign key share one entry. Keys that cannot be coerced
+    can never match a row and load as None without being cached.
+    """
+
+    def __init__(self, session, model, key='id'):
+        self.session = session
+        self.model = model
+        self.key = key
+        self._cache = {}
+        try:
+            self._key_type = getattr(model, key).type.python_type
+        except (AttributeError, NotImplementedError):
+            self._key_type = None
+
+    def _coerce(self, key_value):
+        """The key as stored in the column, or None when it cannot be one."""
+        if key_value is None or self._key_type is None or isinstance(key_value, self._key_type):
+            return key_value
+        try:
+            return self._key_type(key_value)
+        except (TypeError, ValueError):
+            return None
+
+    def load(self, key_value):
+        return self.load_many([key_value])[key_value]
+
+    def load_many(self, key_values):
+        """Returns {key: instance or None} for every requested key, keyed as requested."""
+        coerced = {value: self._coerce(value) for value in key_values}
+        missing = [key for key in dict.fromkeys(coerced.values()) if key is not None and key not in self._cache]
+        if missing:
+            column = getattr(self.model, self.key)
+            for instance in self.session.query(self.model).filter(column.in_(missing)).all():
+                self._cache[getattr(instance, self.key)] = instance
+            for key in missing:
+                self._cache.setdefault(key, None)
+        return {value: None if key is None else self._cache[key] for value, key in coerced.items()}
+
+    def prime(self, instance):
+        """Registers an instance that was loaded or created elsewhere."""
+        self._cache[getattr(instance, self.key)] = instance
+
+    def clear(self, key_value=None):
+        if key_value is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self._coerce(key_value), None)
+
+
+class UnitOfWork:
+    """
+    Loaders shared by everything that runs inside one request or batch.
+    Without a session one is taken from the session factory and closed with the scope.
+    """
+
+    def __init__(self, session=None):
+        # Imported here so the loaders can be used without pulling in every model
+        from backend.src.models.payment_model import PaymentModel, UserModel
+
+        self.owns_session = session is None
+        if session is None:
+            from backend.src.config.database_config import get_session
+            session = get_session()
+        self.session = session
+
+        self.users = ModelLoader(session, UserModel)
+        self.users_by_stripe_id = ModelLoader(session, UserModel, key='stripe_customer_id')
+        self.subscriptions = ModelLoader(session, PaymentModel)
+        self.subscriptions_by_stripe_id = ModelLoader(session, PaymentModel, key='stripe_subscription_id')
+
+    def prime_user(self, user):
+        self.users.prime(user)
+        if getattr(user, 'stripe_customer_id', None):
+            self.users_by_stripe_id.prime(user)
+
+    def prime_subscription(self, subscription):
+        self.subscriptions.prime(subscription)
+        if getattr(subscription, 'stripe_subscription_id', None):
+            self.subscriptions_by_stripe_id.prime(subscription)
+
+    def close(self):
+        if self.owns_session:
+            self.session.close()
+
+
+def begin_unit_of_work(session=None):
+    """Opens a loader scope for the current context and returns the token that closes it."""
+    return _current_unit_of_work.set(UnitOfWork(session))
+
+
+def end_unit_of_work(token):
+    """Closes a scope opened with begin_unit_of_work, dropping its identity map."""
+    current = _current_unit_of_work.get()
+    _current_unit_of_work.reset(token)
+    if current is not None:
+        current.close()
+
+
+@contextmanager
+def unit_of_work(session=None):
+    """
+    Opens a loader scope. Nested calls reuse the outer scope, so a bulk operation
+    and the per-item methods it calls share the same identity map.
+    """
+    current = _current_unit_of_work.get()
+    if current is not None:
+        yield current
+        return
+
+    token = begin_unit_of_work(session)
+    try:
+        yield _current_unit_of_work.get()
+    finally:
+        end_unit_of_work(token)
+
+
+def current_unit_of_work():
+    """
+    Returns the active unit of work. Outside of a request or unit_of_work() scope
+    this raises NoUnitOfWork instead of handing out a throwaway identity map that
+    would silently re-query every lookup.
+    """
+    current = _current_unit_of_work.get()
+    if current is None:
+        raise NoUnitOfWork("No unit of work is active; wrap the call in unit_of_work()")
+    return current
@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import Column, BigInteger, Integer, String, Text, DateTime, Index
+from backend.src.models.payment_model import Base
+
+
+class EmailOutboxModel(Base):
+    __tablename__ = 'email_outbox'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    recipient = Column(String(255), nullable=False)
+    subject = Column(String(255), nullable=False)
+    payload = Column(Text, nullable=False)
+    # pending -> sending (claimed by a dispatcher) -> sent, or back to pending / dead on failure
+    status = Column(String(20), nullable=False, default='pending')
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    claimed_at = Column(DateTime, nullable=True)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_email_outbox_status_created_at', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f"<EmailOutbox(id={self.id}, recipient={self.recipient}, subject={self.subject}, status={self.status})>"
@@ -19,6 +19,7 @@ class PaymentModel(Base):
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
     is_refunded = Column(Boolean, default=False)
     refund_amount = Column(Float, default=0.0)
+    stripe_subscription_id = Column(String(255), nullable=True, unique=True)
 
     user = relationship('UserModel', back_populates='payments')
     payment_method = relationship('PaymentMethodModel', back_populates='payments')
@@ -62,6 +63,7 @@ class PaymentMethodModel(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    user = relationship('UserModel', back_populates='payment_methods')
     payments = relationship('PaymentModel', back_populates='payment_method')
 
     def __repr__(self):
@@ -74,6 +76,7 @@ class UserModel(Base):
     name = Column(String(50), nullable=False)
     email = Column(String(100), nullable=False, unique=True)
     password_hash = Column(String(100), nullable=False)
+    stripe_customer_id = Column(String(255), nullable=True, unique=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     payments = relationship('PaymentModel', back_populates='user')
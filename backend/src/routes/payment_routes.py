@@ -1,10 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from backend.src.controllers.payment_controller import PaymentController
 from backend.src.middlewares.auth_middleware import token_required
 from backend.src.middlewares.validation_middleware import validate_request
 from backend.src.models.payment_model import PaymentModel
 from backend.src.utils.jwt_util import decode_token
 from backend.src.config.database_config import db_session
+from reporting.user_activity.statements import keyset_query, page_limit, stream_json_statement
 
 payment_routes = Blueprint('payment_routes', __name__)
 payment_controller = PaymentController()
@@ -37,26 +38,37 @@ def process_payment(current_user):
         return jsonify({'error': str(e)}), 500
 
 
-# Route for fetching payment history
+# Route for fetching payment history, newest first, one keyset page at a time: pass the
+# returned next_cursor as ?cursor= to fetch the following page
 @payment_routes.route('/api/v1/payment/history', methods=['GET'])
 @token_required
 def payment_history(current_user):
     try:
-        # Fetch the user's payment history from the database
-        payments = PaymentModel.query.filter_by(user_id=current_user.id).all()
-        if not payments:
-            return jsonify({'message': 'No payment history found'}), 404
+        cursor = request.args.get('cursor')
+        limit = page_limit(request.args.get('limit', type=int))
+        query = keyset_query(
+            PaymentModel.query.filter_by(user_id=current_user.id).with_entities(
+                PaymentModel.id, PaymentModel.amount, PaymentModel.status, PaymentModel.created_at
+            ),
+            PaymentModel, cursor, limit, descending=True
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        payment_list = []
-        for payment in payments:
-            payment_list.append({
-                'payment_id': payment.payment_id,
-                'amount': payment.amount,
-                'status': payment.status,
-                'created_at': payment.created_at
-            })
+    try:
+        # A page is at most limit + 1 rows: fetch and serialize it before answering, so a
+        # database error is a 500 rather than a truncated 200 body
+        payments = query.all()
+        if not payments and cursor is None:
+            return jsonify({'message': 'No payment history found'}), 404
 
-        return jsonify({'status': 'success', 'payments': payment_list}), 200
+        body = ''.join(stream_json_statement(payments, lambda payment: {
+            'payment_id': payment.id,
+            'amount': payment.amount,
+            'status': payment.status,
+            'created_at': payment.created_at.isoformat()
+        }, 'payments', limit))
+        return Response(body, status=200, mimetype='application/json')
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
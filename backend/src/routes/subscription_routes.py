@@ -5,8 +5,15 @@ from backend.src.middlewares.validation_middleware import validate_json
 from backend.src.utils.jwt_util import decode_token
 from backend.src.models.user_model import User
 from backend.src.config.database_config import db
+from billing.subscriptions.subscription_manager import get_invoice_preview_params, retrieve_subscription
+from billing.invoices.invoice_preview import invoice_preview_engine
+from billing.usage.usage_ingestion import (
+    usage_buffer, subscription_access_cache, validate_usage, MeterCatalog,
+    InvalidUsage, SubscriptionClosed, UsageBufferFull,
+)
 
 subscription_routes = Blueprint('subscription_routes', __name__)
+meter_catalog = MeterCatalog()
 
 def execute_subscription_service(command, *args):
     """
@@ -89,6 +96,7 @@ def update_subscription(subscription_id):
     
     try:
         output = execute_subscription_service('update', str(user_id), str(subscription_id), plan_id, payment_method)
+        invoice_preview_engine.invalidate(subscription_id)
         return jsonify({'message': 'Subscription updated successfully', 'output': output}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -104,6 +112,8 @@ def cancel_subscription(subscription_id):
     
     try:
         output = execute_subscription_service('cancel', str(user_id), str(subscription_id))
+        invoice_preview_engine.invalidate(subscription_id)
+        subscription_access_cache.invalidate(subscription_id)
         return jsonify({'message': 'Subscription cancelled successfully', 'output': output}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -118,11 +128,18 @@ def renew_subscription():
     """
     data = request.get_json()
     user_id = decode_token(request.headers['Authorization'])['user_id']
-    subscription_id = data['subscription_id']
     renewal_date = data['renewal_date']
+
+    try:
+        # Caches are keyed by the int ids of the <int:subscription_id> routes
+        subscription_id = int(data['subscription_id'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'subscription_id must be an integer'}), 400
     
     try:
         output = execute_subscription_service('renew', str(user_id), str(subscription_id), renewal_date)
+        invoice_preview_engine.invalidate(subscription_id)
+        subscription_access_cache.invalidate(subscription_id)
         return jsonify({'message': 'Subscription renewed successfully', 'output': output}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -147,12 +164,50 @@ def check_subscription_status(subscription_id):
 @token_required
 def get_upcoming_invoice(subscription_id):
     """
-    Get the upcoming invoice for a subscription
+    Get the upcoming invoice for a subscription.
+    Previews are memoized per subscription and recomputed only after the subscription
+    changes or tax rates are reloaded.
     """
     user_id = decode_token(request.headers['Authorization'])['user_id']
     
     try:
-        output = execute_subscription_service('invoice', str(user_id), str(subscription_id))
+        output = invoice_preview_engine.get_preview(
+            subscription_id,
+            user_id,
+            load_params=lambda: get_invoice_preview_params(user_id, subscription_id),
+            compute_preview=lambda params: execute_subscription_service('invoice', str(user_id), str(subscription_id)),
+        )
         return jsonify({'upcoming_invoice': output}), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@subscription_routes.route('/subscriptions/<int:subscription_id>/usage', methods=['POST'])
+@token_required
+@validate_json(['records'])
+def report_usage(subscription_id):
+    """
+    Report a batch of metered usage records for a subscription.
+    Records are appended to the in-memory usage buffer and aggregated before billing.
+    Ownership, status and the open billing period come from a short-lived cache that
+    subscription changes invalidate.
+    """
+    user_id = decode_token(request.headers['Authorization'])['user_id']
+    records = request.get_json()['records']
+
+    try:
+        open_since = subscription_access_cache.open_period_start(
+            user_id,
+            subscription_id,
+            load=lambda: retrieve_subscription(user_id, subscription_id),
+        )
+        usage_buffer.append_many(validate_usage(subscription_id, records, meter_catalog.names(), open_since))
+        return jsonify({'message': 'Usage recorded', 'accepted': len(records)}), 202
+    except InvalidUsage as e:
+        return jsonify({'error': str(e)}), 400
+    except SubscriptionClosed as e:
+        return jsonify({'error': str(e)}), 409
+    except UsageBufferFull as e:
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -4,9 +4,11 @@ import logging
 from threading import Thread
 from sqlalchemy import create_engine, text
 from billing.invoices.invoice_generator import InvoiceGenerator
-from billing.tax.tax_calculator import TaxCalculator
+from billing.tax.tax_calculator import TaxCalculator, reload_tax_rates
 from database.models.user import User
 from database.config.db_connections import DBSession
+from backend.src.models.identity_map import unit_of_work
+from billing.usage.usage_ingestion import get_usage_totals
 
 # Configure logging for billing scheduler
 logging.basicConfig(level=logging.INFO)
@@ -40,7 +42,9 @@ class BillingScheduler:
         while True:
             logger.info("Checking for subscriptions that need billing.")
             try:
-                self.process_billing_cycles()
+                # Each cycle gets its own identity map, so manager lookups made for it are batched
+                with unit_of_work(self.db_session):
+                    self.process_billing_cycles()
             except Exception as e:
                 logger.error(f"An error occurred during billing cycle processing: {e}")
             time.sleep(self.interval)
@@ -51,6 +55,8 @@ class BillingScheduler:
         It generates an invoice for any subscription whose next billing date is today or earlier.
         """
         current_date = datetime.datetime.utcnow().date()
+        # Pick up tax rate changes once per cycle; listeners such as the invoice preview cache are notified
+        reload_tax_rates()
         subscriptions = self.get_active_subscriptions(current_date)
 
         for subscription in subscriptions:
@@ -86,7 +92,10 @@ class BillingScheduler:
         try:
             user_id = subscription['user_id']
             plan_price = subscription['plan_price']
-            total_cost_with_tax = self.tax_calculator.calculate_tax(user_id, plan_price)
+            metered_cost = sum(
+                usage['quantity'] * usage['unit_price'] for usage in self.get_usage_totals(subscription)
+            )
+            total_cost_with_tax = self.tax_calculator.calculate_tax(user_id, plan_price + metered_cost)
 
             # Generate and save the invoice
             invoice = self.invoice_generator.create_invoice(user_id, subscription['id'], total_cost_with_tax)
@@ -96,6 +105,15 @@ class BillingScheduler:
         except Exception as e:
             logger.error(f"Error generating invoice for subscription {subscription['id']}: {e}")
 
+    def get_usage_totals(self, subscription):
+        """
+        Retrieves metered usage for the billing period that is being closed.
+        Reads the hourly pre-aggregated totals written by the UsageAggregator instead of raw events.
+        """
+        period_end = subscription['next_billing_date']
+        period_start = period_end - datetime.timedelta(days=30)
+        return get_usage_totals(self.db_session, subscription['id'], period_start, period_end)
+
     def update_billing_date(self, subscription):
         """
         Update the next billing date of the subscription after processing the current cycle.
@@ -0,0 +1,292 @@
+import time
+import random
+import logging
+from datetime import datetime, timedelta
+from threading import Thread, Event
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import text, bindparam
+from database.config.db_connections import DBSession
+from backend.src.models.identity_map import unit_of_work
+
+# Configure logging for dunning
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("DunningScheduler")
+
+# Default delay before each retry attempt (attempt 1 waits 1 day, attempt 2 waits 3 days, ...)
+DEFAULT_RETRY_BACKOFF = [timedelta(days=1), timedelta(days=3), timedelta(days=5), timedelta(days=7)]
+# Retries are spread +/- this many seconds around their nominal time
+DEFAULT_JITTER_SECONDS = 3600
+# Cap on gateway retries per second for one scheduler instance. Instances do not coordinate,
+# so with N of them running the gateway sees up to N times this rate: size it as the
+# fleet-wide budget divided by the number of instances
+DEFAULT_MAX_RETRIES_PER_SECOND = 20
+# Claimed schedules are pushed this far out; if the instance dies mid-batch they come due again after it
+DEFAULT_CLAIM_SECONDS = 900
+# Number of concurrent gateway calls inside one batch
+DEFAULT_GATEWAY_CONCURRENCY = 8
+# Hours from a schedule's creation to its recovery, per SQL dialect (interval arithmetic is not portable);
+# recovery_metrics reports no average on other databases
+HOURS_TO_RECOVER_SQL = {
+    'postgresql': "EXTRACT(EPOCH FROM (recovered_at - created_at)) / 3600",
+    'sqlite': "(julianday(recovered_at) - julianday(created_at)) * 24",
+    'mysql': "TIMESTAMPDIFF(SECOND, created_at, recovered_at) / 3600",
+}
+
+
+class DunningPolicy:
+    def __init__(self, backoff=None, jitter_seconds=DEFAULT_JITTER_SECONDS,
+                 max_retries_per_second=DEFAULT_MAX_RETRIES_PER_SECOND):
+        self.backoff = backoff or DEFAULT_RETRY_BACKOFF
+        self.jitter_seconds = jitter_seconds
+        self.max_retries_per_second = max_retries_per_second
+
+    @property
+    def max_attempts(self):
+        return len(self.backoff)
+
+    def next_retry_at(self, attempt, now=None):
+        """
+        Returns when the given attempt (1-based) should run.
+        A random offset is added so retries for failures that happened together do not
+        all land at the same instant.
+        """
+        now = now or datetime.utcnow()
+        jitter = random.uniform(-self.jitter_seconds, self.jitter_seconds)
+        delay = self.backoff[attempt - 1] + timedelta(seconds=jitter)
+        return now + max(delay, timedelta(0))
+
+
+class DunningScheduler:
+    def __init__(self, policy=None, interval=60, db_session=None, stripe_api=None,
+                 gateway_concurrency=DEFAULT_GATEWAY_CONCURRENCY, claim_seconds=DEFAULT_CLAIM_SECONDS):
+        """
+        Persists retry schedules for subscriptions whose payment failed and retries them
+        in rate-capped batches. Every `interval` seconds this instance attempts at most
+        `max_retries_per_second * interval` due retries; the cap is per instance.
+        """
+        self.policy = policy or DunningPolicy()
+        self.interval = interval
+        self.claim_seconds = claim_seconds
+        self.db_session = db_session or DBSession()
+        if stripe_api is None:
+            # Imported on demand: SubscriptionManager passes its own client
+            from payment_processing.payment_gateways.stripe_integration import StripeAPI
+            stripe_api = StripeAPI()
+        self.stripe_api = stripe_api
+        self.gateway_concurrency = gateway_concurrency
+        self.stop_event = Event()
+
+    def schedule_retry(self, subscription_id):
+        """
+        Opens (or keeps) a dunning schedule for a subscription after a failed payment.
+        Repeated failure notifications for an already scheduled subscription are ignored.
+        """
+        query = text("""
+            INSERT INTO dunning_schedules (subscription_id, attempt, next_retry_at, status, created_at, updated_at)
+            VALUES (:subscription_id, 1, :next_retry_at, 'scheduled', :now, :now)
+            ON CONFLICT (subscription_id) WHERE status = 'scheduled' DO NOTHING
+        """)
+        now = datetime.utcnow()
+        try:
+            self.db_session.execute(query, {
+                'subscription_id': subscription_id,
+                'next_retry_at': self.policy.next_retry_at(1, now),
+                'now': now
+            })
+            self.db_session.commit()
+            logger.info(f"Scheduled payment retry for subscription {subscription_id}")
+        except Exception as e:
+            self.db_session.rollback()
+            logger.error(f"Failed to schedule retry for subscription {subscription_id}: {e}")
+
+    def resolve_schedule(self, subscription_id):
+        """Closes an open schedule as recovered when the customer pays outside of dunning."""
+        query = text("""
+            UPDATE dunning_schedules
+            SET status = 'recovered', recovered_at = :now, updated_at = :now
+            WHERE subscription_id = :subscription_id AND status = 'scheduled'
+        """)
+        try:
+            self.db_session.execute(query, {'subscription_id': subscription_id, 'now': datetime.utcnow()})
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            logger.error(f"Failed to resolve dunning schedule for subscription {subscription_id}: {e}")
+
+    def start_scheduler(self):
+        """Starts the retry loop as a background thread."""
+        logger.info("Starting Dunning Scheduler")
+        scheduler_thread = Thread(target=self.run, daemon=True)
+        scheduler_thread.start()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            try:
+                # Each batch gets its own identity map, so manager lookups made for it are batched
+                with unit_of_work(self.db_session):
+                    self.process_due_retries()
+            except Exception as e:
+                logger.error(f"An error occurred during dunning retry processing: {e}")
+            self.stop_event.wait(max(0, self.interval - (time.monotonic() - started)))
+
+    def stop_scheduler(self):
+        logger.info("Stopping Dunning Scheduler")
+        self.stop_event.set()
+
+    def claim_due_retries(self, limit):
+        """
+        Claims up to `limit` due schedules, oldest first, and commits the claim.
+        SKIP LOCKED lets several scheduler instances share the queue without double retries;
+        the row locks only last for this short transaction. A claim moves next_retry_at
+        `claim_seconds` ahead, so the rows stay out of other instances' scans while this one
+        works through them without holding any lock.
+        """
+        now = datetime.utcnow()
+        claimed_until = now + timedelta(seconds=self.claim_seconds)
+        try:
+            due = self.db_session.execute(text("""
+                SELECT d.id, d.subscription_id, d.attempt, p.stripe_subscription_id
+                FROM dunning_schedules d
+                JOIN payments p ON p.id = d.subscription_id
+                WHERE d.status = 'scheduled' AND d.next_retry_at <= :now
+                ORDER BY d.next_retry_at
+                LIMIT :limit
+                FOR UPDATE OF d SKIP LOCKED
+            """), {'now': now, 'limit': limit}).mappings().all()
+            if due:
+                self.db_session.execute(text("""
+                    UPDATE dunning_schedules SET next_retry_at = :claimed_until, updated_at = :now
+                    WHERE id IN :ids
+                """).bindparams(bindparam('ids', expanding=True)), {
+                    'ids': [schedule['id'] for schedule in due],
+                    'claimed_until': claimed_until,
+                    'now': now
+                })
+            self.db_session.commit()
+        except Exception:
+            self.db_session.rollback()
+            raise
+        return [dict(schedule, claimed_until=claimed_until) for schedule in due]
+
+    def process_due_retries(self):
+        """
+        Retries one rate-capped batch of due schedules through the gateway.
+        The batch is claimed and committed first, gateway calls are paced on a small worker
+        pool with no transaction open, and the results are written back in one commit.
+
+        The gateway has no bulk renewal call (each retry is its own charge attempt), so the
+        batching is in the claim and the write-back; the calls themselves are spread out to
+        stay under the rate cap. Stopping ends the pacing early: schedules not yet sent keep
+        their claim and are retried once it expires.
+        """
+        limit = max(1, int(self.policy.max_retries_per_second * self.interval))
+        due = self.claim_due_retries(limit)
+        if not due:
+            return 0
+
+        # Submissions are paced so the batch is spread evenly over the interval
+        started = time.monotonic()
+        spacing = 1.0 / self.policy.max_retries_per_second
+        with ThreadPoolExecutor(max_workers=self.gateway_concurrency) as executor:
+            futures = []
+            for schedule in due:
+                futures.append(executor.submit(self._attempt_payment, schedule))
+                if self.stop_event.wait(spacing):
+                    break
+            results = [future.result() for future in futures]
+        due = due[:len(results)]
+
+        try:
+            for schedule, succeeded in zip(due, results):
+                if succeeded:
+                    self._mark_recovered(schedule)
+                elif schedule['attempt'] >= self.policy.max_attempts:
+                    self._mark_exhausted(schedule)
+                else:
+                    self._reschedule(schedule)
+            self.db_session.commit()
+        except Exception as e:
+            self.db_session.rollback()
+            logger.error(f"Failed to record dunning results: {e}")
+            raise
+
+        recovered = sum(1 for succeeded in results if succeeded)
+        logger.info(f"Retried {len(due)} failed payments in {time.monotonic() - started:.2f}s, {recovered} recovered.")
+        return len(due)
+
+    def _attempt_payment(self, schedule):
+        try:
+            self.stripe_api.renew_subscription(schedule['stripe_subscription_id'])
+            return True
+        except Exception as e:
+            logger.warning(f"Retry {schedule['attempt']} failed for subscription {schedule['subscription_id']}: {e}")
+            return False
+
+    # Results only apply while the schedule is still ours: a claim that outlived claim_seconds
+    # may have been taken over (and its outcome written) by another instance
+    CLAIMED = """
+        id = :id AND status = 'scheduled' AND attempt = :attempt AND next_retry_at = :claimed_until
+    """
+
+    def _update_claimed(self, schedule, assignments, **values):
+        result = self.db_session.execute(text(f"UPDATE dunning_schedules SET {assignments} WHERE {self.CLAIMED}"), dict(
+            values, id=schedule['id'], attempt=schedule['attempt'], claimed_until=schedule['claimed_until']
+        ))
+        return result.rowcount > 0
+
+    def _mark_recovered(self, schedule):
+        now = datetime.utcnow()
+        if self._update_claimed(schedule, "status = 'recovered', recovered_at = :now, updated_at = :now", now=now):
+            self.db_session.execute(text("""
+                UPDATE payments SET status = 'active', updated_at = :now WHERE id = :subscription_id
+            """), {'subscription_id': schedule['subscription_id'], 'now': now})
+
+    def _mark_exhausted(self, schedule):
+        now = datetime.utcnow()
+        if self._update_claimed(schedule, "status = 'exhausted', updated_at = :now", now=now):
+            self.db_session.execute(text("""
+                UPDATE payments SET status = 'unpaid', updated_at = :now WHERE id = :subscription_id
+            """), {'subscription_id': schedule['subscription_id'], 'now': now})
+
+    def _reschedule(self, schedule):
+        attempt = schedule['attempt'] + 1
+        self._update_claimed(
+            schedule, "attempt = :next_attempt, next_retry_at = :next_retry_at, updated_at = :now",
+            next_attempt=attempt, next_retry_at=self.policy.next_retry_at(attempt), now=datetime.utcnow()
+        )
+
+    def recovery_metrics(self, since=None):
+        """
+        Returns dunning outcomes since a point in time: schedules per status,
+        recovery rate among finished schedules, and average attempts/hours to recover.
+        """
+        since = since or datetime.utcnow() - timedelta(days=30)
+        hours_to_recover = HOURS_TO_RECOVER_SQL.get(self.db_session.get_bind().dialect.name, "NULL")
+        query = text(f"""
+            SELECT status,
+                   COUNT(*) AS schedules,
+                   AVG(attempt) AS avg_attempts,
+                   AVG({hours_to_recover}) AS avg_hours_to_recover
+            FROM dunning_schedules
+            WHERE created_at >= :since
+            GROUP BY status
+        """)
+        rows = {row['status']: row for row in self.db_session.execute(query, {'since': since}).mappings().all()}
+        recovered = rows['recovered']['schedules'] if 'recovered' in rows else 0
+        exhausted = rows['exhausted']['schedules'] if 'exhausted' in rows else 0
+        finished = recovered + exhausted
+        return {
+            'scheduled': rows['scheduled']['schedules'] if 'scheduled' in rows else 0,
+            'recovered': recovered,
+            'exhausted': exhausted,
+            'recovery_rate': recovered / finished if finished else 0.0,
+            'avg_attempts_to_recover': rows['recovered']['avg_attempts'] if recovered else None,
+            'avg_hours_to_recover': rows['recovered']['avg_hours_to_recover'] if recovered else None,
+        }
+
+
+if __name__ == "__main__":
+    # Initialize and start the dunning scheduler
+    dunning_scheduler = DunningScheduler()
+    dunning_scheduler.start_scheduler()
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from threading import Lock
+from billing.tax.tax_rate_events import register_tax_rate_reload_listener
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("InvoicePreview")
+
+# Maximum number of subscription previews kept in memory
+MAX_CACHED_PREVIEWS = 10000
+
+
+def compute_preview_key(plan_id, quantity, tax_region, period_start, period_end, status=None):
+    """
+    Builds a content hash of everything that determines an upcoming invoice,
+    including the status (a cancelled subscription has no upcoming invoice).
+    """
+    payload = json.dumps(
+        {
+            'status': status,
+            'plan_id': plan_id,
+            'quantity': quantity,
+            'tax_region': tax_region,
+            'period_start': str(period_start),
+            'period_end': str(period_end),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class InvoicePreviewEngine:
+    def __init__(self, max_previews=MAX_CACHED_PREVIEWS):
+        """
+        Caches computed upcoming-invoice previews per subscription.
+        Each entry remembers the content hash it was computed from, so an invalidated
+        entry whose inputs turn out unchanged is revalidated without recomputing.
+        """
+        self.max_previews = max_previews
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_preview(self, subscription_id, user_id, load_params, compute_preview):
+        """
+        Returns the upcoming invoice preview for a subscription.
+        load_params() must return the keyword arguments of compute_preview_key and is only
+        called when the entry is missing or stale; compute_preview(params) is only called
+        when the content hash changed.
+        """
+        with self._lock:
+            entry = self._entries.get(subscription_id)
+            if entry and entry['user_id'] == user_id and not entry['stale']:
+                self._entries.move_to_end(subscription_id)
+                self.hits += 1
+                return entry['preview']
+
+        params = load_params()
+        key = compute_preview_key(**params)
+        if entry and entry['user_id'] == user_id and entry['key'] == key:
+            preview = entry['preview']
+        else:
+            preview = compute_preview(params)
+
+        with self._lock:
+            self.misses += 1
+            self._entries[subscription_id] = {
+                'user_id': user_id,
+                'key': key,
+                'preview': preview,
+                'stale': False,
+            }
+            self._entries.move_to_end(subscription_id)
+            while len(self._entries) > self.max_previews:
+                self._entries.popitem(last=False)
+        return preview
+
+    def invalidate(self, subscription_id):
+        """Marks a subscription's preview stale after the subscription changes."""
+        with self._lock:
+            entry = self._entries.get(subscription_id)
+            if entry:
+                entry['stale'] = True
+        logger.debug(f"Invalidated invoice preview for subscription {subscription_id}")
+
+    def invalidate_all(self):
+        """Drops every cached preview, e.g. after tax rates are reloaded."""
+        with self._lock:
+            self._entries.clear()
+        logger.info("Invalidated all cached invoice previews.")
+
+    def stats(self):
+        """Returns cache hit/miss counters and current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+            }
+
+
+# Shared engine used by the subscription routes and SubscriptionManager
+invoice_preview_engine = InvoicePreviewEngine()
+register_tax_rate_reload_listener(invoice_preview_engine.invalidate_all)
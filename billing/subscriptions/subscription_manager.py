@@ -1,20 +1,73 @@
 from datetime import datetime, timedelta
-from backend.src.models.user_model import UserModel
+from sqlalchemy.orm import object_session
 from backend.src.models.payment_model import PaymentModel
+from backend.src.models.identity_map import unit_of_work, current_unit_of_work
 from payment_processing.payment_gateways.stripe_integration import StripeAPI
 from billing.invoices.invoice_generator import InvoiceGenerator
+from billing.invoices.invoice_preview import invoice_preview_engine
+from billing.usage.usage_ingestion import subscription_access_cache
 from billing.tax.tax_calculator import TaxCalculator
-from backend.src.utils.email_util import send_subscription_email
+from billing.dunning.dunning_scheduler import DunningScheduler
+from backend.src.config.database_config import get_session
+from notifications.email_outbox import enqueue_email
 from backend.src.utils.jwt_util import generate_jwt_token
 
+# Read-only lookups need none of the manager's gateways, so request handlers use them directly
+def retrieve_subscription(user_id, subscription_id):
+    """A user's subscription, loaded through the current unit of work."""
+    user = current_unit_of_work().users.load(user_id)
+    if not user:
+        raise Exception(f"User with ID {user_id} not found")
+    
+    subscription = current_unit_of_work().subscriptions.load(subscription_id)
+    if not subscription or subscription.user_id != user_id:
+        raise Exception(f"Subscription with ID {subscription_id} not found for user {user_id}")
+    
+    return subscription
+
+def get_invoice_preview_params(user_id, subscription_id):
+    """Returns the inputs that determine the upcoming invoice of a subscription."""
+    user = current_unit_of_work().users.load(user_id)
+    subscription = retrieve_subscription(user_id, subscription_id)
+    billing_address = getattr(user, 'billing_address', None)
+
+    period_start = subscription.next_billing_date
+    return {
+        'status': subscription.status,
+        'plan_id': subscription.plan_id,
+        'quantity': getattr(subscription, 'quantity', 1),
+        'tax_region': getattr(billing_address, 'country', billing_address),
+        'period_start': period_start,
+        'period_end': period_start + timedelta(days=30) if period_start is not None else None,
+    }
+
 class SubscriptionManager:
     def __init__(self):
         self.stripe_api = StripeAPI()
         self.invoice_generator = InvoiceGenerator()
         self.tax_calculator = TaxCalculator()
+        self.invoice_preview_engine = invoice_preview_engine
+        self.subscription_access_cache = subscription_access_cache
+        self.dunning_scheduler = DunningScheduler(stripe_api=self.stripe_api)
+
+    def _save_with_email(self, subscription, recipient, subject, payload):
+        """
+        Persists a subscription change and its notification email in one transaction.
+        The email itself is sent later by the outbox dispatcher.
+        A subscription loaded through the identity map is committed in the session that
+        loaded it; only new subscriptions are added to a fresh one.
+        """
+        session = object_session(subscription) or get_session()
+        try:
+            session.add(subscription)
+            enqueue_email(session, recipient, subject, payload)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
 
     def create_subscription(self, user_id, plan_id, payment_method):
-        user = UserModel.find_by_id(user_id)
+        user = current_unit_of_work().users.load(user_id)
         if not user:
             raise Exception(f"User with ID {user_id} not found")
         
@@ -38,19 +91,18 @@ class SubscriptionManager:
             created_at=datetime.now(),
             updated_at=datetime.now(),
         )
-        new_subscription.save()
-
-        # Send email confirmation to user
-        send_subscription_email(user.email, "Subscription Created", invoice)
+        # Save the subscription together with its confirmation email
+        self._save_with_email(new_subscription, user.email, "Subscription Created", invoice)
+        current_unit_of_work().prime_subscription(new_subscription)
 
         return new_subscription
 
     def cancel_subscription(self, user_id, subscription_id):
-        user = UserModel.find_by_id(user_id)
+        user = current_unit_of_work().users.load(user_id)
         if not user:
             raise Exception(f"User with ID {user_id} not found")
 
-        subscription = PaymentModel.find_by_id(subscription_id)
+        subscription = current_unit_of_work().subscriptions.load(subscription_id)
         if not subscription or subscription.user_id != user_id:
             raise Exception(f"Subscription with ID {subscription_id} not found for user {user_id}")
         
@@ -60,19 +112,18 @@ class SubscriptionManager:
         # Update the subscription status in the database
         subscription.status = canceled_subscription['status']
         subscription.updated_at = datetime.now()
-        subscription.save()
-
-        # Send cancellation email to user
-        send_subscription_email(user.email, "Subscription Cancelled", canceled_subscription)
+        self._save_with_email(subscription, user.email, "Subscription Cancelled", canceled_subscription)
+        self.invoice_preview_engine.invalidate(subscription_id)
+        self.subscription_access_cache.invalidate(subscription_id)
 
         return subscription
 
     def update_subscription(self, user_id, subscription_id, new_plan_id):
-        user = UserModel.find_by_id(user_id)
+        user = current_unit_of_work().users.load(user_id)
         if not user:
             raise Exception(f"User with ID {user_id} not found")
         
-        subscription = PaymentModel.find_by_id(subscription_id)
+        subscription = current_unit_of_work().subscriptions.load(subscription_id)
         if not subscription or subscription.user_id != user_id:
             raise Exception(f"Subscription with ID {subscription_id} not found for user {user_id}")
 
@@ -82,73 +133,70 @@ class SubscriptionManager:
         # Update the subscription in the database
         subscription.plan_id = new_plan_id
         subscription.updated_at = datetime.now()
-        subscription.save()
-
-        # Send email confirmation of the update
-        send_subscription_email(user.email, "Subscription Updated", updated_subscription)
+        self._save_with_email(subscription, user.email, "Subscription Updated", updated_subscription)
+        self.invoice_preview_engine.invalidate(subscription_id)
+        self.subscription_access_cache.invalidate(subscription_id)
 
         return subscription
 
     def retrieve_subscription(self, user_id, subscription_id):
-        user = UserModel.find_by_id(user_id)
-        if not user:
-            raise Exception(f"User with ID {user_id} not found")
-        
-        subscription = PaymentModel.find_by_id(subscription_id)
-        if not subscription or subscription.user_id != user_id:
-            raise Exception(f"Subscription with ID {subscription_id} not found for user {user_id}")
-        
-        return subscription
+        return retrieve_subscription(user_id, subscription_id)
+
+    def get_invoice_preview_params(self, user_id, subscription_id):
+        return get_invoice_preview_params(user_id, subscription_id)
 
     def list_active_subscriptions(self, user_id):
-        user = UserModel.find_by_id(user_id)
+        user = current_unit_of_work().users.load(user_id)
         if not user:
             raise Exception(f"User with ID {user_id} not found")
         
         # Fetch active subscriptions from the database
         active_subscriptions = PaymentModel.query.filter_by(user_id=user_id, status="active").all()
+        uow = current_unit_of_work()
+        for subscription in active_subscriptions:
+            uow.prime_subscription(subscription)
 
         return active_subscriptions
 
     def handle_failed_payment(self, user_id, subscription_id):
-        user = UserModel.find_by_id(user_id)
+        user = current_unit_of_work().users.load(user_id)
         if not user:
             raise Exception(f"User with ID {user_id} not found")
         
-        subscription = PaymentModel.find_by_id(subscription_id)
+        subscription = current_unit_of_work().subscriptions.load(subscription_id)
         if not subscription or subscription.user_id != user_id:
             raise Exception(f"Subscription with ID {subscription_id} not found for user {user_id}")
 
         # Mark the subscription as failed in the database
         subscription.status = "failed"
         subscription.updated_at = datetime.now()
-        subscription.save()
+        self._save_with_email(subscription, user.email, "Payment Failed", {
+            'subscription_id': subscription.id,
+            'plan_id': subscription.plan_id,
+            'status': subscription.status,
+        })
+        self.subscription_access_cache.invalidate(subscription_id)
 
-        # Send email notification to the user about the failed payment
-        send_subscription_email(user.email, "Payment Failed", subscription)
+        # Retries are spread out by the dunning scheduler instead of being attempted here
+        self.dunning_scheduler.schedule_retry(subscription_id)
 
         return subscription
 
     def renew_subscription(self, subscription_id):
-        subscription = PaymentModel.find_by_id(subscription_id)
+        subscription = current_unit_of_work().subscriptions.load(subscription_id)
         if not subscription:
             raise Exception(f"Subscription with ID {subscription_id} not found")
 
         if subscription.status != "active":
             raise Exception("Cannot renew a subscription that is not active")
         
-        user = UserModel.find_by_id(subscription.user_id)
+        user = current_unit_of_work().users.load(subscription.user_id)
         if not user:
             raise Exception(f"User with ID {subscription.user_id} not found")
 
         # Charge the user's payment method through Stripe
         renewal = self.stripe_api.renew_subscription(subscription.stripe_subscription_id)
 
-        # Update next billing date
-        subscription.next_billing_date = datetime.now() + timedelta(days=30)
-        subscription.updated_at = datetime.now()
-        subscription.save()
-
         # Generate a new invoice
         invoice = self.invoice_generator.generate_invoice(subscription.user_id, subscription.stripe_subscription_id, subscription.plan_id)
         
@@ -156,29 +204,87 @@ class SubscriptionManager:
         tax = self.tax_calculator.calculate_tax(user.billing_address, invoice['total'])
         invoice['total'] += tax
 
-        # Send email confirmation for the renewal
-        send_subscription_email(user.email, "Subscription Renewed", invoice)
+        # Update next billing date and queue the renewal confirmation in the same transaction
+        subscription.next_billing_date = datetime.now() + timedelta(days=30)
+        subscription.updated_at = datetime.now()
+        self._save_with_email(subscription, user.email, "Subscription Renewed", invoice)
+        self.invoice_preview_engine.invalidate(subscription_id)
+        self.subscription_access_cache.invalidate(subscription_id)
 
         return renewal
 
+    def renew_subscriptions(self, subscription_ids):
+        """
+        Renews a batch of subscriptions.
+        Subscriptions and their users are loaded with one query each before renewing.
+        """
+        renewals = {}
+        with unit_of_work() as uow:
+            subscriptions = uow.subscriptions.load_many(subscription_ids)
+            uow.users.load_many([s.user_id for s in subscriptions.values() if s])
+            for subscription_id in subscription_ids:
+                try:
+                    renewals[subscription_id] = self.renew_subscription(subscription_id)
+                except Exception as e:
+                    renewals[subscription_id] = e
+        return renewals
+
+    def process_webhook_events(self, events):
+        """
+        Processes a burst of webhook events in one unit of work.
+        Events carry Stripe ids, so every subscription and customer in the burst is resolved to
+        its row in one query per id kind, and the rows are primed under their primary keys too.
+        """
+        with unit_of_work() as uow:
+            stripe_subscription_ids = [
+                event['data']['object']['subscription'] if event['type'].startswith('invoice.')
+                else event['data']['object']['id']
+                for event in events
+            ]
+            for subscription in uow.subscriptions_by_stripe_id.load_many(stripe_subscription_ids).values():
+                if subscription:
+                    uow.prime_subscription(subscription)
+            stripe_customer_ids = [
+                event['data']['object']['customer'] for event in events
+                if event['type'] == 'invoice.payment_failed'
+            ]
+            for user in uow.users_by_stripe_id.load_many(stripe_customer_ids).values():
+                if user:
+                    uow.prime_user(user)
+            for event in events:
+                self.process_webhook_event(event)
+
     def process_webhook_event(self, event_data):
         event_type = event_data['type']
 
         if event_type == 'invoice.payment_failed':
-            self.handle_failed_payment(event_data['data']['object']['customer'], event_data['data']['object']['subscription'])
+            invoice = event_data['data']['object']
+            uow = current_unit_of_work()
+            user = uow.users_by_stripe_id.load(invoice['customer'])
+            if not user:
+                raise Exception(f"User with Stripe customer ID {invoice['customer']} not found")
+            subscription = uow.subscriptions_by_stripe_id.load(invoice['subscription'])
+            if not subscription:
+                raise Exception(f"Subscription with Stripe ID {invoice['subscription']} not found")
+            self.handle_failed_payment(user.id, subscription.id)
 
         elif event_type == 'invoice.payment_succeeded':
             subscription_id = event_data['data']['object']['subscription']
-            subscription = PaymentModel.find_by_stripe_id(subscription_id)
+            subscription = current_unit_of_work().subscriptions_by_stripe_id.load(subscription_id)
             subscription.status = "active"
             subscription.next_billing_date = datetime.now() + timedelta(days=30)
             subscription.save()
+            self.invoice_preview_engine.invalidate(subscription.id)
+            self.subscription_access_cache.invalidate(subscription.id)
+            self.dunning_scheduler.resolve_schedule(subscription.id)
 
         elif event_type == 'customer.subscription.deleted':
             subscription_id = event_data['data']['object']['id']
-            subscription = PaymentModel.find_by_stripe_id(subscription_id)
+            subscription = current_unit_of_work().subscriptions_by_stripe_id.load(subscription_id)
             subscription.status = "canceled"
             subscription.save()
+            self.invoice_preview_engine.invalidate(subscription.id)
+            self.subscription_access_cache.invalidate(subscription.id)
 
         else:
             raise Exception(f"Unhandled event type: {event_type}")
\ No newline at end of file
@@ -3,6 +3,7 @@ from typing import List, Dict, Optional
 from backend.src.models.user_model import User
 from backend.src.models.payment_model import Payment
 from backend.src.config.env_config import get_tax_rates
+from billing.tax.tax_rate_events import publish_tax_rates
 
 class TaxRate:
     def __init__(self, region: str, tax_percent: Decimal):
@@ -27,6 +28,11 @@ class TaxCalculator:
         else:
             raise ValueError(f"No tax rate available for region: {region}")
 
+    def refresh_tax_rates(self) -> None:
+        """Reloads tax rates and re-resolves the applicable rate for the user."""
+        self.tax_rates = reload_tax_rates()
+        self.applicable_tax_rate = self.get_applicable_tax_rate()
+
     def calculate_item_tax(self, item_amount: Decimal) -> Decimal:
         """Calculates tax for a single item."""
         return self.applicable_tax_rate.calculate_tax(item_amount)
@@ -95,6 +101,12 @@ def get_tax_rates() -> Dict[str, Decimal]:
     """Loads tax rates from environment configuration or database."""
     return ConfigLoader.load_tax_config()
 
+def reload_tax_rates() -> Dict[str, Decimal]:
+    """Reloads tax rates from configuration; listeners are notified when they changed."""
+    tax_rates = get_tax_rates()
+    publish_tax_rates(tax_rates)
+    return tax_rates
+
 # Payment Model and User Model (Stubs)
 class Payment:
     def __init__(self, items: List[Dict[str, Decimal]], user: User):
@@ -0,0 +1,31 @@
+import logging
+from threading import Lock
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("TaxRateEvents")
+
+# Callbacks notified when reloaded tax rates differ from the ones in effect (e.g. cache invalidation)
+_tax_rate_reload_listeners = []
+_current_tax_rates = None
+_lock = Lock()
+
+
+def register_tax_rate_reload_listener(callback):
+    """Registers a callback invoked every time reloaded tax rates turn out to have changed."""
+    _tax_rate_reload_listeners.append(callback)
+
+
+def publish_tax_rates(tax_rates):
+    """
+    Records freshly loaded tax rates and notifies the listeners when they differ from
+    the rates loaded before in this process. Returns whether they changed.
+    """
+    global _current_tax_rates
+    with _lock:
+        changed = tax_rates != _current_tax_rates
+        _current_tax_rates = dict(tax_rates)
+    if changed:
+        logger.info("Tax rates changed, notifying listeners.")
+        for callback in _tax_rate_reload_listeners:
+            callback()
+    return changed
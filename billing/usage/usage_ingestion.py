@@ -0,0 +1,355 @@
+import time
+import atexit
+import logging
+from threading import Thread, Lock, Event
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from database.config.db_connections import DBSession
+
+# Configure logging for usage ingestion
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("UsageIngestion")
+
+# Usage is aggregated into hourly buckets before it reaches the database
+AGGREGATION_BUCKET_SECONDS = 3600
+# How often the shared aggregator writes buffered usage to usage_aggregates
+FLUSH_INTERVAL_SECONDS = 10
+# Raw events held in memory between flushes; ingestion is refused beyond it
+MAX_BUFFERED_RECORDS = 1000000
+# How long the meter names and per-subscription usage access are trusted before reloading
+METER_CACHE_SECONDS = 60
+SUBSCRIPTION_ACCESS_SECONDS = 30
+MAX_CACHED_SUBSCRIPTIONS = 100000
+# Billing periods are 30 days and end at the subscription's next_billing_date
+BILLING_PERIOD_DAYS = 30
+# Subscriptions in these states no longer accept metered usage
+CLOSED_SUBSCRIPTION_STATUSES = ('canceled', 'cancelled', 'incomplete_expired', 'unpaid')
+
+
+class InvalidUsage(ValueError):
+    """Raised when reported usage cannot be billed, e.g. an unknown meter or an already invoiced period."""
+
+
+class SubscriptionClosed(Exception):
+    """Raised when usage is reported for a subscription that no longer accepts it."""
+
+
+class UsageBufferFull(Exception):
+    """Raised when the buffer is at capacity because usage is not being flushed fast enough."""
+
+
+class UsageRecord:
+    __slots__ = ('subscription_id', 'meter', 'quantity', 'timestamp')
+
+    def __init__(self, subscription_id, meter, quantity, timestamp):
+        self.subscription_id = subscription_id
+        self.meter = meter
+        self.quantity = quantity
+        self.timestamp = timestamp
+
+
+class UsageBuffer:
+    def __init__(self, max_records=MAX_BUFFERED_RECORDS):
+        """
+        Append-only in-memory buffer for raw usage events.
+        Writers only append; the aggregator swaps the whole list out in one step.
+        """
+        self.max_records = max_records
+        self._records = []
+        self._lock = Lock()
+
+    def append(self, subscription_id, meter, quantity, timestamp=None):
+        """Appends a single usage event. Timestamp is epoch seconds and defaults to now."""
+        if quantity < 0 or quantity % 1:
+            raise ValueError("Usage quantity must be a non-negative integer")
+        record = UsageRecord(subscription_id, meter, quantity, timestamp if timestamp is not None else time.time())
+        with self._lock:
+            if len(self._records) >= self.max_records:
+                raise UsageBufferFull("Usage buffer is full")
+            self._records.append(record)
+
+    def append_many(self, records):
+        """Appends a batch of (subscription_id, meter, quantity, timestamp) tuples under one lock."""
+        now = time.time()
+        batch = []
+        for subscription_id, meter, quantity, timestamp in records:
+            if quantity < 0 or quantity % 1:
+                raise ValueError("Usage quantity must be a non-negative integer")
+            batch.append(UsageRecord(subscription_id, meter, quantity, timestamp if timestamp is not None else now))
+        with self._lock:
+            if len(self._records) + len(batch) > self.max_records:
+                raise UsageBufferFull("Usage buffer is full")
+            self._records.extend(batch)
+
+    def drain(self):
+        """Removes and returns every buffered record."""
+        with self._lock:
+            records, self._records = self._records, []
+        return records
+
+    def __len__(self):
+        return len(self._records)
+
+
+class UsageAggregator:
+    def __init__(self, buffer, flush_interval=FLUSH_INTERVAL_SECONDS, db_session=None):
+        """
+        Pre-aggregates buffered usage per (subscription, meter, hour) and periodically
+        flushes the compacted totals to the usage_aggregates table.
+        """
+        self.buffer = buffer
+        self.flush_interval = flush_interval
+        # A session of its own from the factory: DBSession() would hand out the constructing
+        # thread's scoped session, which that thread keeps using while the flush loop does too
+        self.db_session = db_session or DBSession.session_factory()
+        self.pending = {}
+        self._lock = Lock()
+        self.stop_event = Event()
+        self._thread = None
+
+    def aggregate(self):
+        """Drains the buffer and folds raw events into the pending hourly totals."""
+        records = self.buffer.drain()
+        if not records:
+            return 0
+
+        with self._lock:
+            pending = self.pending
+            for record in records:
+                bucket = int(record.timestamp) - int(record.timestamp) % AGGREGATION_BUCKET_SECONDS
+                key = (record.subscription_id, record.meter, bucket)
+                pending[key] = pending.get(key, 0) + record.quantity
+        return len(records)
+
+    def flush(self):
+        """
+        Writes the pending totals as one row per (subscription, meter, hour).
+        Rows are added to any total already stored for that bucket. On failure the
+        totals are merged back so they are retried on the next flush.
+        """
+        self.aggregate()
+        with self._lock:
+            rows, self.pending = self.pending, {}
+        if not rows:
+            return 0
+
+        query = text("""
+            INSERT INTO usage_aggregates (subscription_id, meter, period_start, quantity, updated_at)
+            VALUES (:subscription_id, :meter, :period_start, :quantity, :updated_at)
+            ON CONFLICT (subscription_id, meter, period_start)
+            DO UPDATE SET quantity = usage_aggregates.quantity + EXCLUDED.quantity,
+                          updated_at = EXCLUDED.updated_at
+        """)
+        now = datetime.utcnow()
+        params = [
+            {
+                'subscription_id': subscription_id,
+                'meter': meter,
+                'period_start': datetime.fromtimestamp(bucket, tz=timezone.utc).replace(tzinfo=None),
+                'quantity': quantity,
+                'updated_at': now,
+            }
+            for (subscription_id, meter, bucket), quantity in rows.items()
+        ]
+        try:
+            self.db_session.execute(query, params)
+            self.db_session.commit()
+            logger.info(f"Flushed {len(params)} aggregated usage rows.")
+            return len(params)
+        except Exception as e:
+            self.db_session.rollback()
+            logger.error(f"Failed to flush usage aggregates, retrying next cycle: {e}")
+            with self._lock:
+                for key, quantity in rows.items():
+                    self.pending[key] = self.pending.get(key, 0) + quantity
+            return 0
+
+    def start(self):
+        """Starts the periodic flush loop as a background thread."""
+        logger.info("Starting Usage Aggregator")
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def stop(self):
+        """Stops the flush loop and writes whatever is still pending."""
+        logger.info("Stopping Usage Aggregator")
+        self.stop_event.set()
+        if self._thread is not None:
+            # The loop does the final flush, so the session is never used from two threads
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+
+
+def get_usage_totals(db_session, subscription_id, period_start, period_end):
+    """
+    Metered usage of a subscription per meter, with the meter's unit price, over the
+    hourly buckets in [period_start, period_end).
+    """
+    query = text("""
+        SELECT u.meter, SUM(u.quantity) AS quantity, m.unit_price
+        FROM usage_aggregates u
+        JOIN meters m ON m.name = u.meter
+        WHERE u.subscription_id = :subscription_id
+          AND u.period_start >= :period_start AND u.period_start < :period_end
+        GROUP BY u.meter, m.unit_price
+    """)
+    return db_session.execute(query, {
+        'subscription_id': subscription_id,
+        'period_start': period_start,
+        'period_end': period_end
+    }).mappings().all()
+
+
+def validate_usage(subscription_id, records, known_meters, open_since=None):
+    """
+    Checks usage records sent to the API ({'meter', 'quantity', 'timestamp'} dicts) and
+    returns them as (subscription_id, meter, quantity, timestamp) tuples for append_many.
+    Meters must be defined in the meters table, otherwise billing would drop the usage,
+    and timestamps (epoch seconds) must not fall before `open_since`, the start of the
+    open billing period: earlier usage belongs to an invoice that was already issued.
+    """
+    batch = []
+    for index, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise InvalidUsage(f"Record {index}: expected an object")
+        meter = record.get('meter')
+        quantity = record.get('quantity')
+        timestamp = record.get('timestamp')
+        if meter not in known_meters:
+            raise InvalidUsage(f"Record {index}: unknown meter '{meter}'")
+        # usage_aggregates.quantity is an integer column; fractional usage would be truncated
+        if isinstance(quantity, float) and quantity.is_integer():
+            quantity = int(quantity)
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 0:
+            raise InvalidUsage(f"Record {index}: quantity must be a non-negative integer")
+        if timestamp is not None:
+            if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+                raise InvalidUsage(f"Record {index}: timestamp must be epoch seconds")
+            if open_since is not None and timestamp < open_since:
+                raise InvalidUsage(f"Record {index}: timestamp falls in an already billed period")
+        batch.append((subscription_id, meter, quantity, timestamp))
+    return batch
+
+
+class MeterCatalog:
+    def __init__(self, db_session=None, ttl=METER_CACHE_SECONDS):
+        """
+        Names of the meters usage can be reported for, reloaded from the meters table
+        at most every `ttl` seconds. New meters are accepted within `ttl` of being created.
+        """
+        self.db_session = db_session or DBSession
+        self.ttl = ttl
+        self._names = frozenset()
+        self._expires = 0
+
+    def names(self):
+        if time.monotonic() >= self._expires:
+            try:
+                rows = self.db_session.execute(text("SELECT name FROM meters")).scalars().all()
+            finally:
+                # Read only; do not leave the request thread's transaction open
+                self.db_session.rollback()
+            self._names = frozenset(rows)
+            self._expires = time.monotonic() + self.ttl
+        return self._names
+
+
+class SubscriptionAccessCache:
+    def __init__(self, ttl=SUBSCRIPTION_ACCESS_SECONDS, max_entries=MAX_CACHED_SUBSCRIPTIONS):
+        """
+        Short-lived cache of which user may report usage for a subscription, its status
+        and its open billing period, so ingestion does not hit the database per request.
+        Subscription changes invalidate their entry; changes made elsewhere (e.g. by the
+        billing scheduler) are picked up after at most `ttl` seconds.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def open_period_start(self, user_id, subscription_id, load):
+        """
+        Returns the start of the subscription's open billing period in epoch seconds
+        (None when it has no billing date). load() must return the subscription after
+        checking that it belongs to the user; it is only called without a fresh entry.
+        Raises SubscriptionClosed when the subscription no longer accepts usage.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subscription_id)
+            if entry and (entry['user_id'] != user_id or entry['expires'] <= now):
+                entry = None
+            if entry:
+                self._entries.move_to_end(subscription_id)
+
+        if entry is None:
+            subscription = load()
+            next_billing_date = subscription.next_billing_date
+            open_since = None
+            if next_billing_date is not None:
+                # Billing dates are naive UTC, like the buckets the aggregator writes
+                period_start = next_billing_date - timedelta(days=BILLING_PERIOD_DAYS)
+                open_since = period_start.replace(tzinfo=timezone.utc).timestamp()
+            entry = {
+                'user_id': user_id,
+                'closed': subscription.status in CLOSED_SUBSCRIPTION_STATUSES,
+                'open_since': open_since,
+                'expires': now + self.ttl,
+            }
+            with self._lock:
+                self._entries[subscription_id] = entry
+                self._entries.move_to_end(subscription_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        if entry['closed']:
+            raise SubscriptionClosed(f"Subscription {subscription_id} no longer accepts usage")
+        return entry['open_since']
+
+    def invalidate(self, subscription_id):
+        """Drops a subscription's entry after its status, owner or billing date changes."""
+        with self._lock:
+            self._entries.pop(subscription_id, None)
+
+
+# Shared ingestion pipeline used by the usage API
+usage_buffer = UsageBuffer()
+subscription_access_cache = SubscriptionAccessCache()
+usage_aggregator = None
+_aggregator_lock = Lock()
+
+
+def start_usage_aggregation(flush_interval=FLUSH_INTERVAL_SECONDS):
+    """
+    Starts the shared aggregator that flushes usage_buffer to the database, once per
+    process, and registers its final flush for interpreter shutdown.
+    """
+    global usage_aggregator
+    with _aggregator_lock:
+        if usage_aggregator is None:
+            usage_aggregator = UsageAggregator(usage_buffer, flush_interval)
+            usage_aggregator.start()
+            atexit.register(stop_usage_aggregation)
+        return usage_aggregator
+
+
+def stop_usage_aggregation():
+    """Stops the shared aggregator after flushing everything still buffered."""
+    global usage_aggregator
+    with _aggregator_lock:
+        aggregator, usage_aggregator = usage_aggregator, None
+    if aggregator is not None:
+        aggregator.stop()
+
+
+def record_usage(subscription_id, meter, quantity, timestamp=None):
+    """Ingests a usage event. This only appends to memory and never touches the database."""
+    usage_buffer.append(subscription_id, meter, quantity, timestamp)
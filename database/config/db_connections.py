@@ -1,5 +1,6 @@
-from sqlalchemy import (create_engine, Column, Integer, String, DateTime, ForeignKey, Numeric, datetime, relationship)
-from sqlalchemy.orm import sessionmaker, scoped_session
+from datetime import datetime
+from sqlalchemy import (create_engine, Column, Integer, String, DateTime, ForeignKey, Numeric)
+from sqlalchemy.orm import sessionmaker, scoped_session, relationship
 from sqlalchemy.ext.declarative import declarative_base
 import os
 import logging
@@ -105,6 +106,9 @@ def get_database_connection():
     else:
         return SQLiteConnection()
 
+# Thread-local session factory used by the billing jobs (usage aggregation, billing, dunning)
+DBSession = scoped_session(sessionmaker(bind=create_engine(DatabaseConfig().get_database_url())))
+
 # Usage of DatabaseConnection
 if __name__ == "__main__":
     connection = get_database_connection()
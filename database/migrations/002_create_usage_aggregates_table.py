@@ -0,0 +1,36 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic
+revision = '002'
+down_revision = '001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'meters',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False, unique=True),
+        sa.Column('unit_price', sa.Numeric(precision=12, scale=6), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+
+    # One compacted row per (subscription, meter, hour); raw usage events are never stored
+    op.create_table(
+        'usage_aggregates',
+        sa.Column('subscription_id', sa.BigInteger(), nullable=False),
+        sa.Column('meter', sa.String(length=100), nullable=False),
+        sa.Column('period_start', sa.DateTime(), nullable=False),
+        sa.Column('quantity', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('subscription_id', 'meter', 'period_start')
+    )
+
+
+def downgrade():
+    op.drop_table('usage_aggregates')
+    op.drop_table('meters')
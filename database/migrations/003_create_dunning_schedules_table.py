@@ -0,0 +1,40 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'dunning_schedules',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('subscription_id', sa.BigInteger(), nullable=False),
+        sa.Column('attempt', sa.Integer(), nullable=False, server_default='1'),
+        sa.Column('next_retry_at', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='scheduled'),
+        sa.Column('recovered_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    # At most one open schedule per subscription
+    op.create_index(
+        'ix_dunning_schedules_open_subscription', 'dunning_schedules', ['subscription_id'],
+        unique=True, postgresql_where=sa.text("status = 'scheduled'")
+    )
+    # Due-retry scan used by the dunning scheduler
+    op.create_index(
+        'ix_dunning_schedules_due', 'dunning_schedules', ['next_retry_at'],
+        postgresql_where=sa.text("status = 'scheduled'")
+    )
+
+
+def downgrade():
+    op.drop_index('ix_dunning_schedules_due', table_name='dunning_schedules')
+    op.drop_index('ix_dunning_schedules_open_subscription', table_name='dunning_schedules')
+    op.drop_table('dunning_schedules')
@@ -0,0 +1,31 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'email_outbox',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('recipient', sa.String(length=255), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_index('ix_email_outbox_status_created_at', 'email_outbox', ['status', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_created_at', table_name='email_outbox')
+    op.drop_table('email_outbox')
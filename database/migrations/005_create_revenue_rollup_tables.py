@@ -0,0 +1,68 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Completed revenue per (day, product, currency); amounts are exact NUMERIC sums
+    op.create_table(
+        'daily_revenue_rollups',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.BigInteger(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('amount', sa.Numeric(), nullable=False, server_default='0'),
+        sa.Column('transaction_count', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('day', 'product_id', 'currency')
+    )
+
+    # Append-only changes written by the transactions trigger and folded into the rollups by
+    # the rollup job; inserting here keeps payment completions off the hot rollup rows
+    op.create_table(
+        'revenue_rollup_deltas',
+        sa.Column('id', sa.BigInteger(), primary_key=True, autoincrement=True, nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.BigInteger(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('amount', sa.Numeric(), nullable=False),
+        sa.Column('transaction_count', sa.BigInteger(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_revenue_rollup_deltas_day', 'revenue_rollup_deltas', ['day'])
+
+    # A row leaving 'completed' (refund, correction, delete) is subtracted, a row entering it
+    # is added; an update of a completed row does both
+    op.execute("""
+        CREATE OR REPLACE FUNCTION record_revenue_rollup_delta() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'completed' THEN
+                INSERT INTO revenue_rollup_deltas (day, product_id, currency, amount, transaction_count)
+                VALUES (OLD.created_at::date, OLD.product_id, OLD.currency, -OLD.amount, -1);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'completed' THEN
+                INSERT INTO revenue_rollup_deltas (day, product_id, currency, amount, transaction_count)
+                VALUES (NEW.created_at::date, NEW.product_id, NEW.currency, NEW.amount, 1);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER transactions_revenue_rollup
+        AFTER INSERT OR DELETE OR UPDATE OF status, amount, currency, product_id, created_at ON transactions
+        FOR EACH ROW EXECUTE FUNCTION record_revenue_rollup_delta();
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS transactions_revenue_rollup ON transactions")
+    op.execute("DROP FUNCTION IF EXISTS record_revenue_rollup_delta()")
+    op.drop_index('ix_revenue_rollup_deltas_day', table_name='revenue_rollup_deltas')
+    op.drop_table('revenue_rollup_deltas')
+    op.drop_table('daily_revenue_rollups')
@@ -0,0 +1,32 @@
+from alembic import op
+
+# Revision identifiers, used by Alembic
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # INCLUDE carries the columns statement pages read, so each page is an index-only scan
+    # Keyset statement pages: WHERE user_id = ? AND (created_at, id) > cursor ORDER BY created_at, id
+    op.create_index(
+        'ix_transactions_user_id_created_at_id', 'transactions', ['user_id', 'created_at', 'id'],
+        postgresql_include=['transaction_type', 'amount', 'currency', 'status']
+    )
+    # Statement pages filtered by transaction type
+    op.create_index(
+        'ix_transactions_user_id_type_created_at', 'transactions', ['user_id', 'transaction_type', 'created_at'],
+        postgresql_include=['id', 'amount', 'currency', 'status']
+    )
+    # Payment history pages, newest first
+    op.create_index(
+        'ix_payments_user_id_created_at_id', 'payments', ['user_id', 'created_at', 'id'],
+        postgresql_include=['amount', 'status']
+    )
+
+
+def downgrade():
+    op.drop_index('ix_payments_user_id_created_at_id', table_name='payments')
+    op.drop_index('ix_transactions_user_id_type_created_at', table_name='transactions')
+    op.drop_index('ix_transactions_user_id_created_at_id', table_name='transactions')
@@ -0,0 +1,17 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Set when a dispatcher claims a row ('sending'); claims older than the timeout are taken over
+    op.add_column('email_outbox', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('email_outbox', 'claimed_at')
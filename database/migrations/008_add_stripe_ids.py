@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+# Revision identifiers, used by Alembic
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Webhooks reference Stripe ids; the unit of work maps them to rows in one IN (...) query each
+    op.add_column('users', sa.Column('stripe_customer_id', sa.String(length=255), nullable=True))
+    op.create_index('ix_users_stripe_customer_id', 'users', ['stripe_customer_id'], unique=True)
+    op.add_column('payments', sa.Column('stripe_subscription_id', sa.String(length=255), nullable=True))
+    op.create_index('ix_payments_stripe_subscription_id', 'payments', ['stripe_subscription_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_payments_stripe_subscription_id', table_name='payments')
+    op.drop_column('payments', 'stripe_subscription_id')
+    op.drop_index('ix_users_stripe_customer_id', table_name='users')
+    op.drop_column('users', 'stripe_customer_id')
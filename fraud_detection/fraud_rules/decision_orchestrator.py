@@ -0,0 +1,300 @@
+import time
+import bisect
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from fraud_detection.fraud_rules.streaming_detection import StreamingFraudDetection
+from fraud_detection.risk_assessment.risk_scoring import Transaction, RISK_HIGH, RISK_MEDIUM
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FraudDecision")
+
+DECISION_APPROVE = "approve"
+DECISION_REVIEW = "review"
+DECISION_DECLINE = "decline"
+
+# Time budget for one authorization decision, measured from the start of decide()
+DECISION_DEADLINE_MS = 30.0
+# Histogram bucket upper bounds in seconds (Prometheus `le` labels)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.03, 0.05, 0.1, 0.25, 1.0)
+TIERS = ("rules", "ml", "risk", "decision")
+# Tier calls allowed on the pool (queued or running) per worker before new ones are shed
+BACKLOG_PER_WORKER = 4
+METRIC_PREFIX = "fraud_decision"
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram, safe to observe from several threads."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        # One extra slot for observations above the largest bound (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.observations = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+            self.observations += 1
+
+    def snapshot(self):
+        """Returns ([(upper bound, cumulative count), ..., ('+Inf', count)], sum, count)."""
+        with self._lock:
+            counts, total, observations = list(self.counts), self.total, self.observations
+        cumulative, running = [], 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, total, observations
+
+
+class FraudDecision:
+    """Outcome of one orchestrated authorization check."""
+
+    __slots__ = ('transaction_id', 'decision', 'rules_broken', 'ml_probability', 'risk_level',
+                 'fallback', 'timed_out', 'latency_ms')
+
+    def __init__(self, transaction_id, decision, rules_broken, ml_probability=None, risk_level=None,
+                 fallback=False, timed_out=(), latency_ms=0.0):
+        self.transaction_id = transaction_id
+        self.decision = decision
+        self.rules_broken = rules_broken
+        self.ml_probability = ml_probability
+        self.risk_level = risk_level
+        # True when a tier missed the deadline or failed and the decision was made without it
+        self.fallback = fallback
+        self.timed_out = timed_out
+        self.latency_ms = latency_ms
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def combine_decision(rules_broken, ml_label, risk_level):
+    """Decision from the three tiers' outputs; a tier that did not run passes 0 or None."""
+    if rules_broken or ml_label or risk_level == RISK_HIGH:
+        return DECISION_DECLINE
+    if risk_level == RISK_MEDIUM:
+        return DECISION_REVIEW
+    return DECISION_APPROVE
+
+
+def default_ml_features(ml_detector):
+    """Feature vector builder: the transaction's values in the scaler's training column order."""
+    if ml_detector is None or hasattr(ml_detector, 'submit'):
+        # The inference server accepts the transaction mapping as-is
+        return lambda transaction: transaction
+    feature_names = list(ml_detector.scaler.feature_names_in_)
+    return lambda transaction: [transaction[name] for name in feature_names]
+
+
+def risk_transaction_from(transaction):
+    """Maps an authorization dict onto the risk engine's Transaction."""
+    if isinstance(transaction, Transaction):
+        return transaction
+    return Transaction(
+        transaction['transaction_id'],
+        transaction['user_id'],
+        transaction['amount'],
+        transaction.get('timestamp', transaction.get('transaction_time')),
+        transaction.get('location', transaction.get('country')),
+        transaction.get('card_type'),
+        transaction.get('previous_fraud_score', 0),
+        ip_address=transaction.get('ip_address'),
+        card_number=transaction.get('card_number'),
+        ip_country=transaction.get('ip_country'),
+        issuer_country=transaction.get('issuer_country'),
+    )
+
+
+class FraudDecisionOrchestrator:
+    """
+    Combines the rule, ML and risk tiers into one decision under a latency budget.
+    The ML and risk tiers are submitted to a thread pool first, the cheap rule tier
+    runs inline on the caller's thread meanwhile, and the caller then waits for the
+    other two only until `deadline_ms` after the call started. A tier that misses the
+    deadline (or raises) is abandoned, counted, and the decision is made from the tiers
+    that did answer, so a slow model costs decision quality rather than checkout latency
+    and never discards a decline from the tier that finished.
+
+    An abandoned call that already started keeps its worker until it returns. Once
+    `max_backlog` calls are queued or running on the pool, further tier calls are shed
+    (skipped and counted) instead of queueing behind them.
+
+    `rule_detector` is anything with evaluate(transaction) -> list of broken rules
+    (StreamingFraudDetection by default, which keeps the windowed velocity state).
+    `ml_detector` is an MLFraudDetection scored with score_transaction(), or a started
+    FraudInferenceServer, whose micro-batched futures are awaited directly.
+    """
+
+    def __init__(self, rule_detector=None, ml_detector=None, risk_engine=None, deadline_ms=DECISION_DEADLINE_MS,
+                 ml_features=None, risk_transaction=risk_transaction_from, max_workers=4, max_backlog=None):
+        self.rule_detector = rule_detector or StreamingFraudDetection()
+        self.ml_detector = ml_detector
+        self.risk_engine = risk_engine
+        self.deadline = deadline_ms / 1000
+        self.ml_features = ml_features or default_ml_features(ml_detector)
+        self.risk_transaction = risk_transaction
+        self.histograms = {tier: LatencyHistogram() for tier in TIERS}
+        self.timeouts = {tier: 0 for tier in TIERS if tier in ("ml", "risk")}
+        self.errors = dict(self.timeouts)
+        self.shed = dict(self.timeouts)
+        # Abandoned calls that had already started, so cancel() could not stop them
+        self.uncancelled = dict(self.timeouts)
+        self.decisions = {DECISION_APPROVE: 0, DECISION_REVIEW: 0, DECISION_DECLINE: 0}
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fraud-tier")
+        self.max_backlog = max_backlog or BACKLOG_PER_WORKER * max_workers
+        self.backlog = 0
+        if ml_detector is not None and hasattr(ml_detector, 'compile_model') and ml_detector.compiled_model is None:
+            # Flatten once up front so the first authorization does not pay for it
+            ml_detector.compile_model()
+
+    def _submit(self, tier, function, *args):
+        """Starts a tier call and returns its future, or None when the pool backlog is full."""
+        started = time.perf_counter()
+        if tier == "ml" and hasattr(self.ml_detector, 'submit'):
+            future = self.ml_detector.submit(*args)
+        else:
+            with self._lock:
+                if self.backlog >= self.max_backlog:
+                    return None
+                self.backlog += 1
+            future = self._executor.submit(function, *args)
+            future.add_done_callback(self._release_backlog)
+        histogram = self.histograms[tier]
+
+        def observe(future):
+            # Observed on completion, so late results still show the tier's true latency;
+            # a call cancelled before it ran has no latency to report
+            if not future.cancelled():
+                histogram.observe(time.perf_counter() - started)
+
+        future.add_done_callback(observe)
+        return future
+
+    def _release_backlog(self, future):
+        with self._lock:
+            self.backlog -= 1
+
+    def decide(self, transaction):
+        started = time.perf_counter()
+        deadline = started + self.deadline
+        pending = {}
+        if self.ml_detector is not None:
+            pending["ml"] = self._submit("ml", getattr(self.ml_detector, 'score_transaction', None),
+                                         self.ml_features(transaction))
+        if self.risk_engine is not None:
+            pending["risk"] = self._submit("risk", self.risk_engine.assess_risk, self.risk_transaction(transaction))
+        shed = [tier for tier, future in pending.items() if future is None]
+        for tier in shed:
+            del pending[tier]
+
+        rules_started = time.perf_counter()
+        rules_broken = self.rule_detector.evaluate(transaction)
+        self.histograms["rules"].observe(time.perf_counter() - rules_started)
+
+        if rules_broken:
+            # The rules alone decline; the other tiers cannot change that
+            self._abandon(pending)
+            return self._finish(transaction, started, DECISION_DECLINE, rules_broken)
+
+        wait(pending.values(), timeout=max(0.0, deadline - time.perf_counter()))
+        results, timed_out, failed = {}, [], []
+        for tier, future in pending.items():
+            if not future.done():
+                timed_out.append(tier)
+            elif future.exception() is not None:
+                logger.error(f"{tier} tier failed for transaction {transaction['transaction_id']}: {future.exception()}")
+                failed.append(tier)
+            else:
+                results[tier] = future.result()
+        self._abandon({tier: pending[tier] for tier in timed_out})
+
+        if timed_out or failed or shed:
+            with self._lock:
+                for tier in timed_out:
+                    self.timeouts[tier] += 1
+                for tier in failed:
+                    self.errors[tier] += 1
+                for tier in shed:
+                    self.shed[tier] += 1
+                self.fallbacks += 1
+            logger.warning(f"Partial decision for transaction {transaction['transaction_id']} from "
+                           f"{['rules'] + sorted(results)}: timed out {timed_out}, failed {failed}, shed {shed}")
+
+        # A missing tier contributes nothing; the tiers that answered still decide
+        ml_label, ml_probability = results.get("ml", (0, None))
+        risk_level = results.get("risk")
+        decision = combine_decision(rules_broken, ml_label, risk_level)
+        return self._finish(transaction, started, decision, rules_broken, ml_probability, risk_level,
+                            fallback=bool(timed_out or failed or shed), timed_out=tuple(timed_out + failed + shed))
+
+    def _abandon(self, futures):
+        """Cancels tier calls whose result is no longer needed, counting those already running."""
+        uncancelled = [tier for tier, future in futures.items() if not future.cancel() and not future.done()]
+        if uncancelled:
+            with self._lock:
+                for tier in uncancelled:
+                    self.uncancelled[tier] += 1
+
+    def _finish(self, transaction, started, decision, rules_broken, ml_probability=None, risk_level=None,
+                fallback=False, timed_out=()):
+        elapsed = time.perf_counter() - started
+        self.histograms["decision"].observe(elapsed)
+        with self._lock:
+            self.decisions[decision] += 1
+        return FraudDecision(transaction['transaction_id'], decision, rules_broken, ml_probability, risk_level,
+                             fallback, timed_out, elapsed * 1000)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'decisions': dict(self.decisions),
+                'fallbacks': self.fallbacks,
+                'timeouts': dict(self.timeouts),
+                'errors': dict(self.errors),
+                'shed': dict(self.shed),
+                'uncancelled': dict(self.uncancelled),
+                'backlog': self.backlog,
+            }
+
+    def export_metrics(self):
+        """Renders the histograms and counters in the Prometheus text exposition format."""
+        name = f"{METRIC_PREFIX}_tier_latency_seconds"
+        lines = [f"# HELP {name} Latency of each decision tier and of the whole decision.",
+                 f"# TYPE {name} histogram"]
+        for tier, histogram in self.histograms.items():
+            cumulative, total, observations = histogram.snapshot()
+            for bound, count in cumulative:
+                lines.append(f'{name}_bucket{{tier="{tier}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{tier="{tier}"}} {total}')
+            lines.append(f'{name}_count{{tier="{tier}"}} {observations}')
+
+        stats = self.stats()
+        for metric, label, values, help_text in (
+            ("timeouts_total", "tier", stats['timeouts'], "Tier results abandoned at the deadline."),
+            ("errors_total", "tier", stats['errors'], "Tier calls that raised."),
+            ("shed_total", "tier", stats['shed'], "Tier calls skipped because the pool backlog was full."),
+            ("uncancelled_total", "tier", stats['uncancelled'],
+             "Abandoned tier calls that had already started and ran to completion anyway."),
+            ("decisions_total", "decision", stats['decisions'], "Decisions by outcome."),
+        ):
+            lines += [f"# HELP {METRIC_PREFIX}_{metric} {help_text}", f"# TYPE {METRIC_PREFIX}_{metric} counter"]
+            lines += [f'{METRIC_PREFIX}_{metric}{{{label}="{key}"}} {value}' for key, value in values.items()]
+        lines += [f"# HELP {METRIC_PREFIX}_fallbacks_total Decisions made without every tier's result.",
+                  f"# TYPE {METRIC_PREFIX}_fallbacks_total counter",
+                  f"{METRIC_PREFIX}_fallbacks_total {stats['fallbacks']}",
+                  f"# HELP {METRIC_PREFIX}_tier_backlog Tier calls queued or running on the pool.",
+                  f"# TYPE {METRIC_PREFIX}_tier_backlog gauge",
+                  f"{METRIC_PREFIX}_tier_backlog {stats['backlog']}"]
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+import numpy as np
+
+# Arrays making up a flattened forest, in the order they are stored on disk
+FOREST_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots']
+
+# Rows are scored in chunks so the (trees x rows) node matrix stays small
+_ROW_CHUNK = 4096
+
+
+def flatten_forest(model):
+    """
+    Flattens a fitted RandomForestClassifier into contiguous arrays.
+    All trees share one node numbering; `roots` holds each tree's first node.
+    Leaves point at themselves with an infinite threshold, so a path that has reached
+    its leaf stays there however many more steps are taken.
+    `value` holds the per-leaf class probabilities (as DecisionTreeClassifier.predict_proba).
+    """
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    sizes = np.array([tree.node_count for tree in trees], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    feature = np.concatenate([tree.feature for tree in trees]).astype(np.int32)
+    threshold = np.concatenate([tree.threshold for tree in trees]).astype(np.float64)
+    left = np.concatenate([tree.children_left + offset for tree, offset in zip(trees, offsets)])
+    right = np.concatenate([tree.children_right + offset for tree, offset in zip(trees, offsets)])
+    value = np.concatenate([tree.value[:, 0, :] for tree in trees]).astype(np.float64)
+    value /= value.sum(axis=1, keepdims=True)
+
+    leaves = np.concatenate([tree.children_left == -1 for tree in trees])
+    node_ids = np.arange(len(feature), dtype=np.int64)
+    feature[leaves] = 0
+    threshold[leaves] = np.inf
+    left[leaves] = node_ids[leaves]
+    right[leaves] = node_ids[leaves]
+
+    return {
+        'feature': feature,
+        'threshold': threshold,
+        'left': left.astype(np.int32),
+        'right': right.astype(np.int32),
+        'value': value,
+        'roots': offsets[:-1].astype(np.int32),
+    }
+
+
+class FlatForest:
+    """
+    predict_proba over a flattened forest. The arrays may be read-only memory maps,
+    in which case every worker process shares the same physical pages.
+    """
+
+    def __init__(self, arrays, classes, max_depth):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.classes_ = np.asarray(classes)
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(
+            flatten_forest(model),
+            classes=model.classes_,
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+        )
+
+    @property
+    def n_estimators(self):
+        return len(self.roots)
+
+    def leaves(self, X):
+        """Leaf node reached in every tree, shape (n_trees, n_rows)."""
+        # Trees compare float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        n_rows = len(X)
+        nodes = np.repeat(self.roots, n_rows).astype(np.int64)
+        rows = np.tile(np.arange(n_rows), self.n_estimators)
+        # Only (tree, row) pairs that have not reached a leaf are advanced
+        active = np.arange(len(nodes))
+        for _ in range(self.max_depth):
+            current = nodes[active]
+            go_left = X[rows[active], self.feature[current]] <= self.threshold[current]
+            following = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = following
+            active = active[following != current]
+            if not len(active):
+                break
+        return nodes.reshape(self.n_estimators, n_rows)
+
+    def predict_proba_row(self, x):
+        """
+        Class probabilities for a single feature vector. Same walk as leaves() without
+        the row dimension, which is the bulk of the per-call overhead for one row.
+        """
+        x = np.asarray(x, dtype=np.float32).ravel()
+        nodes = self.roots.astype(np.intp)
+        active = np.arange(len(nodes))
+        while len(active):
+            current = nodes[active]
+            following = np.where(x[self.feature[current]] <= self.threshold[current],
+                                 self.left[current], self.right[current])
+            nodes[active] = following
+            active = active[following != current]
+        return self.value[nodes].sum(axis=0) / self.n_estimators
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        if len(X) == 1:
+            return self.predict_proba_row(X[0])[None, :]
+        probabilities = np.empty((len(X), self.value.shape[1]))
+        for start in range(0, len(X), _ROW_CHUNK):
+            leaves = self.leaves(X[start:start + _ROW_CHUNK])
+            probabilities[start:start + _ROW_CHUNK] = self.value[leaves].sum(axis=0) / self.n_estimators
+        return probabilities
+
+
+class FlatScaler:
+    """StandardScaler.transform from stored mean and scale arrays."""
+
+    def __init__(self, mean, scale, feature_names=None):
+        self.mean_ = mean
+        self.scale_ = scale
+        if feature_names is not None:
+            self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        n_features = scaler.n_features_in_
+        mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+        return cls(mean, scale, getattr(scaler, 'feature_names_in_', None))
+
+    def transform(self, X):
+        if hasattr(X, 'columns') and hasattr(self, 'feature_names_in_'):
+            X = X[list(self.feature_names_in_)]
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean_
+        X /= self.scale_
+        return X
@@ -0,0 +1,146 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+import pandas as pd
+from fraud_detection.fraud_rules.ml_detection import MLFraudDetection, labels_from_probabilities
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FraudInferenceServer")
+
+_STOP = object()
+
+
+class FraudInferenceServer:
+    """
+    Resident scoring service around a trained MLFraudDetection model.
+    Concurrent score() calls are queued and gathered by a single worker thread into
+    micro-batches of up to `max_batch_size` rows, waiting at most `max_wait_ms` for a
+    batch to fill. Each batch is scaled once and scored with one predict_proba call.
+    """
+
+    def __init__(self, detector, max_batch_size=64, max_wait_ms=2.0):
+        self.detector = detector
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        # Column order the scaler was fitted with, when it was fitted on a DataFrame
+        self.feature_names = getattr(detector.scaler, 'feature_names_in_', None)
+        self._requests = queue.Queue()
+        self._worker = None
+        self._stopped = False
+        # Orders submissions against stop(), so nothing is queued behind the stop marker
+        self._submit_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    @classmethod
+    def from_artifacts(cls, model_path, threshold=0.5, **kwargs):
+        """Loads the saved model and scaler once and keeps them resident."""
+        detector = MLFraudDetection(data_path=None, threshold=threshold)
+        detector.load_model(model_path)
+        return cls(detector, **kwargs)
+
+    def start(self):
+        self._stopped = False
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="fraud-inference", daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self):
+        """Scores everything already queued; without a running worker, queued requests fail."""
+        with self._submit_lock:
+            self._stopped = True
+            if self._worker is not None:
+                self._requests.put(_STOP)
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        while True:
+            try:
+                item = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                item[1].set_exception(RuntimeError("Inference server was stopped"))
+
+    def submit(self, features):
+        """
+        Queues one transaction's features (a mapping keyed by feature name, or a sequence
+        in training column order) and returns a Future resolving to (label, fraud probability).
+        Raises RuntimeError once the server is stopped, since nothing would resolve the future.
+        """
+        if isinstance(features, dict):
+            if self.feature_names is None:
+                raise TypeError("The model's scaler was fitted without column names; "
+                                "pass features as a sequence in training column order")
+            missing = [name for name in self.feature_names if name not in features]
+            if missing:
+                raise ValueError(f"Missing features: {missing}")
+            features = [features[name] for name in self.feature_names]
+        future = Future()
+        with self._submit_lock:
+            if self._stopped:
+                raise RuntimeError("Inference server is stopped")
+            self._requests.put((features, future))
+        return future
+
+    def score(self, features, timeout=None):
+        return self.submit(features).result(timeout)
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._requests.get(timeout=remaining) if remaining > 0 else self._requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._requests.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._requests.get()
+            if first is _STOP:
+                return
+            # Requests cancelled while queued are dropped; once a batch starts, cancel() fails
+            batch = [(features, future) for features, future in self._collect_batch(first)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            futures = [future for _, future in batch]
+            try:
+                labels, probabilities = self._score_batch([features for features, _ in batch])
+            except Exception as e:
+                logger.error(f"Scoring a batch of {len(batch)} requests failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            for future, label, probability in zip(futures, labels.tolist(), probabilities.tolist()):
+                future.set_result((label, probability))
+
+    def _score_batch(self, rows):
+        rows = np.asarray(rows, dtype=float)
+        if self.feature_names is not None:
+            rows = pd.DataFrame(rows, columns=self.feature_names)
+        detector = self.detector
+        probabilities = detector.model.predict_proba(detector.scaler.transform(rows))
+        labels = labels_from_probabilities(detector.model, probabilities, detector.threshold)
+        return labels, probabilities[:, 1]
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+        }
@@ -5,17 +5,38 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, confusion_matrix, classification_report
 from sklearn.preprocessing import StandardScaler
 import joblib
+from fraud_detection.fraud_rules.flat_forest import FlatForest, FlatScaler
+from fraud_detection.fraud_rules.model_artifacts import save_model_artifacts, load_model_artifacts
+from fraud_detection.fraud_rules.training_data import load_training_data
+
+def labels_from_probabilities(model, probabilities, threshold=0.5):
+    """Derives class labels from predict_proba output: fraud when its probability exceeds the threshold"""
+    return model.classes_[(probabilities[:, 1] > threshold).astype(int)]
 
 class MLFraudDetection:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, threshold: float = 0.5, n_jobs: int = -1, cache_dir: str = None,
+                 sample_fraction: float = None, random_state: int = 42):
         # Load data and initialize model variables
         self.data_path = data_path
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
+        self.threshold = threshold
+        # With a cache_dir, the CSV is converted once into a downcast Parquet cache
+        self.cache_dir = cache_dir
+        self.sample_fraction = sample_fraction
+        self.random_state = random_state
+        # n_jobs only parallelizes fit; scoring one row or a small batch across a process
+        # pool costs more than the trees, so the model predicts single-threaded
+        self.n_jobs = n_jobs
+        self.model = RandomForestClassifier(n_estimators=100, random_state=random_state, n_jobs=1)
         self.scaler = StandardScaler()
+        self.compiled_model, self.compiled_scaler = None, None
         self.X_train, self.X_test, self.y_train, self.y_test = None, None, None, None
 
     def load_data(self):
         """Loads transaction data from CSV and splits into features and labels"""
+        if self.cache_dir:
+            return load_training_data(
+                self.data_path, self.cache_dir, sample_fraction=self.sample_fraction, random_state=self.random_state
+            )
         data = pd.read_csv(self.data_path)
         X = data.drop(columns=['is_fraud'])
         y = data['is_fraud']
@@ -23,18 +44,24 @@ class MLFraudDetection:
 
     def preprocess_data(self, X):
         """Applies scaling to the feature set"""
-        X_scaled = self.scaler.fit_transform(X)
+        # Trees split on float32 anyway; scaling in float32 halves the training matrix
+        X_scaled = self.scaler.fit_transform(X.astype(np.float32))
         return X_scaled
 
     def split_data(self, X, y):
-        """Splits the dataset into training and testing sets"""
+        """Splits the dataset into training and testing sets, stratified by label and reproducible"""
         self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
+            X, y, test_size=0.2, random_state=self.random_state, stratify=y
         )
 
     def train_model(self):
-        """Trains the RandomForest model"""
-        self.model.fit(self.X_train, self.y_train)
+        """Trains the RandomForest model on n_jobs workers, then restores single-threaded prediction"""
+        self.model.set_params(n_jobs=self.n_jobs)
+        try:
+            self.model.fit(self.X_train, self.y_train)
+        finally:
+            self.model.set_params(n_jobs=1)
+        self.compiled_model, self.compiled_scaler = None, None
         print("Model training completed.")
 
     def evaluate_model(self):
@@ -58,19 +85,55 @@ class MLFraudDetection:
     def load_model(self, model_path: str):
         """Loads a pre-trained model and scaler from disk"""
         self.model = joblib.load(model_path + "_model.pkl")
+        # Models pickled before fit-only n_jobs still carry their training value
+        self.model.set_params(n_jobs=1)
         self.scaler = joblib.load(model_path + "_scaler.pkl")
+        self.compiled_model, self.compiled_scaler = None, None
         print("Model and scaler loaded successfully.")
 
+    def export_artifacts(self, artifact_dir: str, version: str = None, publish: bool = True):
+        """Saves the model as a versioned, memory-mappable artifact (see model_artifacts)"""
+        return save_model_artifacts(self.model, self.scaler, artifact_dir, version, self.threshold, publish)
+
+    def load_artifacts(self, artifact_dir: str, version: str = None):
+        """Loads a memory-mapped artifact version; its arrays are shared with other workers"""
+        loaded = load_model_artifacts(artifact_dir, version)
+        self.model, self.scaler, self.threshold = loaded.model, loaded.scaler, loaded.threshold
+        self.compiled_model, self.compiled_scaler = loaded.model, loaded.scaler
+        print(f"Model artifact version {loaded.version} loaded successfully.")
+
     def predict(self, new_data: pd.DataFrame):
         """Predicts fraud probability on new transaction data"""
         new_data_scaled = self.scaler.transform(new_data)
-        predictions = self.model.predict(new_data_scaled)
+        # A single forest pass; labels are derived from the probabilities
         probabilities = self.model.predict_proba(new_data_scaled)
+        predictions = labels_from_probabilities(self.model, probabilities, self.threshold)
         return predictions, probabilities
 
+    def compile_model(self):
+        """Flattens the trained forest and scaler into NumPy arrays for low-overhead scoring"""
+        if isinstance(self.model, FlatForest):
+            self.compiled_model, self.compiled_scaler = self.model, self.scaler
+        else:
+            self.compiled_model = FlatForest.from_model(self.model)
+            self.compiled_scaler = FlatScaler.from_scaler(self.scaler)
+        return self.compiled_model
+
+    def score_transaction(self, features):
+        """
+        Scores one transaction (feature values in training column order) with the compiled
+        model; returns (label, fraud probability) without sklearn's per-call overhead
+        """
+        if self.compiled_model is None:
+            self.compile_model()
+        scaled = self.compiled_scaler.transform(np.asarray(features, dtype=float)[None, :])
+        probabilities = self.compiled_model.predict_proba_row(scaled[0])[None, :]
+        label = labels_from_probabilities(self.compiled_model, probabilities, self.threshold)[0]
+        return label, probabilities[0, 1]
+
 if __name__ == "__main__":
     # Initialize fraud detection system
-    detection = MLFraudDetection(data_path="transactions.csv")
+    detection = MLFraudDetection(data_path="transactions.csv", cache_dir=".fraud_training_cache")
 
     # Load and preprocess data
     X, y = detection.load_data()
@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+from threading import Lock
+from datetime import datetime, timezone
+import numpy as np
+from fraud_detection.fraud_rules.flat_forest import FOREST_ARRAYS, FlatForest, FlatScaler, flatten_forest
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FraudModelArtifacts")
+
+ARTIFACT_FORMAT_VERSION = 1
+SCALER_ARRAYS = ['scaler_mean', 'scaler_scale']
+CURRENT_POINTER = 'CURRENT'
+VERSIONS_DIR = 'versions'
+
+
+class ArtifactIntegrityError(Exception):
+    """Raised when an artifact file does not match the checksum recorded in its manifest."""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def save_model_artifacts(model, scaler, artifact_dir, version=None, threshold=0.5, publish=True):
+    """
+    Writes a fitted forest and scaler as a new artifact version:
+    versions/<version>/ holds one uncompressed .npy file per array and a manifest.json
+    with the format version, model metadata and a sha256 per file. The directory is
+    fully written before it is renamed into place; `publish` then switches CURRENT to it.
+    """
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    versions_dir = os.path.join(artifact_dir, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    target = os.path.join(versions_dir, version)
+    if os.path.exists(target):
+        raise ValueError(f"Model artifact version {version} already exists")
+
+    flat_scaler = FlatScaler.from_scaler(scaler)
+    arrays = flatten_forest(model)
+    arrays['scaler_mean'] = np.asarray(flat_scaler.mean_, dtype=np.float64)
+    arrays['scaler_scale'] = np.asarray(flat_scaler.scale_, dtype=np.float64)
+
+    staging = tempfile.mkdtemp(dir=versions_dir, prefix='.staging_')
+    try:
+        files = {}
+        for name, array in arrays.items():
+            path = os.path.join(staging, name + '.npy')
+            np.save(path, np.ascontiguousarray(array))
+            files[name] = {'file': name + '.npy', 'sha256': _sha256(path)}
+        feature_names = getattr(flat_scaler, 'feature_names_in_', None)
+        manifest = {
+            'format_version': ARTIFACT_FORMAT_VERSION,
+            'version': version,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'n_estimators': len(model.estimators_),
+            'max_depth': max(estimator.tree_.max_depth for estimator in model.estimators_),
+            'classes': np.asarray(model.classes_).tolist(),
+            'feature_names': None if feature_names is None else [str(name) for name in feature_names],
+            'threshold': threshold,
+            'files': files,
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    logger.info(f"Saved fraud model artifact version {version} to {artifact_dir}")
+    if publish:
+        publish_version(artifact_dir, version)
+    return version
+
+
+def publish_version(artifact_dir, version):
+    """Atomically points CURRENT at an existing version; running workers pick it up on reload."""
+    if not os.path.isfile(os.path.join(artifact_dir, VERSIONS_DIR, version, 'manifest.json')):
+        raise ValueError(f"Model artifact version {version} does not exist")
+    _write_atomic(os.path.join(artifact_dir, CURRENT_POINTER), version + '\n')
+    logger.info(f"Published fraud model artifact version {version}")
+
+
+def current_version(artifact_dir):
+    with open(os.path.join(artifact_dir, CURRENT_POINTER)) as f:
+        return f.read().strip()
+
+
+class LoadedModel:
+    """A memory-mapped artifact version: forest, scaler and manifest."""
+
+    def __init__(self, model, scaler, manifest):
+        self.model = model
+        self.scaler = scaler
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.threshold = manifest['threshold']
+
+
+def load_model_artifacts(artifact_dir, version=None, verify=True):
+    """
+    Opens an artifact version (CURRENT by default) with every array memory-mapped
+    read-only, so the pages are shared by all processes that load the same version.
+    With `verify`, files are checked against the manifest checksums first.
+    """
+    version = version or current_version(artifact_dir)
+    directory = os.path.join(artifact_dir, VERSIONS_DIR, version)
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest['format_version'] != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact format {manifest['format_version']}")
+
+    arrays = {}
+    for name in FOREST_ARRAYS + SCALER_ARRAYS:
+        entry = manifest['files'][name]
+        path = os.path.join(directory, entry['file'])
+        if verify and _sha256(path) != entry['sha256']:
+            raise ArtifactIntegrityError(f"Checksum mismatch for {entry['file']} in model version {version}")
+        arrays[name] = np.load(path, mmap_mode='r')
+
+    model = FlatForest(arrays, classes=manifest['classes'], max_depth=manifest['max_depth'])
+    scaler = FlatScaler(arrays['scaler_mean'], arrays['scaler_scale'], manifest['feature_names'])
+    return LoadedModel(model, scaler, manifest)
+
+
+class ModelStore:
+    """
+    Per-process handle on the published model.
+    `current()` checks the CURRENT pointer at most every `reload_interval` seconds and
+    swaps in a newly published version; in-flight callers keep the version they already hold.
+    A version that fails to load is logged and the previous one stays in service.
+    """
+
+    def __init__(self, artifact_dir, reload_interval=10, verify=True):
+        self.artifact_dir = artifact_dir
+        self.reload_interval = reload_interval
+        self.verify = verify
+        self._lock = Lock()
+        self._loaded = load_model_artifacts(artifact_dir, verify=verify)
+        self._last_check = time.monotonic()
+
+    def current(self):
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.maybe_reload()
+        return self._loaded
+
+    def maybe_reload(self):
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                version = current_version(self.artifact_dir)
+                if version == self._loaded.version:
+                    return False
+                self._loaded = load_model_artifacts(self.artifact_dir, version, verify=self.verify)
+                logger.info(f"Swapped fraud model to version {version}")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to load fraud model update, keeping version {self._loaded.version}: {e}")
+                return False
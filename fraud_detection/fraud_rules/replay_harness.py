@@ -0,0 +1,219 @@
+import time
+import logging
+from collections import Counter
+import numpy as np
+import pandas as pd
+from fraud_detection.fraud_rules.decision_orchestrator import (
+    combine_decision,
+    default_ml_features,
+    risk_transaction_from,
+)
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FraudReplay")
+
+COMPONENTS = ("rules", "risk", "ml")
+PERCENTILES = (50, 90, 99, 99.9)
+MAX_DIFF_SAMPLES = 20
+
+
+def load_stream(path, time_column='transaction_time'):
+    """Reads a recorded transaction stream (CSV or Parquet) as time-ordered transaction dicts."""
+    frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path, parse_dates=[time_column])
+    frame = frame.sort_values(time_column, kind='stable')
+    frame[time_column] = frame[time_column].dt.to_pydatetime()
+    return frame.to_dict('records')
+
+
+def latency_summary(seconds):
+    """Mean, percentiles and max of per-call latencies, in microseconds."""
+    if len(seconds) == 0:
+        return {}
+    micros = np.asarray(seconds) * 1e6
+    summary = {'mean': float(micros.mean())}
+    summary.update({f"p{q:g}": float(value) for q, value in zip(PERCENTILES, np.percentile(micros, PERCENTILES))})
+    summary['max'] = float(micros.max())
+    return summary
+
+
+class ReplayConfig:
+    """
+    One configuration of the fraud components to replay: a RuleBasedFraudDetection, a
+    RiskScoringEngine and an MLFraudDetection (or anything with score_transaction).
+    Components left as None are skipped and contribute nothing to the decision.
+    """
+
+    def __init__(self, name, rule_detector=None, risk_engine=None, ml_detector=None, ml_features=None,
+                 risk_transaction=risk_transaction_from, record_history=False):
+        self.name = name
+        self.rule_detector = rule_detector
+        self.risk_engine = risk_engine
+        self.ml_detector = ml_detector
+        self.ml_features = ml_features or default_ml_features(ml_detector)
+        self.risk_transaction = risk_transaction
+        # Feed each replayed transaction into the risk engine's running features after scoring it
+        self.record_history = record_history
+        self.stream = None
+        self.context = None
+
+    def prepare(self, stream):
+        """
+        Takes a private copy of the stream, so enrichment by one configuration is never seen
+        by another, and builds the rule tier's velocity context over it.
+        """
+        self.stream = [dict(transaction) for transaction in stream]
+        if self.rule_detector is not None:
+            self.context = self.rule_detector.build_context(self.stream)
+        if self.ml_detector is not None and getattr(self.ml_detector, 'compiled_model', 0) is None:
+            self.ml_detector.compile_model()
+
+    def process(self, index, latencies):
+        """Runs every component on one transaction, recording each call's latency at `index`."""
+        transaction = self.stream[index]
+        rules_broken, risk_level, ml_label = [], None, 0
+
+        if self.rule_detector is not None:
+            started = time.perf_counter()
+            rules_broken = self.rule_detector.evaluate(transaction, self.context)
+            latencies["rules"][index] = time.perf_counter() - started
+
+        if self.risk_engine is not None:
+            risk_transaction = self.risk_transaction(transaction)
+            started = time.perf_counter()
+            risk_level = self.risk_engine.assess_risk(risk_transaction)
+            latencies["risk"][index] = time.perf_counter() - started
+            if self.record_history:
+                self.risk_engine.record_transaction(risk_transaction)
+
+        if self.ml_detector is not None:
+            features = self.ml_features(transaction)
+            started = time.perf_counter()
+            ml_label, _ = self.ml_detector.score_transaction(features)
+            latencies["ml"][index] = time.perf_counter() - started
+
+        return rules_broken, risk_level, int(ml_label), combine_decision(rules_broken, ml_label, risk_level)
+
+    def components(self):
+        present = {"rules": self.rule_detector, "risk": self.risk_engine, "ml": self.ml_detector}
+        return [component for component in COMPONENTS if present[component] is not None]
+
+
+class ReplayReport:
+    """Throughput, per-component latency percentiles and baseline/candidate decision diffs of one replay."""
+
+    def __init__(self, transactions, elapsed, max_lag, latencies, decisions, diffs):
+        self.transactions = transactions
+        self.elapsed = elapsed
+        self.throughput = transactions / elapsed if elapsed else 0.0
+        # Largest delay behind the requested replay schedule; 0 when unthrottled
+        self.max_lag = max_lag
+        self.latencies = latencies
+        self.decisions = decisions
+        self.diffs = diffs
+
+    def to_dict(self):
+        return {
+            'transactions': self.transactions,
+            'elapsed_seconds': self.elapsed,
+            'throughput': self.throughput,
+            'max_lag_seconds': self.max_lag,
+            'latency_us': self.latencies,
+            'decisions': self.decisions,
+            'diffs': self.diffs,
+        }
+
+    def format(self):
+        lines = [f"Replayed {self.transactions:,} transactions in {self.elapsed:.2f}s "
+                 f"({self.throughput:,.0f} txn/s, max lag {self.max_lag * 1000:.1f} ms)"]
+        for name, components in self.latencies.items():
+            lines.append(f"[{name}] decisions {self.decisions[name]}")
+            for component, summary in components.items():
+                lines.append(f"  {component:<5} " + "  ".join(f"{key} {value:,.1f}us" for key, value in summary.items()))
+        if self.diffs:
+            diffs = self.diffs
+            lines.append(f"Decision changes: {diffs['changed']:,} of {self.transactions:,} "
+                         f"({diffs['changed'] / max(self.transactions, 1):.2%})")
+            for (baseline, candidate), count in diffs['decision_transitions'].items():
+                lines.append(f"  {baseline} -> {candidate}: {count:,}")
+            lines.append(f"  rules newly broken {dict(diffs['rules_added'])}, no longer broken {dict(diffs['rules_removed'])}")
+            lines.append(f"  risk level changes {dict(diffs['risk_transitions'])}, ML label flips {diffs['ml_flips']:,}")
+        return "\n".join(lines)
+
+
+class ShadowReplay:
+    """
+    Replays a transaction stream through a baseline configuration and, in shadow mode, a
+    candidate configuration: both see every transaction in turn, only the baseline's
+    decision counts, and the candidate's outputs are diffed against it. With `rate`
+    (transactions per second) transactions are released on a fixed schedule instead
+    of as fast as possible, and the worst lag behind that schedule is reported.
+    """
+
+    def __init__(self, baseline, candidate=None, rate=None):
+        self.baseline = baseline
+        self.candidate = candidate
+        self.rate = rate
+
+    def run(self, stream):
+        configs = [self.baseline] + ([self.candidate] if self.candidate is not None else [])
+        if len({config.name for config in configs}) != len(configs):
+            raise ValueError("Baseline and candidate configurations need distinct names")
+        count = len(stream)
+        for config in configs:
+            config.prepare(stream)
+        latencies = {config.name: {component: np.zeros(count) for component in config.components()} for config in configs}
+        outcomes = {config.name: [None] * count for config in configs}
+
+        logger.info(f"Replaying {count} transactions through {[config.name for config in configs]}")
+        max_lag = 0.0
+        started = time.perf_counter()
+        for index in range(count):
+            if self.rate:
+                due = started + index / self.rate
+                now = time.perf_counter()
+                if now < due:
+                    time.sleep(due - now)
+                else:
+                    max_lag = max(max_lag, now - due)
+            for config in configs:
+                outcomes[config.name][index] = config.process(index, latencies[config.name])
+        elapsed = time.perf_counter() - started
+
+        summaries = {
+            name: {component: latency_summary(samples) for component, samples in components.items()}
+            for name, components in latencies.items()
+        }
+        decisions = {name: dict(Counter(outcome[3] for outcome in results)) for name, results in outcomes.items()}
+        diffs = None
+        if self.candidate is not None:
+            diffs = self._diff(stream, outcomes[self.baseline.name], outcomes[self.candidate.name])
+        return ReplayReport(count, elapsed, max_lag, summaries, decisions, diffs)
+
+    @staticmethod
+    def _diff(stream, baseline, candidate):
+        decision_transitions, risk_transitions = Counter(), Counter()
+        rules_added, rules_removed = Counter(), Counter()
+        ml_flips, changed, samples = 0, 0, []
+        for transaction, (b_rules, b_risk, b_ml, b_decision), (c_rules, c_risk, c_ml, c_decision) in zip(
+                stream, baseline, candidate):
+            rules_added.update(set(c_rules) - set(b_rules))
+            rules_removed.update(set(b_rules) - set(c_rules))
+            if b_risk != c_risk:
+                risk_transitions[(b_risk, c_risk)] += 1
+            ml_flips += b_ml != c_ml
+            if b_decision != c_decision:
+                changed += 1
+                decision_transitions[(b_decision, c_decision)] += 1
+                if len(samples) < MAX_DIFF_SAMPLES:
+                    samples.append({'transaction_id': transaction.get('transaction_id'),
+                                    'baseline': b_decision, 'candidate': c_decision})
+        return {
+            'changed': changed,
+            'decision_transitions': decision_transitions,
+            'risk_transitions': risk_transitions,
+            'rules_added': rules_added,
+            'rules_removed': rules_removed,
+            'ml_flips': ml_flips,
+            'samples': samples,
+        }
@@ -1,32 +1,29 @@
 import logging
 from datetime import datetime, timedelta
+from fraud_detection.fraud_rules.rule_engine import RuleEngine
 
 # Configuring logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("FraudDetection")
 
 class RuleBasedFraudDetection:
-    def __init__(self, transaction_data):
+    def __init__(self, transaction_data, rule_engine=None, reference_tables=None):
         self.transaction_data = transaction_data
         self.fraudulent_transactions = []
+        # Rules are defined in configs/fraud_rules.yaml and compiled by the engine
+        self.rule_engine = rule_engine or RuleEngine()
+        # Optional IP geolocation / card BIN tables; they add ip_country, card_type and issuer_country fields
+        self.reference_tables = reference_tables
 
     def detect_fraud(self):
         logger.info("Starting fraud detection.")
+        if self.reference_tables is not None:
+            for transaction in self.transaction_data:
+                self.reference_tables.enrich(transaction)
+        context = self.rule_engine.build_context(self.transaction_data)
         
         for transaction in self.transaction_data:
-            rules_broken = []
-            
-            if self.rule_large_amount(transaction):
-                rules_broken.append('large_amount')
-            
-            if self.rule_suspicious_country(transaction):
-                rules_broken.append('suspicious_country')
-
-            if self.rule_high_frequency(transaction):
-                rules_broken.append('high_frequency')
-                
-            if self.rule_multiple_declines(transaction):
-                rules_broken.append('multiple_declines')
+            rules_broken = self.rule_engine.evaluate(transaction, context)
 
             if rules_broken:
                 logger.warning(f"Fraudulent transaction detected: {transaction['transaction_id']}")
@@ -36,54 +33,19 @@ class RuleBasedFraudDetection:
         logger.info(f"Fraud detection completed. {len(self.fraudulent_transactions)} fraudulent transactions found.")
         return self.fraudulent_transactions
 
-    def rule_large_amount(self, transaction):
-        """Rule: Transaction amount exceeds $10,000"""
-        large_amount_threshold = 10000
-        if transaction['amount'] > large_amount_threshold:
-            logger.debug(f"Transaction {transaction['transaction_id']} flagged by large amount rule.")
-            return True
-        return False
-
-    def rule_suspicious_country(self, transaction):
-        """Rule: Transaction originates from a high-risk country."""
-        high_risk_countries = ['North Korea', 'Iran', 'Syria', 'Cuba']
-        if transaction['country'] in high_risk_countries:
-            logger.debug(f"Transaction {transaction['transaction_id']} flagged by suspicious country rule.")
-            return True
-        return False
-
-    def rule_high_frequency(self, transaction):
-        """Rule: More than 5 transactions from the same card within the last hour."""
-        card_number = transaction['card_number']
-        transaction_time = transaction['transaction_time']
-
-        recent_transactions = [
-            t for t in self.transaction_data
-            if t['card_number'] == card_number and
-            t['transaction_time'] >= transaction_time - timedelta(hours=1)
-        ]
-
-        if len(recent_transactions) > 5:
-            logger.debug(f"Transaction {transaction['transaction_id']} flagged by high frequency rule.")
-            return True
-        return False
-
-    def rule_multiple_declines(self, transaction):
-        """Rule: Multiple declined transactions in the last 24 hours."""
-        card_number = transaction['card_number']
-        transaction_time = transaction['transaction_time']
+    def build_context(self, transactions):
+        """Velocity lookups over `transactions`, for evaluating them one at a time against one plan."""
+        return self.rule_engine.build_context(transactions)
 
-        declined_transactions = [
-            t for t in self.transaction_data
-            if t['card_number'] == card_number and
-            t['status'] == 'declined' and
-            t['transaction_time'] >= transaction_time - timedelta(hours=24)
-        ]
+    def evaluate(self, transaction, context):
+        """Broken rules for one transaction of the batch `context` was built from."""
+        if self.reference_tables is not None:
+            self.reference_tables.enrich(transaction)
+        return self.rule_engine.evaluate(transaction, context)
 
-        if len(declined_transactions) > 3:
-            logger.debug(f"Transaction {transaction['transaction_id']} flagged by multiple declines rule.")
-            return True
-        return False
+    def is_fraudulent(self, transaction, context):
+        """Short-circuit check: stops at the first broken rule, cheapest rules first."""
+        return self.rule_engine.first_broken_rule(transaction, context) is not None
 
 # Transaction Data for Testing
 transaction_data = [
@@ -145,14 +107,15 @@ transaction_data = [
     }
 ]
 
-# Initializing fraud detection
-fraud_detector = RuleBasedFraudDetection(transaction_data)
+if __name__ == "__main__":
+    # Initializing fraud detection
+    fraud_detector = RuleBasedFraudDetection(transaction_data)
 
-# Running fraud detection
-fraudulent_transactions = fraud_detector.detect_fraud()
+    # Running fraud detection
+    fraudulent_transactions = fraud_detector.detect_fraud()
 
-# Output the result
-if fraudulent_transactions:
-    logger.info(f"Fraudulent Transactions: {fraudulent_transactions}")
-else:
-    logger.info("No fraudulent transactions detected.")
\ No newline at end of file
+    # Output the result
+    if fraudulent_transactions:
+        logger.info(f"Fraudulent Transactions: {fraudulent_transactions}")
+    else:
+        logger.info("No fraudulent transactions detected.")
\ No newline at end of file
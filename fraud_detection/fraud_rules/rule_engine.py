@@ -0,0 +1,376 @@
+import os
+import time
+import logging
+import operator
+from abc import ABC, abstractmethod
+from threading import Lock
+from datetime import timedelta
+import yaml
+from fraud_detection.fraud_rules.velocity_index import VelocityIndex
+from fraud_detection.fraud_rules.sketches import KeyedDistinctCounters, epoch_seconds
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FraudRuleEngine")
+
+DEFAULT_RULES_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'configs', 'fraud_rules.yaml'
+)
+
+# The plan is re-ordered from observed statistics after this many short-circuit evaluations
+REORDER_INTERVAL = 10000
+
+OPERATORS = {
+    'gt': operator.gt,
+    'gte': operator.ge,
+    'lt': operator.lt,
+    'lte': operator.le,
+}
+
+
+class RuleStats:
+    """Evaluation counters of one rule; rules are evaluated from many threads, so updates take a lock."""
+    __slots__ = ('evaluations', 'hits', 'total_ns', '_lock')
+
+    def __init__(self):
+        self.evaluations = 0
+        self.hits = 0
+        self.total_ns = 0
+        self._lock = Lock()
+
+    def record(self, elapsed_ns, broken):
+        with self._lock:
+            self.total_ns += elapsed_ns
+            self.evaluations += 1
+            if broken:
+                self.hits += 1
+
+    def hit_rate(self):
+        return self.hits / self.evaluations if self.evaluations else 0.0
+
+    def avg_ns(self):
+        return self.total_ns / self.evaluations if self.evaluations else 0.0
+
+
+class Rule(ABC):
+    def __init__(self, definition):
+        self.name = definition['name']
+        self.cost = definition.get('cost', 1)
+        self.stats = RuleStats()
+
+    @abstractmethod
+    def evaluate(self, transaction, context):
+        """True if the transaction breaks this rule."""
+
+    def timed_evaluate(self, transaction, context):
+        started = time.perf_counter_ns()
+        broken = self.evaluate(transaction, context)
+        self.stats.record(time.perf_counter_ns() - started, broken)
+        return broken
+
+
+class ThresholdRule(Rule):
+    """Rule: numeric field compared against a fixed value."""
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.field = definition['field']
+        self.operator = definition.get('operator', 'gt')
+        self.compare = OPERATORS[self.operator]
+        self.value = definition['value']
+
+    def evaluate(self, transaction, context):
+        return self.compare(transaction[self.field], self.value)
+
+
+class MembershipRule(Rule):
+    """Rule: field value belongs to a configured list."""
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.field = definition['field']
+        self.values = frozenset(definition['values'])
+
+    def evaluate(self, transaction, context):
+        # Fields added by enrichment (ip_country, card_type, ...) may be missing
+        return transaction.get(self.field) in self.values
+
+
+class MismatchRule(Rule):
+    """Rule: two fields are both present and differ (e.g. IP country vs card issuer country)."""
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.field = definition['field']
+        self.other = definition['other']
+
+    def evaluate(self, transaction, context):
+        value, other = transaction.get(self.field), transaction.get(self.other)
+        return value is not None and other is not None and value != other
+
+
+class VelocityRule(Rule):
+    """
+    Rule: more than `limit` matching transactions for the same key within the trailing
+    window. Transactions without the key never break it. `bucket_seconds` is the
+    granularity of the online engine's sliding window; batch engines count exactly.
+    """
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.key = definition['key']
+        self.window = timedelta(seconds=definition['window_seconds'])
+        self.limit = definition['limit']
+        self.filter = definition.get('filter')
+        self.bucket_seconds = definition.get('bucket_seconds', max(1, definition['window_seconds'] // 60))
+        self.cost = definition.get('cost', 10)
+
+    def matches_filter(self, transaction):
+        return self.filter is None or transaction.get(self.filter['field']) == self.filter['equals']
+
+    def evaluate(self, transaction, context):
+        return context.count_in_window(self, transaction) > self.limit
+
+
+class DistinctCountRule(Rule):
+    """
+    Rule: more than `limit` distinct `field` values for the same key within the trailing
+    window (e.g. distinct merchants per card). Counts are HyperLogLog estimates.
+    Transactions missing the key or the field are not counted and never break it.
+    """
+
+    def __init__(self, definition):
+        super().__init__(definition)
+        self.key = definition['key']
+        self.field = definition['field']
+        self.window = timedelta(seconds=definition['window_seconds'])
+        self.limit = definition['limit']
+        self.bucket_seconds = definition.get('bucket_seconds', max(1, definition['window_seconds'] // 6))
+        self.precision = definition.get('precision', 8)
+        self.cost = definition.get('cost', 10)
+
+    def evaluate(self, transaction, context):
+        return context.distinct_count(self, transaction) > self.limit
+
+
+def replay_distinct_counts(rule, keys, values, timestamps):
+    """
+    Estimated distinct `values` per key within the rule's window ending at each position.
+    Positions are replayed in time order through windowed sketches; all positions sharing
+    a timestamp are added before any of them is counted, as in VelocityIndex windows.
+    Positions with a None key or value are skipped and count 0.
+    """
+    counters = KeyedDistinctCounters(rule.window, rule.bucket_seconds, rule.precision)
+    order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+    counts = [0.0] * len(timestamps)
+    start = 0
+    while start < len(order):
+        end = start
+        now = timestamps[order[start]]
+        while end < len(order) and timestamps[order[end]] == now:
+            if keys[order[end]] is not None and values[order[end]] is not None:
+                counters.add(keys[order[end]], values[order[end]], now)
+            end += 1
+        for position in order[start:end]:
+            if keys[position] is not None and values[position] is not None:
+                counts[position] = counters.count(keys[position], now)
+        start = end
+    return counts
+
+
+RULE_TYPES = {
+    'threshold': ThresholdRule,
+    'membership': MembershipRule,
+    'mismatch': MismatchRule,
+    'velocity': VelocityRule,
+    'distinct': DistinctCountRule,
+}
+
+
+class BatchVelocityContext:
+    """
+    Velocity lookups over an in-memory batch: one VelocityIndex per velocity rule, and
+    sketch-estimated counts per transaction for distinct-count rules. Each is built on
+    the first lookup for its rule, so rules the short-circuit plan never reaches cost
+    nothing. A context built by RuleEngine.build_context pins the plan it was built for
+    (`plan`), so the whole batch is evaluated against the same rules even if the config
+    is reloaded meanwhile.
+    """
+
+    def __init__(self, transaction_data, plan=None):
+        self.plan = plan
+        self.transaction_data = transaction_data
+        self.indexes = {}
+        self.distinct_counts = {}
+        self._lock = Lock()
+
+    def _velocity_index(self, rule):
+        index = self.indexes.get(rule.name)
+        if index is None:
+            with self._lock:
+                index = self.indexes.get(rule.name)
+                if index is None:
+                    matching = [t for t in self.transaction_data
+                                if rule.matches_filter(t) and t.get(rule.key) is not None]
+                    index = self.indexes[rule.name] = VelocityIndex(matching, key_field=rule.key)
+        return index
+
+    def _distinct_counts(self, rule):
+        counts = self.distinct_counts.get(rule.name)
+        if counts is None:
+            with self._lock:
+                counts = self.distinct_counts.get(rule.name)
+                if counts is None:
+                    transactions = self.transaction_data
+                    replayed = replay_distinct_counts(
+                        rule,
+                        [t.get(rule.key) for t in transactions],
+                        [t.get(rule.field) for t in transactions],
+                        [epoch_seconds(t['transaction_time']) for t in transactions],
+                    )
+                    counts = self.distinct_counts[rule.name] = {
+                        id(transaction): count for transaction, count in zip(transactions, replayed)
+                    }
+        return counts
+
+    def count_in_window(self, rule, transaction):
+        key = transaction.get(rule.key)
+        if key is None:
+            return 0
+        return self._velocity_index(rule).count_in_window(key, transaction['transaction_time'], rule.window)
+
+    def distinct_count(self, rule, transaction):
+        return self._distinct_counts(rule)[id(transaction)]
+
+
+class EvaluationPlan:
+    """
+    Compiled rule set.
+    `rules` keeps the declared order (used for reporting); `ordered` is the short-circuit
+    order, cheapest-and-most-selective first: rules are ranked by cost per expected hit.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.ordered = sorted(rules, key=lambda rule: rule.cost)
+        self.short_circuit_evaluations = 0
+        self._lock = Lock()
+
+    def count_short_circuit(self):
+        """Counts one short-circuit evaluation, re-ordering the plan every REORDER_INTERVAL of them."""
+        with self._lock:
+            self.short_circuit_evaluations += 1
+            if self.short_circuit_evaluations % REORDER_INTERVAL == 0:
+                self.reorder()
+
+    def reorder(self):
+        def rank(rule):
+            # Observed time per evaluation once available, configured cost before that
+            cost = rule.stats.avg_ns() or rule.cost
+            return cost / max(rule.stats.hit_rate(), 1e-6)
+        self.ordered = sorted(self.rules, key=rank)
+
+
+def compile_rules(definitions):
+    """
+    Builds an EvaluationPlan from rule definitions (the `rules` list of the config).
+    Definitions with `enabled: false` are left out.
+    """
+    rules = []
+    for definition in definitions:
+        if not definition.get('enabled', True):
+            continue
+        rule_type = definition.get('type')
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"Unknown fraud rule type '{rule_type}' for rule '{definition.get('name')}'")
+        rules.append(RULE_TYPES[rule_type](definition))
+    return EvaluationPlan(rules)
+
+
+def load_rule_definitions(path):
+    with open(path) as f:
+        return yaml.safe_load(f)['rules']
+
+
+class RuleEngine:
+    """
+    Evaluates transactions against rules loaded from config.
+    The config file is polled for changes at most every `reload_interval` seconds and
+    swapped in atomically; a broken file is logged and the previous plan stays active.
+    Batches are evaluated against the plan pinned by build_context, so a reload only
+    takes effect from the next batch.
+    """
+
+    def __init__(self, rules_path=DEFAULT_RULES_PATH, reload_interval=5, definitions=None):
+        self.rules_path = rules_path
+        self.reload_interval = reload_interval
+        self._lock = Lock()
+        self._last_check = time.monotonic()
+        self._mtime = None
+        if definitions is not None:
+            self.plan = compile_rules(definitions)
+        else:
+            self._mtime = os.path.getmtime(rules_path)
+            self.plan = compile_rules(load_rule_definitions(rules_path))
+
+    @property
+    def rules(self):
+        return self.plan.rules
+
+    def maybe_reload(self):
+        if self._mtime is None or time.monotonic() - self._last_check < self.reload_interval:
+            return False
+        with self._lock:
+            self._last_check = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.rules_path)
+                if mtime == self._mtime:
+                    return False
+                self.plan = compile_rules(load_rule_definitions(self.rules_path))
+                self._mtime = mtime
+                logger.info(f"Reloaded fraud rules from {self.rules_path}")
+                return True
+            except Exception as e:
+                logger.error(f"Failed to reload fraud rules, keeping the current plan: {e}")
+                return False
+
+    def build_context(self, transaction_data):
+        """Velocity context for a batch, pinned to the current plan; the config is reloaded first if due."""
+        self.maybe_reload()
+        plan = self.plan
+        return BatchVelocityContext(transaction_data, plan)
+
+    def plan_for(self, context):
+        """The plan a context pins, or the current plan (reloaded first if due) for unpinned contexts."""
+        if context is not None and context.plan is not None:
+            return context.plan
+        self.maybe_reload()
+        return self.plan
+
+    def evaluate(self, transaction, context):
+        """Returns the names of every broken rule, in declared order."""
+        return [rule.name for rule in self.plan_for(context).rules if rule.timed_evaluate(transaction, context)]
+
+    def first_broken_rule(self, transaction, context):
+        """
+        Short-circuit decision: returns the first broken rule in plan order, or None.
+        Velocity lookups are skipped whenever a cheaper rule already flags the transaction.
+        """
+        plan = self.plan_for(context)
+        plan.count_short_circuit()
+        for rule in plan.ordered:
+            if rule.timed_evaluate(transaction, context):
+                return rule.name
+        return None
+
+    def rule_stats(self):
+        """Per-rule evaluation counts, hit counters/rates and mean evaluation time in microseconds."""
+        return {
+            rule.name: {
+                'evaluations': rule.stats.evaluations,
+                'hits': rule.stats.hits,
+                'hit_rate': rule.stats.hit_rate(),
+                'avg_us': rule.stats.avg_ns() / 1000,
+            }
+            for rule in self.plan.rules
+        }
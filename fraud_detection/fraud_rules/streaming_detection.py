@@ -0,0 +1,347 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from collections import deque, OrderedDict
+from threading import RLock, Thread, Event
+from datetime import timedelta
+from fraud_detection.fraud_rules.sketches import KeyedDistinctCounters, epoch_seconds
+from fraud_detection.fraud_rules.rule_engine import RuleEngine, VelocityRule, DistinctCountRule
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("StreamingFraudDetection")
+
+# Keys copied per lock acquisition while a snapshot is taken, so evaluations interleave with it
+SNAPSHOT_CHUNK_KEYS = 1000
+
+
+class SlidingWindowCounter:
+    """
+    Event counter over a trailing time window, kept as fixed-width time buckets.
+    Memory is bounded by window / bucket_seconds; add() and count() are amortized O(1)
+    because expired buckets are dropped from the left as time moves forward.
+    Counts are exact at bucket granularity: events in the bucket containing
+    (now - window) are still counted.
+    """
+
+    __slots__ = ('window_seconds', 'bucket_seconds', 'buckets', 'total', 'last_seen')
+
+    def __init__(self, window_seconds, bucket_seconds):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self.buckets = deque()
+        self.total = 0
+        self.last_seen = 0.0
+
+    def _expire(self, now):
+        oldest_allowed = now - self.window_seconds - self.bucket_seconds
+        buckets = self.buckets
+        while buckets and buckets[0][0] <= oldest_allowed:
+            self.total -= buckets.popleft()[1]
+
+    def add(self, timestamp, amount=1):
+        bucket = timestamp - timestamp % self.bucket_seconds
+        self._expire(timestamp)
+        if self.buckets and self.buckets[-1][0] >= bucket:
+            # Late events are folded into the newest bucket to keep buckets ordered
+            self.buckets[-1][1] += amount
+        else:
+            self.buckets.append([bucket, amount])
+        self.total += amount
+        self.last_seen = max(self.last_seen, timestamp)
+
+    def count(self, now):
+        self._expire(now)
+        return self.total
+
+    def to_dict(self):
+        # Buckets are copied: the newest one keeps being incremented in place
+        return {'buckets': [[bucket, count] for bucket, count in self.buckets], 'total': self.total,
+                'last_seen': self.last_seen}
+
+    @classmethod
+    def from_dict(cls, data, window_seconds, bucket_seconds):
+        counter = cls(window_seconds, bucket_seconds)
+        counter.buckets = deque([bucket, count] for bucket, count in data['buckets'])
+        counter.total = data['total']
+        counter.last_seen = data['last_seen']
+        return counter
+
+
+class KeyedWindowCounters:
+    """
+    Sliding-window counters per key (card, IP, ...).
+    Keys are kept in last-seen order so idle keys are evicted from the front once
+    their whole window has passed, keeping memory proportional to active keys.
+    """
+
+    def __init__(self, window, bucket_seconds, max_keys=1000000):
+        self.window_seconds = window.total_seconds()
+        self.bucket_seconds = bucket_seconds
+        self.max_keys = max_keys
+        self.counters = OrderedDict()
+
+    def add(self, key, timestamp, amount=1):
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = SlidingWindowCounter(self.window_seconds, self.bucket_seconds)
+            self.counters[key] = counter
+        else:
+            self.counters.move_to_end(key)
+        counter.add(timestamp, amount)
+        self.evict(timestamp)
+
+    def count(self, key, now):
+        counter = self.counters.get(key)
+        return counter.count(now) if counter else 0
+
+    def evict(self, now):
+        counters = self.counters
+        horizon = now - self.window_seconds - self.bucket_seconds
+        while counters:
+            key, counter = next(iter(counters.items()))
+            if counter.last_seen > horizon and len(counters) <= self.max_keys:
+                break
+            counters.popitem(last=False)
+
+    def to_dict(self):
+        return {key: counter.to_dict() for key, counter in self.counters.items()}
+
+    def load_dict(self, data):
+        self.counters = OrderedDict(
+            (key, SlidingWindowCounter.from_dict(value, self.window_seconds, self.bucket_seconds))
+            for key, value in data.items()
+        )
+
+
+def _hash_key(value):
+    # Card numbers and IPs are never kept in memory or snapshots in clear text
+    return hashlib.blake2b(str(value).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _window_signature(rule):
+    """What a rule's window state depends on; state survives a reload only while this is unchanged."""
+    if isinstance(rule, VelocityRule):
+        return ['velocity', rule.key, rule.window.total_seconds(), rule.bucket_seconds, rule.filter]
+    if isinstance(rule, DistinctCountRule):
+        return ['distinct', rule.key, rule.field, rule.window.total_seconds(), rule.bucket_seconds, rule.precision]
+    return None
+
+
+def _new_window(rule):
+    if isinstance(rule, VelocityRule):
+        return KeyedWindowCounters(rule.window, rule.bucket_seconds)
+    return KeyedDistinctCounters(rule.window, rule.bucket_seconds, rule.precision)
+
+
+def _window_entries(window):
+    return 'counters' if isinstance(window, KeyedWindowCounters) else 'sketches'
+
+
+class StreamingWindowContext:
+    """
+    Velocity lookups for one authorization, read from the detector's window state.
+    Same interface as BatchVelocityContext, so RuleEngine rules evaluate unchanged.
+    """
+
+    __slots__ = ('plan', 'windows', 'timestamp', 'hashed_keys')
+
+    def __init__(self, plan, windows, timestamp):
+        self.plan = plan
+        self.windows = windows
+        self.timestamp = timestamp
+        self.hashed_keys = {}
+
+    def hashed_key(self, transaction, field):
+        hashed = self.hashed_keys.get(field)
+        if hashed is None:
+            value = transaction.get(field)
+            hashed = self.hashed_keys[field] = _hash_key(value) if value is not None else ''
+        return hashed
+
+    def count_in_window(self, rule, transaction):
+        key = self.hashed_key(transaction, rule.key)
+        return self.windows[rule.name].count(key, self.timestamp) if key else 0
+
+    def distinct_count(self, rule, transaction):
+        key = self.hashed_key(transaction, rule.key)
+        if not key or transaction.get(rule.field) is None:
+            return 0
+        return self.windows[rule.name].count(key, self.timestamp)
+
+
+class StreamingFraudDetection:
+    """
+    Online counterpart of RuleBasedFraudDetection, evaluating the same RuleEngine rules
+    (configs/fraud_rules.yaml, hot reloaded). Each authorization is evaluated as it
+    arrives; velocity and distinct-count rules read per-key sliding-window state kept
+    here instead of a batch list, one window per rule. With a `snapshot_path` the state
+    is snapshotted every `snapshot_interval` seconds by a background thread, never on
+    the request path; close() stops it and writes a final snapshot.
+    """
+
+    def __init__(self, snapshot_path=None, snapshot_interval=60, reference_tables=None, rule_engine=None):
+        self.rule_engine = rule_engine or RuleEngine()
+        self.reference_tables = reference_tables
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.windows = {}
+        self._signatures = {}
+        self._plan = None
+        self._lock = RLock()
+        self._stop_snapshots = Event()
+        self._snapshot_thread = None
+        self._sync_windows(self.rule_engine.plan)
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot(snapshot_path)
+        if snapshot_path:
+            self._snapshot_thread = Thread(target=self._snapshot_loop, daemon=True)
+            self._snapshot_thread.start()
+
+    def _sync_windows(self, plan):
+        """
+        One window per velocity / distinct-count rule of the plan. After a reload,
+        windows of unchanged rules are kept; new or changed rules start empty.
+        """
+        if plan is self._plan:
+            return
+        windows, signatures = {}, {}
+        for rule in plan.rules:
+            signature = _window_signature(rule)
+            if signature is None:
+                continue
+            if self._signatures.get(rule.name) == signature:
+                windows[rule.name] = self.windows[rule.name]
+            else:
+                windows[rule.name] = _new_window(rule)
+            signatures[rule.name] = signature
+        self.windows, self._signatures, self._plan = windows, signatures, plan
+
+    def evaluate(self, transaction):
+        """Records the transaction in the window state and returns the list of broken rules."""
+        with self._lock:
+            return self._evaluate(transaction)
+
+    def _evaluate(self, transaction):
+        if self.reference_tables is not None:
+            self.reference_tables.enrich(transaction)
+        self.rule_engine.maybe_reload()
+        plan = self.rule_engine.plan
+        self._sync_windows(plan)
+        context = StreamingWindowContext(plan, self.windows, epoch_seconds(transaction['transaction_time']))
+
+        # Every transaction is recorded, whichever rules end up breaking
+        for rule in plan.rules:
+            window = self.windows.get(rule.name)
+            if window is None:
+                continue
+            key = context.hashed_key(transaction, rule.key)
+            if not key:
+                continue
+            if isinstance(rule, VelocityRule):
+                if rule.matches_filter(transaction):
+                    window.add(key, context.timestamp)
+            else:
+                value = transaction.get(rule.field)
+                if value is not None:
+                    window.add(key, value, context.timestamp)
+
+        rules_broken = self.rule_engine.evaluate(transaction, context)
+        if rules_broken:
+            logger.debug(f"Transaction {transaction['transaction_id']} broke rules: {rules_broken}")
+        return rules_broken
+
+    def _snapshot_loop(self):
+        while not self._stop_snapshots.wait(self.snapshot_interval):
+            try:
+                self.save_snapshot(self.snapshot_path)
+            except Exception as e:
+                logger.error(f"Failed to snapshot streaming fraud state, retrying next interval: {e}")
+
+    def close(self):
+        """Stops the snapshot thread and writes a final snapshot."""
+        if self._snapshot_thread is not None:
+            self._stop_snapshots.set()
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+            self.save_snapshot(self.snapshot_path)
+
+    def _copy_window_state(self, name):
+        """
+        to_dict() of every key of one rule's window. The lock is only held to list the
+        keys and then for one chunk of keys at a time, so a snapshot of millions of keys
+        never stalls evaluations for longer than a chunk takes to copy.
+        """
+        with self._lock:
+            window = self.windows.get(name)
+            if window is None:
+                return None
+            signature = self._signatures[name]
+            entries = _window_entries(window)
+            keys = list(getattr(window, entries))
+        state = {}
+        for start in range(0, len(keys), SNAPSHOT_CHUNK_KEYS):
+            with self._lock:
+                counters = getattr(window, entries)
+                for key in keys[start:start + SNAPSHOT_CHUNK_KEYS]:
+                    counter = counters.get(key)
+                    if counter is not None:
+                        state[key] = counter.to_dict()
+        return {'signature': signature, 'state': state}
+
+    def save_snapshot(self, path):
+        """
+        Writes the window state of every rule atomically so a crash mid-write never
+        corrupts the last snapshot. Each key is copied consistently; keys may be copied
+        a few milliseconds apart, which only matters at bucket granularity.
+        Serialization and the write happen outside the lock.
+        """
+        with self._lock:
+            names = list(self.windows)
+        windows = {}
+        for name in names:
+            copied = self._copy_window_state(name)
+            if copied is not None:
+                windows[name] = copied
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.fraud_state_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'windows': windows}, f)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        logger.info(f"Saved streaming fraud state snapshot to {path}")
+
+    def _snapshot_windows(self, path):
+        """Saved windows whose rule still exists with the same definition."""
+        with open(path) as f:
+            saved = json.load(f).get('windows', {})
+        return {
+            name: entry['state'] for name, entry in saved.items()
+            if self._signatures.get(name) == entry['signature']
+        }
+
+    def load_snapshot(self, path):
+        """Restores the windows of rules that are unchanged since the snapshot; others start empty."""
+        with self._lock:
+            for name, state in self._snapshot_windows(path).items():
+                self.windows[name].load_dict(state)
+        logger.info(f"Restored streaming fraud state from {path}")
+
+    def merge_sketches_from(self, path):
+        """
+        Folds the distinct-count sketches from another worker's snapshot into this one,
+        so card and IP distinct counts cover traffic handled by every worker.
+        """
+        with self._lock:
+            for name, state in self._snapshot_windows(path).items():
+                counters = self.windows[name]
+                if isinstance(counters, KeyedDistinctCounters):
+                    other = KeyedDistinctCounters(timedelta(seconds=counters.window_seconds), counters.bucket_seconds,
+                                                  counters.precision)
+                    counters.merge(other.load_dict(state))
+        logger.info(f"Merged distinct-count sketches from {path}")
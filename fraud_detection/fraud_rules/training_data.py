@@ -0,0 +1,143 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Configuring logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("FraudTrainingData")
+
+CACHE_FORMAT_VERSION = 1
+CACHE_METADATA_KEY = b'fraud_training_cache'
+DEFAULT_CHUNKSIZE = 500000
+
+
+def infer_downcast_dtypes(csv_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Scans the CSV chunk by chunk and returns the narrowest dtype per column that holds
+    every value: the smallest integer type covering the observed range, float32 for
+    non-integer numbers and category for text. Memory stays bounded by one chunk.
+    """
+    ranges, booleans, floats, text = {}, set(), set(), set()
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        for column in chunk.columns:
+            values = chunk[column]
+            if values.dtype.kind == 'b':
+                booleans.add(column)
+            elif values.dtype.kind in 'iu':
+                low, high = ranges.get(column, (0, 0))
+                ranges[column] = (min(low, int(values.min())), max(high, int(values.max())))
+            elif values.dtype.kind == 'f':
+                floats.add(column)
+            else:
+                text.add(column)
+
+    # A column whose kind differs between chunks takes the widest one seen (text over float over int)
+    dtypes = {column: 'bool' for column in booleans}
+    for column, (low, high) in ranges.items():
+        dtypes[column] = np.result_type(np.min_scalar_type(low), np.min_scalar_type(high)).name
+    for column in floats:
+        dtypes[column] = 'float32'
+    for column in text:
+        dtypes[column] = 'category'
+    return dtypes
+
+
+def _source_fingerprint(csv_path, sample_fraction, label_column, random_state, chunksize):
+    stat = os.stat(csv_path)
+    return {
+        'format_version': CACHE_FORMAT_VERSION,
+        'source': os.path.abspath(csv_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sample_fraction': sample_fraction,
+        'label_column': label_column,
+        'random_state': random_state,
+        # Samples are drawn per chunk, so the chunk size only matters when sampling
+        'chunksize': chunksize if sample_fraction is not None else None,
+    }
+
+
+def cache_path_for(csv_path, cache_dir, sample_fraction=None, label_column='is_fraud', random_state=42):
+    """One cache file per source file and sampling parameters."""
+    key = json.dumps([os.path.abspath(csv_path), sample_fraction, label_column, random_state])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{name}-{digest}.parquet")
+
+
+def is_cache_fresh(cache_path, fingerprint):
+    if not os.path.exists(cache_path):
+        return False
+    metadata = pq.read_schema(cache_path).metadata or {}
+    stored = metadata.get(CACHE_METADATA_KEY)
+    return stored is not None and json.loads(stored) == fingerprint
+
+
+def _stratified_sample(chunk, label_column, fraction, random_state):
+    sampled = chunk.groupby(label_column, observed=True, group_keys=False).sample(
+        frac=fraction, random_state=random_state
+    )
+    return sampled.sort_index()
+
+
+def build_training_cache(csv_path, cache_path, chunksize=DEFAULT_CHUNKSIZE, sample_fraction=None,
+                         label_column='is_fraud', random_state=42):
+    """
+    Converts the CSV into a Parquet cache without holding it in memory: dtypes are
+    inferred in a first pass, then each chunk is parsed with those dtypes, optionally
+    sampled per label (same fraction of every class), and appended as a row group.
+    The file is written under a temporary name and moved into place when complete.
+    """
+    fingerprint = _source_fingerprint(csv_path, sample_fraction, label_column, random_state, chunksize)
+    dtypes = infer_downcast_dtypes(csv_path, chunksize)
+    # Categories differ between chunks, so text is parsed as strings and dictionary-encoded by Parquet
+    read_dtypes = {column: ('string' if dtype == 'category' else dtype) for column, dtype in dtypes.items()}
+
+    directory = os.path.dirname(os.path.abspath(cache_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.training_cache_')
+    os.close(fd)
+    writer = None
+    rows = 0
+    try:
+        for i, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunksize, dtype=read_dtypes)):
+            if sample_fraction is not None:
+                chunk = _stratified_sample(chunk, label_column, sample_fraction, random_state + i)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = table.schema.with_metadata({CACHE_METADATA_KEY: json.dumps(fingerprint)})
+                writer = pq.ParquetWriter(tmp_path, schema, compression='zstd')
+            writer.write_table(table.replace_schema_metadata(schema.metadata))
+            rows += len(chunk)
+        if writer is not None:
+            writer.close()
+            writer = None
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        if writer is not None:
+            writer.close()
+        os.unlink(tmp_path)
+        raise
+
+    logger.info(f"Cached {rows} training rows from {csv_path} to {cache_path}")
+    return cache_path
+
+
+def load_training_data(csv_path, cache_dir, label_column='is_fraud', sample_fraction=None,
+                       random_state=42, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Returns (X, y) from the Parquet cache, building it first if the CSV changed or no
+    cache exists yet. Repeated runs never parse the CSV.
+    """
+    cache_path = cache_path_for(csv_path, cache_dir, sample_fraction, label_column, random_state)
+    fingerprint = _source_fingerprint(csv_path, sample_fraction, label_column, random_state, chunksize)
+    if not is_cache_fresh(cache_path, fingerprint):
+        build_training_cache(csv_path, cache_path, chunksize, sample_fraction, label_column, random_state)
+    data = pd.read_parquet(cache_path)
+    return data.drop(columns=[label_column]), data[label_column]
@@ -0,0 +1,50 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+
+
+class VelocityIndex:
+    """
+    Per-card (or per-`key_field`), time-sorted index over a batch of transactions.
+    Building the index is O(n log n); each window query is two binary searches,
+    so velocity rules no longer rescan the whole batch for every transaction.
+    """
+
+    def __init__(self, transaction_data, key_field='card_number'):
+        grouped = defaultdict(list)
+        for transaction in transaction_data:
+            grouped[transaction[key_field]].append(
+                (transaction['transaction_time'], transaction['status'] == 'declined')
+            )
+
+        self._times = {}
+        self._decline_prefix = {}
+        for card_number, entries in grouped.items():
+            entries.sort(key=lambda entry: entry[0])
+            times = [entry[0] for entry in entries]
+            # prefix[i] = number of declines among the first i transactions of the card
+            prefix = [0] * (len(entries) + 1)
+            for i, (_, declined) in enumerate(entries):
+                prefix[i + 1] = prefix[i] + declined
+            self._times[card_number] = times
+            self._decline_prefix[card_number] = prefix
+
+    def _bounds(self, card_number, transaction_time, window):
+        times = self._times.get(card_number)
+        if not times:
+            return None, 0, 0
+        left = bisect_left(times, transaction_time - window)
+        right = bisect_right(times, transaction_time)
+        return card_number, left, right
+
+    def count_in_window(self, card_number, transaction_time, window):
+        """Number of transactions on the card with time in [transaction_time - window, transaction_time]."""
+        _, left, right = self._bounds(card_number, transaction_time, window)
+        return right - left
+
+    def declines_in_window(self, card_number, transaction_time, window):
+        """Number of declined transactions on the card with time in [transaction_time - window, transaction_time]."""
+        card, left, right = self._bounds(card_number, transaction_time, window)
+        if card is None:
+            return 0
+        prefix = self._decline_prefix[card]
+        return prefix[right] - prefix[left]
@@ -0,0 +1,330 @@
+import os
+import bisect
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import socket
+from datetime import datetime, timezone
+import numpy as np
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ReferenceTables")
+
+TABLE_FORMAT_VERSION = 1
+IP_TABLE_DIR = 'ip_geo'
+BIN_TABLE_DIR = 'card_bins'
+# Each table directory holds versions/<version>/ and a CURRENT file naming the live one
+CURRENT_POINTER = 'CURRENT'
+VERSIONS_DIR = 'versions'
+# Versions kept on disk after a rebuild: the live one plus the one readers may still be opening
+KEEP_VERSIONS = 2
+# BIN ranges are compared on the first 8 digits of the card number
+BIN_DIGITS = 8
+NOT_FOUND = -1
+IPV4_MAX = 2 ** 32 - 1
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ip_to_int(ip_address):
+    """IPv4 address as an unsigned 32-bit integer; None for IPv6 or unparseable input."""
+    if isinstance(ip_address, int):
+        return ip_address if 0 <= ip_address <= IPV4_MAX else None
+    try:
+        # inet_pton is strict and several times faster than the ipaddress module
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, ip_address), 'big')
+    except (OSError, TypeError):
+        return None
+
+
+def bin_prefix(card_number, fill='0'):
+    """First BIN_DIGITS digits of a card number (or BIN) as an integer, padded with `fill`."""
+    digits = str(card_number)
+    if not digits.isdigit():
+        digits = ''.join(c for c in digits if c.isdigit())
+    digits = digits[:BIN_DIGITS]
+    if len(digits) < 6:
+        return None
+    return int(digits.ljust(BIN_DIGITS, fill))
+
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+def current_table_version(directory):
+    """Version named by a table directory's CURRENT pointer."""
+    with open(os.path.join(directory, CURRENT_POINTER)) as f:
+        return f.read().strip()
+
+
+def _prune_versions(directory, keep=KEEP_VERSIONS):
+    versions_dir = os.path.join(directory, VERSIONS_DIR)
+    versions = sorted(name for name in os.listdir(versions_dir) if not name.startswith('.'))
+    for version in versions[:-keep]:
+        shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+
+def _dictionary_encode(values):
+    labels, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    return labels, codes.astype(np.int32)
+
+
+def write_range_table(directory, kind, starts, ends, columns, dictionaries=None):
+    """
+    Writes a range table as one uncompressed .npy file per fixed-width column plus a
+    manifest.json with a sha256 per file. Rows are sorted by range start and must not
+    overlap, so a lookup is one binary search over `start`. `dictionaries` are small
+    label arrays that coded columns index into; they are stored as they are.
+
+    Like model artifacts, every build is a new directory/versions/<version>/, fully
+    written in a staging directory before it is renamed into place; the CURRENT pointer
+    is then replaced atomically. Readers see either the old table or the new one, and
+    files they have mapped are never modified.
+    """
+    starts = np.asarray(starts, dtype=np.uint32)
+    ends = np.asarray(ends, dtype=np.uint32)
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    if np.any(ends < starts):
+        raise ValueError(f"{kind} table has ranges that end before they start")
+    if len(starts) > 1 and np.any(starts[1:] <= ends[:-1]):
+        raise ValueError(f"{kind} table has overlapping ranges")
+
+    arrays = {'start': starts, 'end': ends}
+    arrays.update({name: np.asarray(values)[order] for name, values in columns.items()})
+    arrays.update(dictionaries or {})
+    version = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+    versions_dir = os.path.join(directory, VERSIONS_DIR)
+    os.makedirs(versions_dir, exist_ok=True)
+    target = os.path.join(versions_dir, version)
+    if os.path.exists(target):
+        raise ValueError(f"{kind} table version {version} already exists")
+    staging = tempfile.mkdtemp(dir=versions_dir, prefix='.staging_')
+    try:
+        files = {}
+        for name, array in arrays.items():
+            path = os.path.join(staging, name + '.npy')
+            np.save(path, np.ascontiguousarray(array))
+            files[name] = {'file': name + '.npy', 'sha256': _sha256(path)}
+        manifest = {
+            'format_version': TABLE_FORMAT_VERSION, 'kind': kind, 'version': version,
+            'rows': int(len(starts)), 'files': files,
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    _write_atomic(os.path.join(directory, CURRENT_POINTER), version + '\n')
+    _prune_versions(directory)
+    logger.info(f"Wrote {kind} table version {version} with {len(starts)} ranges to {directory}")
+    return version
+
+
+class RangeTable:
+    """
+    Sorted, non-overlapping integer ranges with fixed-width columns, memory-mapped
+    read-only: every process that opens the same files shares the page cache and
+    nothing is copied at load time. Lookups binary-search the `start` column.
+    """
+
+    def __init__(self, arrays, manifest):
+        self.arrays = arrays
+        self.manifest = manifest
+        # Plain ndarray views of the mapped files for vectorized lookups
+        self.starts = np.asarray(arrays['start'])
+        self.ends = np.asarray(arrays['end'])
+        self.max_key = int(np.iinfo(self.starts.dtype).max)
+        # Single lookups bisect memoryviews over the same pages: indexing one yields a plain
+        # int, which is several times cheaper than a numpy call per lookup
+        self._starts_view = memoryview(self.starts)
+        self._ends_view = memoryview(self.ends)
+
+    @classmethod
+    def load(cls, directory, verify=True):
+        """Opens the version CURRENT points at in a table directory."""
+        directory = os.path.join(directory, VERSIONS_DIR, current_table_version(directory))
+        with open(os.path.join(directory, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest['format_version'] != TABLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported reference table format {manifest['format_version']}")
+        arrays = {}
+        for name, entry in manifest['files'].items():
+            path = os.path.join(directory, entry['file'])
+            if verify and _sha256(path) != entry['sha256']:
+                raise ValueError(f"Checksum mismatch for {entry['file']} in {directory}")
+            arrays[name] = np.load(path, mmap_mode='r')
+        return cls(arrays, manifest)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def find(self, key):
+        """Row index of the range containing `key`, or NOT_FOUND."""
+        if key is None or not 0 <= key <= self.max_key:
+            return NOT_FOUND
+        row = bisect.bisect_right(self._starts_view, key) - 1
+        if row < 0 or key > self._ends_view[row]:
+            return NOT_FOUND
+        return row
+
+    def find_many(self, keys):
+        """Row indexes for an integer array of keys (NOT_FOUND where no range matches)."""
+        keys = np.asarray(keys, dtype=np.int64)
+        if not len(self):
+            return np.full(len(keys), NOT_FOUND, dtype=np.int64)
+        valid = (keys >= 0) & (keys <= self.max_key)
+        # Keys in the column's dtype, or searchsorted would cast the whole column first
+        keys = np.where(valid, keys, 0).astype(self.starts.dtype)
+        rows = np.searchsorted(self.starts, keys, side='right').astype(np.int64) - 1
+        found = valid & (rows >= 0)
+        rows = np.where(found, rows, 0)
+        found &= keys <= self.ends[rows]
+        return np.where(found, rows, NOT_FOUND)
+
+
+class IPGeoTable(RangeTable):
+    """IPv4 range -> (ISO country code, location); location names are dictionary-encoded."""
+
+    def __init__(self, arrays, manifest):
+        super().__init__(arrays, manifest)
+        self.countries = np.asarray(arrays['country'])
+        self.location_codes = np.asarray(arrays['location_code'])
+        self.locations = np.asarray(arrays['locations']).tolist()
+        self._location_codes_view = memoryview(self.location_codes)
+
+    @staticmethod
+    def build(directory, ranges):
+        """`ranges`: iterable of (first IP, last IP, country code, location) tuples."""
+        ranges = list(ranges)
+        locations, location_codes = _dictionary_encode([r[3] for r in ranges])
+        return write_range_table(
+            directory, 'ip_geo',
+            [ip_to_int(r[0]) for r in ranges], [ip_to_int(r[1]) for r in ranges],
+            {'country': np.array([r[2] for r in ranges], dtype='S2'), 'location_code': location_codes},
+            {'locations': locations},
+        )
+
+    def lookup(self, ip_address):
+        row = self.find(ip_to_int(ip_address))
+        if row == NOT_FOUND:
+            return None
+        return self.countries[row].decode('ascii'), self.locations[self._location_codes_view[row]]
+
+    def lookup_many(self, ip_addresses):
+        """(countries, locations) object arrays for a sequence of addresses; None where unknown."""
+        keys = [ip_to_int(ip) for ip in ip_addresses]
+        rows = self.find_many([NOT_FOUND if key is None else key for key in keys])
+        found = rows != NOT_FOUND
+        countries = np.full(len(rows), None, dtype=object)
+        locations = np.full(len(rows), None, dtype=object)
+        countries[found] = np.char.decode(self.countries[rows[found]], 'ascii')
+        locations[found] = np.asarray(self.locations, dtype=object)[self.location_codes[rows[found]]]
+        return countries, locations
+
+
+class BinTable(RangeTable):
+    """Card BIN range -> (card type, ISO issuer country); BINs are padded to BIN_DIGITS digits."""
+
+    def __init__(self, arrays, manifest):
+        super().__init__(arrays, manifest)
+        self.card_type_codes = np.asarray(arrays['card_type_code'])
+        self.issuer_countries = np.asarray(arrays['issuer_country'])
+        self.card_types = np.asarray(arrays['card_types']).tolist()
+        self._card_type_codes_view = memoryview(self.card_type_codes)
+
+    @staticmethod
+    def build(directory, ranges):
+        """`ranges`: iterable of (first BIN, last BIN, card type, issuer country) tuples."""
+        ranges = list(ranges)
+        card_types, card_type_codes = _dictionary_encode([r[2] for r in ranges])
+        return write_range_table(
+            directory, 'card_bins',
+            [bin_prefix(r[0], '0') for r in ranges], [bin_prefix(r[1], '9') for r in ranges],
+            {'card_type_code': card_type_codes.astype(np.uint8), 'issuer_country': np.array([r[3] for r in ranges], dtype='S2')},
+            {'card_types': card_types},
+        )
+
+    def lookup(self, card_number):
+        row = self.find(bin_prefix(card_number))
+        if row == NOT_FOUND:
+            return None
+        return self.card_types[self._card_type_codes_view[row]], self.issuer_countries[row].decode('ascii')
+
+    def lookup_many(self, card_numbers):
+        """(card types, issuer countries) object arrays; None where the BIN is unknown."""
+        keys = [bin_prefix(card_number) for card_number in card_numbers]
+        rows = self.find_many([NOT_FOUND if key is None else key for key in keys])
+        found = rows != NOT_FOUND
+        card_types = np.full(len(rows), None, dtype=object)
+        issuer_countries = np.full(len(rows), None, dtype=object)
+        card_types[found] = np.asarray(self.card_types, dtype=object)[self.card_type_codes[rows[found]]]
+        issuer_countries[found] = np.char.decode(self.issuer_countries[rows[found]], 'ascii')
+        return card_types, issuer_countries
+
+
+class ReferenceTables:
+    """
+    IP geolocation and card BIN tables loaded from one directory (ip_geo/ and card_bins/,
+    either may be absent). Used by RiskScoringEngine and the rule-based detectors to derive
+    location, card type and issuer country instead of trusting caller-provided fields.
+    """
+
+    def __init__(self, ip_table=None, bin_table=None):
+        self.ip_table = ip_table
+        self.bin_table = bin_table
+
+    @classmethod
+    def load(cls, directory, verify=True):
+        tables = {}
+        for name, table_class, subdir in (('ip_table', IPGeoTable, IP_TABLE_DIR), ('bin_table', BinTable, BIN_TABLE_DIR)):
+            path = os.path.join(directory, subdir)
+            if os.path.exists(os.path.join(path, CURRENT_POINTER)):
+                tables[name] = table_class.load(path, verify=verify)
+        logger.info(f"Loaded reference tables from {directory}: {sorted(tables)}")
+        return cls(**tables)
+
+    def geolocate(self, ip_address):
+        if self.ip_table is None or not ip_address:
+            return None
+        return self.ip_table.lookup(ip_address)
+
+    def card_info(self, card_number):
+        if self.bin_table is None or not card_number:
+            return None
+        return self.bin_table.lookup(card_number)
+
+    def enrich(self, transaction):
+        """
+        Adds ip_country/ip_location and card_type/issuer_country to a transaction dict
+        from the tables. The country and location fields are None when a lookup misses,
+        so rules can reference them on every transaction; card_type is only overwritten
+        when the BIN is known.
+        """
+        geo = self.geolocate(transaction.get('ip_address'))
+        if geo:
+            transaction['ip_country'], transaction['ip_location'] = geo
+        card = self.card_info(transaction.get('card_number'))
+        if card:
+            transaction['card_type'], transaction['issuer_country'] = card
+        for field in ('ip_country', 'ip_location', 'issuer_country'):
+            transaction.setdefault(field, None)
+        return transaction
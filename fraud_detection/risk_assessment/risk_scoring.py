@@ -1,6 +1,11 @@
+import copy
 import math
 import logging
 from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from fraud_detection.risk_assessment.user_features import UserFeatureStore
+from fraud_detection.fraud_rules.sketches import epoch_seconds
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
@@ -11,9 +16,29 @@ RISK_LOW = "Low"
 RISK_MEDIUM = "Medium"
 RISK_HIGH = "High"
 
+# Points added per broken rule (multiplied by the rule's weight), in scoring order
+RULE_POINTS = {
+    "large_amount": 10,
+    "unusual_location": 7,
+    "transaction_time": 5,
+    "previous_fraud_score": 8,
+    "card_type": 6,
+    "location_velocity": 6,
+    "transaction_velocity": 5,
+    "issuer_country_mismatch": 6,
+}
+RISKY_CARD_TYPES = ["virtual", "prepaid"]
+PREVIOUS_FRAUD_SCORE_THRESHOLD = 50
+# Sketch-based rules, active only when the engine is given UserActivitySketches
+LOCATION_VELOCITY_LIMIT = 3
+TRANSACTION_VELOCITY_LIMIT = 10
+HIGH_RISK_SCORE = 25
+MEDIUM_RISK_SCORE = 10
+
 # Transaction classes
 class Transaction:
-    def __init__(self, transaction_id, user_id, amount, timestamp, location, card_type, previous_fraud_score):
+    def __init__(self, transaction_id, user_id, amount, timestamp, location, card_type, previous_fraud_score,
+                 ip_address=None, card_number=None, ip_country=None, issuer_country=None, ip_location=None):
         self.transaction_id = transaction_id
         self.user_id = user_id
         self.amount = amount
@@ -21,6 +46,12 @@ class Transaction:
         self.location = location
         self.card_type = card_type
         self.previous_fraud_score = previous_fraud_score
+        # Optional inputs for the reference tables (IP geolocation and card BIN lookups)
+        self.ip_address = ip_address
+        self.card_number = card_number
+        self.ip_country = ip_country
+        self.issuer_country = issuer_country
+        self.ip_location = ip_location
 
 # User behavior data (historical transaction data)
 class UserBehavior:
@@ -38,22 +69,57 @@ class UserBehavior:
 
 # Risk scoring engine
 class RiskScoringEngine:
-    def __init__(self, user_behavior_data, rule_weights):
+    def __init__(self, user_behavior_data, rule_weights, feature_store=None, activity_sketches=None,
+                 reference_tables=None):
         self.user_behavior_data = user_behavior_data
         self.rule_weights = rule_weights
+        # Running per-user aggregates; histories are replayed once instead of on every assessment
+        self.feature_store = feature_store or UserFeatureStore.from_user_behavior(user_behavior_data)
+        self.activity_sketches = activity_sketches
+        # IP geolocation and card BIN tables override the caller's card type and add the IP's
+        # country and location. `location` stays the stated one: user features were built from
+        # those names, and the table's location names are a different vocabulary
+        self.reference_tables = reference_tables
+
+    def apply_reference_data(self, transaction):
+        """
+        Returns the transaction with card type, ip_country/ip_location and issuer country
+        taken from the reference tables where its IP address or card number resolves.
+        """
+        tables = self.reference_tables
+        if tables is None:
+            return transaction
+        geo = tables.geolocate(transaction.ip_address)
+        card = tables.card_info(transaction.card_number)
+        if geo is None and card is None:
+            return transaction
+        resolved = copy.copy(transaction)
+        if geo is not None:
+            resolved.ip_country, resolved.ip_location = geo
+        if card is not None:
+            resolved.card_type, resolved.issuer_country = card
+        return resolved
+
+    def record_transaction(self, transaction):
+        """Adds a completed transaction to the user's running features."""
+        transaction = self.apply_reference_data(transaction)
+        self.feature_store.update(transaction)
+        if self.activity_sketches is not None:
+            self.activity_sketches.update(transaction)
 
     def assess_risk(self, transaction):
-        logger.info(f"Assessing risk for transaction ID: {transaction.transaction_id}")
+        logger.debug(f"Assessing risk for transaction ID: {transaction.transaction_id}")
 
         score = 0
-        user_behavior = self.user_behavior_data.get(transaction.user_id)
+        transaction = self.apply_reference_data(transaction)
+        user_features = self.feature_store.get(transaction.user_id)
 
-        if user_behavior:
+        if user_features:
             # Large transaction amounts
-            score += self._score_large_amount(transaction, user_behavior)
+            score += self._score_large_amount(transaction, user_features)
 
             # Unusual location
-            score += self._score_unusual_location(transaction, user_behavior)
+            score += self._score_unusual_location(transaction, user_features)
 
             # Time of transaction
             score += self._score_transaction_time(transaction)
@@ -64,52 +130,189 @@ class RiskScoringEngine:
             # Card type
             score += self._score_card_type(transaction)
 
+            # Windowed activity (sketch estimates)
+            score += self._score_location_velocity(transaction)
+            score += self._score_transaction_velocity(transaction)
+
+            # Card issued in a different country than the IP address
+            score += self._score_issuer_country_mismatch(transaction)
+
         risk_level = self._determine_risk_level(score)
-        logger.info(f"Transaction ID: {transaction.transaction_id}, Risk Score: {score}, Risk Level: {risk_level}")
+        logger.debug(f"Transaction ID: {transaction.transaction_id}, Risk Score: {score}, Risk Level: {risk_level}")
         return risk_level
 
-    def _score_large_amount(self, transaction, user_behavior):
-        average_amount = user_behavior.average_transaction_amount()
+    def _score_large_amount(self, transaction, user_features):
+        average_amount = user_features.average_amount()
         threshold = average_amount * 2
         if transaction.amount > threshold:
             weight = self.rule_weights.get("large_amount", 1)
-            return weight * 10  # High penalty for large amounts
+            return weight * RULE_POINTS["large_amount"]  # High penalty for large amounts
         return 0
 
-    def _score_unusual_location(self, transaction, user_behavior):
-        frequent_locations = user_behavior.frequent_locations()
-        if transaction.location not in frequent_locations:
+    def _score_unusual_location(self, transaction, user_features):
+        if not user_features.has_location(transaction.location):
             weight = self.rule_weights.get("unusual_location", 1)
-            return weight * 7  # Medium penalty for unusual location
+            return weight * RULE_POINTS["unusual_location"]  # Medium penalty for unusual location
         return 0
 
     def _score_transaction_time(self, transaction):
         transaction_hour = transaction.timestamp.hour
         if transaction_hour < 6 or transaction_hour > 22:  # Unusual times
             weight = self.rule_weights.get("transaction_time", 1)
-            return weight * 5  # Medium penalty for odd transaction times
+            return weight * RULE_POINTS["transaction_time"]  # Medium penalty for odd transaction times
         return 0
 
     def _score_previous_fraud(self, transaction):
-        if transaction.previous_fraud_score > 50:
+        if transaction.previous_fraud_score > PREVIOUS_FRAUD_SCORE_THRESHOLD:
             weight = self.rule_weights.get("previous_fraud_score", 1)
-            return weight * 8  # High penalty for prior fraud scores
+            return weight * RULE_POINTS["previous_fraud_score"]  # High penalty for prior fraud scores
         return 0
 
     def _score_card_type(self, transaction):
-        if transaction.card_type in ["virtual", "prepaid"]:
+        if transaction.card_type in RISKY_CARD_TYPES:
             weight = self.rule_weights.get("card_type", 1)
-            return weight * 6  # Medium penalty for risky card types
+            return weight * RULE_POINTS["card_type"]  # Medium penalty for risky card types
+        return 0
+
+    def _score_location_velocity(self, transaction):
+        if self.activity_sketches is None:
+            return 0
+        now = epoch_seconds(transaction.timestamp)
+        if self.activity_sketches.distinct_location_count(transaction.user_id, now) > LOCATION_VELOCITY_LIMIT:
+            weight = self.rule_weights.get("location_velocity", 1)
+            return weight * RULE_POINTS["location_velocity"]  # Many distinct locations in the last day
+        return 0
+
+    def _score_transaction_velocity(self, transaction):
+        if self.activity_sketches is None:
+            return 0
+        now = epoch_seconds(transaction.timestamp)
+        if self.activity_sketches.transaction_count(transaction.user_id, now) > TRANSACTION_VELOCITY_LIMIT:
+            weight = self.rule_weights.get("transaction_velocity", 1)
+            return weight * RULE_POINTS["transaction_velocity"]  # Burst of transactions in the last hour
+        return 0
+
+    def _score_issuer_country_mismatch(self, transaction):
+        if transaction.ip_country and transaction.issuer_country and transaction.ip_country != transaction.issuer_country:
+            weight = self.rule_weights.get("issuer_country_mismatch", 1)
+            return weight * RULE_POINTS["issuer_country_mismatch"]  # Card used away from its issuing country
         return 0
 
     def _determine_risk_level(self, score):
-        if score > 25:
+        if score > HIGH_RISK_SCORE:
             return RISK_HIGH
-        elif 10 < score <= 25:
+        elif MEDIUM_RISK_SCORE < score <= HIGH_RISK_SCORE:
             return RISK_MEDIUM
         else:
             return RISK_LOW
 
+    # Batch scoring
+    def assess_batch(self, transactions):
+        """
+        Risk levels for a batch of transactions given as columns (a DataFrame or a dict of
+        arrays named like the Transaction attributes). Every rule is evaluated as a
+        boolean array and the result matches assess_risk row for row.
+        """
+        scores = self.score_batch(transactions)
+        levels = np.select(
+            [scores > HIGH_RISK_SCORE, scores > MEDIUM_RISK_SCORE],
+            [RISK_HIGH, RISK_MEDIUM],
+            default=RISK_LOW,
+        )
+        logger.info(f"Assessed risk for {len(scores)} transactions: "
+                    f"{int((levels == RISK_HIGH).sum())} high, {int((levels == RISK_MEDIUM).sum())} medium")
+        return levels
+
+    def score_batch(self, transactions):
+        """Risk scores for a columnar batch; see assess_batch."""
+        columns = transactions if isinstance(transactions, pd.DataFrame) else pd.DataFrame(transactions)
+        columns = self._apply_reference_columns(columns)
+        amounts = columns["amount"].to_numpy(dtype=np.float64)
+        hours = pd.DatetimeIndex(columns["timestamp"]).hour.to_numpy()
+        known_user, large_amount, unusual_location = self._score_user_features_batch(columns, amounts)
+
+        # As in assess_risk, transactions of users without features score 0
+        rule_hits = {
+            "large_amount": known_user & large_amount,
+            "unusual_location": known_user & unusual_location,
+            "transaction_time": known_user & ((hours < 6) | (hours > 22)),
+            "previous_fraud_score": known_user & (columns["previous_fraud_score"].to_numpy() > PREVIOUS_FRAUD_SCORE_THRESHOLD),
+            "card_type": known_user & columns["card_type"].isin(RISKY_CARD_TYPES).to_numpy(),
+        }
+        rule_hits.update(self._score_activity_batch(columns, known_user))
+        missing = pd.Series(None, index=columns.index, dtype=object)
+        ip_country, issuer_country = columns.get("ip_country", missing), columns.get("issuer_country", missing)
+        rule_hits["issuer_country_mismatch"] = known_user & (
+            ip_country.notna() & issuer_country.notna() & (ip_country != issuer_country)
+        ).to_numpy()
+        weights = np.array([self.rule_weights.get(rule, 1) * points for rule, points in RULE_POINTS.items()])
+
+        # Components are added one at a time, in assess_risk's order, so float sums match exactly
+        scores = np.zeros(len(columns))
+        for rule, weight in zip(RULE_POINTS, weights):
+            scores += np.where(rule_hits[rule], weight, 0)
+        return scores
+
+    def _apply_reference_columns(self, columns):
+        # Column-wise counterpart of apply_reference_data, with one vectorized binary search per table
+        tables = self.reference_tables
+        if tables is None:
+            return columns
+        missing = pd.Series(None, index=columns.index, dtype=object)
+        updates = {}
+        if tables.ip_table is not None and "ip_address" in columns:
+            countries, locations = tables.ip_table.lookup_many(columns["ip_address"].tolist())
+            found = pd.notna(locations)
+            updates["ip_location"] = np.where(found, locations, columns.get("ip_location", missing).to_numpy(dtype=object))
+            updates["ip_country"] = np.where(found, countries, columns.get("ip_country", missing).to_numpy(dtype=object))
+        if tables.bin_table is not None and "card_number" in columns:
+            card_types, issuer_countries = tables.bin_table.lookup_many(columns["card_number"].tolist())
+            found = pd.notna(card_types)
+            updates["card_type"] = np.where(found, card_types, columns["card_type"].to_numpy(dtype=object))
+            updates["issuer_country"] = np.where(
+                found, issuer_countries, columns.get("issuer_country", missing).to_numpy(dtype=object)
+            )
+        return columns.assign(**updates)
+
+    def _score_activity_batch(self, columns, known_user):
+        if self.activity_sketches is None:
+            no_hits = np.zeros(len(columns), dtype=bool)
+            return {"location_velocity": no_hits, "transaction_velocity": no_hits}
+        # Sketch lookups are per (user, time) and cannot be vectorized
+        sketches = self.activity_sketches
+        user_ids = columns["user_id"].tolist()
+        times = [epoch_seconds(timestamp) for timestamp in pd.DatetimeIndex(columns["timestamp"]).to_pydatetime()]
+        locations = np.array([sketches.distinct_location_count(u, t) for u, t in zip(user_ids, times)])
+        counts = np.array([sketches.transaction_count(u, t) for u, t in zip(user_ids, times)])
+        return {
+            "location_velocity": known_user & (locations > LOCATION_VELOCITY_LIMIT),
+            "transaction_velocity": known_user & (counts > TRANSACTION_VELOCITY_LIMIT),
+        }
+
+    def _score_user_features_batch(self, columns, amounts):
+        # Per-user features are looked up once per distinct user, not once per row
+        user_codes, users = pd.factorize(columns["user_id"], use_na_sentinel=False)
+        location_codes, locations = pd.factorize(columns["location"], use_na_sentinel=False)
+        location_index = {location: code for code, location in enumerate(locations)}
+
+        known = np.zeros(len(users), dtype=bool)
+        average = np.zeros(len(users))
+        familiar_pairs = []
+        for code, user_id in enumerate(users):
+            user_features = self.feature_store.get(user_id)
+            if user_features is None:
+                continue
+            known[code] = True
+            average[code] = user_features.average_amount()
+            familiar_pairs.extend(
+                code * len(locations) + location_index[location]
+                for location in user_features.locations if location in location_index
+            )
+
+        row_pairs = user_codes.astype(np.int64) * len(locations) + location_codes
+        unusual_location = ~np.isin(row_pairs, np.array(familiar_pairs, dtype=np.int64))
+        return known[user_codes], amounts > average[user_codes] * 2, unusual_location
+
 # Helper function for transaction history simulation
 def generate_user_behavior(user_id, num_transactions):
     transaction_history = []
@@ -0,0 +1,170 @@
+import logging
+from datetime import timedelta
+import numpy as np
+from fraud_detection.fraud_rules.sketches import KeyedDistinctCounters, WindowedCountMin, epoch_seconds
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("UserFeatureStore")
+
+DEFAULT_TOP_K_LOCATIONS = 16
+
+
+class UserFeatures:
+    """
+    Running aggregates for one user. Every field is updated in O(1) per transaction
+    (O(k) for the bounded location table), so reading features costs the same
+    whatever the length of the user's history.
+    Locations are tracked with the space-saving algorithm: at most `top_k` entries,
+    and when a new location arrives with the table full it replaces the least frequent
+    one, inheriting its count. Users with at most `top_k` distinct locations keep them all.
+    """
+
+    __slots__ = ('count', 'amount_sum', 'last_seen', 'locations')
+
+    def __init__(self):
+        self.count = 0
+        self.amount_sum = 0.0
+        self.last_seen = None
+        # location -> [count, last seen timestamp]
+        self.locations = {}
+
+    def update(self, amount, timestamp, location, top_k=DEFAULT_TOP_K_LOCATIONS):
+        self.count += 1
+        self.amount_sum += amount
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+
+        entry = self.locations.get(location)
+        if entry is not None:
+            entry[0] += 1
+            entry[1] = max(entry[1], timestamp)
+        elif len(self.locations) < top_k:
+            self.locations[location] = [1, timestamp]
+        else:
+            evicted = min(self.locations, key=lambda name: self.locations[name][0])
+            evicted_count = self.locations.pop(evicted)[0]
+            self.locations[location] = [evicted_count + 1, timestamp]
+
+    def average_amount(self):
+        return self.amount_sum / self.count if self.count else 0
+
+    def has_location(self, location):
+        return location in self.locations
+
+    def top_locations(self, k=None):
+        ranked = sorted(self.locations, key=lambda name: self.locations[name][0], reverse=True)
+        return ranked[:k] if k else ranked
+
+    def location_last_seen(self, location):
+        entry = self.locations.get(location)
+        return entry[1] if entry else None
+
+
+class UserFeatureStore:
+    """Per-user running aggregates for RiskScoringEngine, updated as transactions are recorded."""
+
+    def __init__(self, top_k=DEFAULT_TOP_K_LOCATIONS):
+        self.top_k = top_k
+        self.users = {}
+
+    @classmethod
+    def from_user_behavior(cls, user_behavior_data, **kwargs):
+        """One-off bootstrap from UserBehavior histories, replayed oldest first."""
+        store = cls(**kwargs)
+        for user_id, user_behavior in user_behavior_data.items():
+            # Users without history still get (empty) features, as they had a UserBehavior
+            store.users.setdefault(user_id, UserFeatures())
+            for transaction in sorted(user_behavior.transaction_history, key=lambda tx: tx.timestamp):
+                store.update(transaction)
+        return store
+
+    def get(self, user_id):
+        return self.users.get(user_id)
+
+    def update(self, transaction):
+        features = self.users.get(transaction.user_id)
+        if features is None:
+            features = self.users[transaction.user_id] = UserFeatures()
+        features.update(transaction.amount, epoch_seconds(transaction.timestamp), transaction.location, self.top_k)
+        return features
+
+    def save(self, path):
+        """
+        Stores the aggregates as flat arrays in a single .npz: one row per user and one
+        row per tracked (user, location) pair. No pickling is involved.
+        """
+        user_ids = list(self.users)
+        features = [self.users[user_id] for user_id in user_ids]
+        location_users, location_names, location_counts, location_seen = [], [], [], []
+        for index, feature in enumerate(features):
+            for location, (count, seen) in feature.locations.items():
+                location_users.append(index)
+                location_names.append(location)
+                location_counts.append(count)
+                location_seen.append(seen)
+        np.savez_compressed(
+            path,
+            settings=np.array([self.top_k]),
+            # Integer ids stay integers, anything else is stored as text
+            user_ids=np.array(user_ids),
+            count=np.array([f.count for f in features], dtype=np.int64),
+            amount_sum=np.array([f.amount_sum for f in features], dtype=np.float64),
+            last_seen=np.array([f.last_seen for f in features], dtype=np.float64),
+            location_users=np.array(location_users, dtype=np.int64),
+            location_names=np.array(location_names, dtype=str),
+            location_counts=np.array(location_counts, dtype=np.int64),
+            location_seen=np.array(location_seen, dtype=np.float64),
+        )
+        logger.info(f"Saved features for {len(user_ids)} users to {path}")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            # Files written before the amount EWMA was dropped carry its alpha after top_k
+            store = cls(top_k=int(data['settings'][0]))
+            features = []
+            for user_id, count, amount_sum, last_seen in zip(
+                data['user_ids'].tolist(), data['count'].tolist(), data['amount_sum'].tolist(),
+                data['last_seen'].tolist()
+            ):
+                feature = UserFeatures()
+                feature.count, feature.amount_sum = count, amount_sum
+                feature.last_seen = last_seen
+                store.users[user_id] = feature
+                features.append(feature)
+            for index, location, count, seen in zip(
+                data['location_users'].tolist(), data['location_names'].tolist(),
+                data['location_counts'].tolist(), data['location_seen'].tolist()
+            ):
+                features[index].locations[location] = [count, seen]
+        return store
+
+
+class UserActivitySketches:
+    """
+    Windowed, approximate activity features per user: distinct locations (HyperLogLog per
+    user) and transaction counts (one Count-Min sketch shared by all users). Sketches from
+    different workers can be merged.
+    """
+
+    def __init__(self, location_window=timedelta(hours=24), velocity_window=timedelta(hours=1),
+                 precision=8, width=2048, depth=4):
+        self.distinct_locations = KeyedDistinctCounters(location_window, bucket_seconds=4 * 3600, precision=precision)
+        self.transactions = WindowedCountMin(velocity_window.total_seconds(), 600, width, depth)
+
+    def update(self, transaction):
+        timestamp = epoch_seconds(transaction.timestamp)
+        self.distinct_locations.add(transaction.user_id, transaction.location, timestamp)
+        self.transactions.add(transaction.user_id, timestamp)
+
+    def distinct_location_count(self, user_id, now):
+        return self.distinct_locations.count(user_id, now)
+
+    def transaction_count(self, user_id, now):
+        return self.transactions.estimate(user_id, now)
+
+    def merge(self, other):
+        self.distinct_locations.merge(other.distinct_locations)
+        self.transactions.merge(other.transactions)
+        return self
@@ -0,0 +1,164 @@
+import json
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Thread, Event
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import and_, or_
+from backend.src.models.outbox_model import EmailOutboxModel
+from backend.src.config.database_config import get_session
+from backend.src.utils.email_util import send_subscription_email
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Emails that keep failing are parked after this many attempts
+MAX_DELIVERY_ATTEMPTS = 5
+# A claim older than this is assumed to belong to a dead dispatcher and is taken over
+CLAIM_TIMEOUT_SECONDS = 600
+
+# Outbox row as claimed; delivery works on this copy, outside of any session
+ClaimedEmail = namedtuple('ClaimedEmail', ['id', 'recipient', 'subject', 'payload', 'attempts', 'claimed_at'])
+
+
+def enqueue_email(session, recipient, subject, payload):
+    """
+    Records an email intent in the outbox using the caller's session.
+    Nothing is committed here: the row is written in the same transaction as the
+    business change, so either both persist or neither does.
+    """
+    outbox_email = EmailOutboxModel(
+        recipient=recipient,
+        subject=subject,
+        payload=json.dumps(payload, default=str),
+    )
+    session.add(outbox_email)
+    return outbox_email
+
+
+class OutboxDispatcher:
+    def __init__(self, batch_size=100, workers=8, interval=2, session_factory=get_session):
+        """
+        Drains pending outbox emails in batches and delivers them on a worker pool,
+        so SMTP latency never sits on the request path.
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.workers = workers
+        self.interval = interval
+        self.stop_event = Event()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def start(self):
+        logger.info("Starting Email Outbox Dispatcher")
+        dispatcher_thread = Thread(target=self.run, daemon=True)
+        dispatcher_thread.start()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                dispatched = self.dispatch_batch()
+            except Exception as e:
+                logger.error(f"An error occurred while dispatching outbox emails: {e}")
+                dispatched = 0
+            # Keep draining while there is a backlog, otherwise poll on the interval
+            if dispatched < self.batch_size:
+                self.stop_event.wait(self.interval)
+
+    def stop(self):
+        logger.info("Stopping Email Outbox Dispatcher")
+        self.stop_event.set()
+        self.executor.shutdown(wait=True)
+
+    def dispatch_batch(self):
+        """
+        Claims one batch of pending emails, sends them concurrently and records the outcome.
+        The claim is committed before any SMTP call, so no row lock or transaction is held
+        while emails are in flight; SKIP LOCKED keeps concurrent claims from overlapping.
+        """
+        emails = self.claim_batch()
+        if not emails:
+            return 0
+        results = list(self.executor.map(self._deliver, emails))
+        self.record_results(emails, results)
+        logger.info(f"Dispatched {len(emails)} outbox emails.")
+        return len(emails)
+
+    def claim_batch(self):
+        """
+        Marks up to batch_size pending emails as 'sending' and commits. Claims left behind
+        by a dispatcher that died mid-batch are taken over once CLAIM_TIMEOUT_SECONDS pass.
+        Returns detached copies of the claimed rows.
+        """
+        session = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            claimable = or_(
+                EmailOutboxModel.status == 'pending',
+                and_(EmailOutboxModel.status == 'sending',
+                     EmailOutboxModel.claimed_at < now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)),
+            )
+            rows = (
+                session.query(EmailOutboxModel)
+                .filter(claimable)
+                .order_by(EmailOutboxModel.created_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            claimed = []
+            for row in rows:
+                # Counted at claim time, so an email that crashes its dispatcher still runs out of attempts
+                row.status, row.claimed_at, row.attempts = 'sending', now, row.attempts + 1
+                claimed.append(ClaimedEmail(row.id, row.recipient, row.subject, row.payload, row.attempts, now))
+            session.commit()
+            return claimed
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def record_results(self, emails, results):
+        """Records delivery outcomes for rows this dispatcher still holds the claim on."""
+        session = self.session_factory()
+        try:
+            rows = {
+                row.id: row for row in
+                session.query(EmailOutboxModel).filter(EmailOutboxModel.id.in_([email.id for email in emails])).all()
+            }
+            now = datetime.utcnow()
+            for email, error in zip(emails, results):
+                row = rows.get(email.id)
+                if row is None or row.status != 'sending' or row.claimed_at != email.claimed_at:
+                    # Taken over after the claim timed out; the other dispatcher records it
+                    continue
+                row.claimed_at = None
+                if error is None:
+                    row.status, row.sent_at, row.last_error = 'sent', now, None
+                else:
+                    row.last_error = error
+                    if email.attempts >= MAX_DELIVERY_ATTEMPTS:
+                        row.status = 'dead'
+                        logger.error(f"Giving up on outbox email {email.id} to {email.recipient}: {error}")
+                    else:
+                        row.status = 'pending'
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _deliver(self, email):
+        try:
+            if send_subscription_email(email.recipient, email.subject, json.loads(email.payload)) is False:
+                return "Email delivery failed"
+            return None
+        except Exception as e:
+            return str(e)
+
+
+if __name__ == "__main__":
+    dispatcher = OutboxDispatcher()
+    dispatcher.run()
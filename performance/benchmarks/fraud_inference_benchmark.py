@@ -0,0 +1,82 @@
+import time
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from fraud_detection.fraud_rules.ml_detection import MLFraudDetection
+from fraud_detection.fraud_rules.inference_server import FraudInferenceServer
+
+# Inference benchmark: concurrent clients scoring one transaction at a time,
+# either by calling MLFraudDetection.predict directly or through the micro-batching server.
+
+FEATURES = ['transaction_amount', 'transaction_type', 'merchant_id', 'user_id', 'country']
+
+
+def train_detector(rows, seed=42):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({
+        'transaction_amount': rng.gamma(2.0, 800.0, rows),
+        'transaction_type': rng.integers(0, 2, rows),
+        'merchant_id': rng.integers(0, 50, rows),
+        'user_id': rng.integers(0, 1000, rows),
+        'country': rng.integers(0, 5, rows),
+    })
+    y = ((X['transaction_amount'] > 4000) & (X['country'] == 1)) | (rng.random(rows) < 0.02)
+    detector = MLFraudDetection(data_path=None)
+    detector.split_data(detector.preprocess_data(X), y.astype(int))
+    detector.train_model()
+    return detector, X
+
+
+def run_clients(score, samples, clients, requests_per_client):
+    latencies = [[] for _ in range(clients)]
+
+    def client(index):
+        for i in range(requests_per_client):
+            row = samples[(index * requests_per_client + i) % len(samples)]
+            start = time.perf_counter()
+            score(row)
+            latencies[index].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return np.concatenate([np.array(l) for l in latencies]) * 1000, elapsed
+
+
+def report(name, latencies, elapsed):
+    print(f"{name}: p50 {np.percentile(latencies, 50):.2f} ms, p99 {np.percentile(latencies, 99):.2f} ms, "
+          f"{len(latencies) / elapsed:,.0f} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraud model inference benchmark")
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=100, help="Requests per client")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-wait-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    detector, X = train_detector(20000)
+    detector.model.set_params(n_jobs=1)
+    samples = X.head(1000).to_numpy().tolist()
+
+    def per_request(row):
+        return detector.predict(pd.DataFrame([row], columns=FEATURES))
+
+    latencies, elapsed = run_clients(per_request, samples, args.clients, args.requests)
+    report("Per-request", latencies, elapsed)
+
+    server = FraudInferenceServer(detector, max_batch_size=args.batch_size, max_wait_ms=args.max_wait_ms).start()
+    latencies, elapsed = run_clients(server.score, samples, args.clients, args.requests)
+    server.stop()
+    report("Micro-batched", latencies, elapsed)
+    print(f"Server stats: {server.stats()}")
+
+
+if __name__ == "__main__":
+    main()
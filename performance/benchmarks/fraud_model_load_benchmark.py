@@ -0,0 +1,87 @@
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from fraud_detection.fraud_rules.model_artifacts import save_model_artifacts, load_model_artifacts
+
+# Model load benchmark: N worker processes each load the fraud model, either from the
+# joblib pickles written by MLFraudDetection.save_model or from a memory-mapped artifact.
+# Memory figures come from /proc/self/smaps_rollup (Linux only).
+
+
+def memory_mb():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return values['Rss'], values['Pss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def worker(kind, path, sample, barrier, results):
+    start = time.perf_counter()
+    if kind == 'joblib':
+        model = joblib.load(path + '_model.pkl')
+        scaler = joblib.load(path + '_scaler.pkl')
+    else:
+        loaded = load_model_artifacts(path, verify=False)
+        model, scaler = loaded.model, loaded.scaler
+    load_seconds = time.perf_counter() - start
+    model.predict_proba(scaler.transform(sample))
+    # Wait until every worker holds the model so shared pages are split between them
+    barrier.wait()
+    rss, pss, private = memory_mb()
+    results.put((load_seconds, rss, pss, private))
+    barrier.wait()
+
+
+def run_workers(kind, path, sample, workers):
+    context = multiprocessing.get_context('spawn')
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(kind, path, sample, barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measurements = np.array([results.get() for _ in processes])
+    for process in processes:
+        process.join()
+    load_ms, rss, pss, private = measurements.mean(axis=0)
+    print(f"{kind:>8}: cold load {load_ms * 1000:.0f} ms, per worker RSS {rss:.0f} MB, "
+          f"PSS {pss:.0f} MB, private {private:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraud model load benchmark")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--trees', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    X = rng.random((args.rows, 5))
+    y = (X[:, 0] + rng.random(args.rows) * 0.5 > 0.9).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=args.trees, random_state=42, n_jobs=-1).fit(scaler.transform(X), y)
+    model.set_params(n_jobs=1)
+    sample = X[:100]
+
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_path = os.path.join(directory, 'fraud_detection')
+        joblib.dump(model, pickle_path + '_model.pkl')
+        joblib.dump(scaler, pickle_path + '_scaler.pkl')
+        artifact_dir = os.path.join(directory, 'artifacts')
+        save_model_artifacts(model, scaler, artifact_dir)
+        print(f"Pickle size {os.path.getsize(pickle_path + '_model.pkl') / 1e6:.0f} MB, {args.workers} workers")
+
+        run_workers('joblib', pickle_path, sample, args.workers)
+        run_workers('mmap', artifact_dir, sample, args.workers)
+
+
+if __name__ == "__main__":
+    main()
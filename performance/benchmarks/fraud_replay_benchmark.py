@@ -0,0 +1,93 @@
+import copy
+import logging
+import argparse
+from datetime import datetime
+import numpy as np
+from fraud_detection.fraud_rules.replay_harness import ReplayConfig, ShadowReplay, load_stream
+from fraud_detection.fraud_rules.rule_based_detection import RuleBasedFraudDetection
+from fraud_detection.fraud_rules.rule_engine import RuleEngine, DEFAULT_RULES_PATH, load_rule_definitions
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, generate_user_behavior
+from performance.benchmarks.fraud_inference_benchmark import train_detector
+
+# Replay benchmark: a transaction stream through the rule, risk and ML components with
+# the baseline configuration, and a candidate configuration (lower large-amount rule
+# threshold, lower ML threshold, optionally rules disabled in the config switched on) in
+# shadow mode. Reports throughput, per-component latency percentiles and how the
+# candidate's decisions differ; this is the backtest a disabled rule needs before it is
+# enabled in configs/fraud_rules.yaml.
+
+RULE_WEIGHTS = {"large_amount": 1.5, "unusual_location": 1.2, "transaction_time": 1.1,
+                "previous_fraud_score": 1.8, "card_type": 1.3}
+COUNTRIES = np.array(['United States', 'Canada', 'Germany', 'Iran', 'France'])
+LOCATIONS = np.array(["New York", "San Francisco", "Los Angeles", "Chicago", "Miami", "Las Vegas"])
+CARD_TYPES = np.array(["credit", "debit", "virtual", "prepaid"])
+ML_FEATURES = ['amount', 'transaction_type', 'merchant_id', 'user_index', 'country_code']
+
+
+def generate_stream(count, users, seed=7):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01T00:00:00')
+    times = np.sort(start + rng.integers(0, 7 * 24 * 3600, count).astype('timedelta64[s]')).astype(datetime)
+    user_index = rng.integers(0, users, count)
+    country_code = rng.integers(0, len(COUNTRIES), count)
+    amounts = np.round(rng.gamma(2.0, 1500.0, count), 2)
+    transaction_type = rng.integers(0, 2, count)
+    merchant_id = rng.integers(0, 50, count)
+    cards = rng.integers(0, max(1, count // 20), count)
+    return [
+        {
+            'transaction_id': f'txn_{i}', 'user_id': f'user{user_index[i]}', 'amount': float(amounts[i]),
+            'country': COUNTRIES[country_code[i]], 'card_number': f'card_{cards[i]}', 'transaction_time': times[i],
+            'status': 'declined' if rng.random() < 0.1 else 'approved',
+            'location': LOCATIONS[rng.integers(0, len(LOCATIONS))], 'card_type': CARD_TYPES[rng.integers(0, len(CARD_TYPES))],
+            'previous_fraud_score': int(rng.integers(0, 100)),
+            'transaction_type': int(transaction_type[i]), 'merchant_id': int(merchant_id[i]),
+            'user_index': int(user_index[i]), 'country_code': int(country_code[i]),
+        }
+        for i in range(count)
+    ]
+
+
+def build_config(name, large_amount, ml_detector, behavior, enable_rules=()):
+    definitions = load_rule_definitions(DEFAULT_RULES_PATH)
+    for definition in definitions:
+        if definition['name'] == 'large_amount':
+            definition['value'] = large_amount
+        if definition['name'] in enable_rules:
+            definition['enabled'] = True
+    rule_detector = RuleBasedFraudDetection([], RuleEngine(definitions=definitions))
+    return ReplayConfig(name, rule_detector, RiskScoringEngine(behavior, RULE_WEIGHTS), ml_detector,
+                        ml_features=lambda transaction: [transaction[feature] for feature in ML_FEATURES])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraud replay and shadow-evaluation benchmark")
+    parser.add_argument('--transactions', type=int, default=20000)
+    parser.add_argument('--input', help="Recorded stream (CSV or Parquet) with the generated stream's columns")
+    parser.add_argument('--rate', type=float, default=0, help="Replay rate in transactions per second (0: unthrottled)")
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--candidate-large-amount', type=float, default=8000)
+    parser.add_argument('--candidate-threshold', type=float, default=0.3)
+    parser.add_argument('--candidate-rules', nargs='*', default=[],
+                        help="Disabled rules to enable in the candidate configuration")
+    args = parser.parse_args()
+    for name in ("RiskScoring", "FraudDetection", "FraudReplay"):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    stream = load_stream(args.input) if args.input else generate_stream(args.transactions, args.users)
+    behavior = {f"user{u}": generate_user_behavior(f"user{u}", 10) for u in range(args.users)}
+    detector, _ = train_detector(20000)
+    detector.compile_model()
+    # The candidate shares the trained forest and only moves the decision threshold
+    candidate_detector = copy.copy(detector)
+    candidate_detector.threshold = args.candidate_threshold
+
+    baseline = build_config("baseline", 10000, detector, behavior)
+    candidate = build_config("candidate", args.candidate_large_amount, candidate_detector, behavior,
+                             args.candidate_rules)
+    report = ShadowReplay(baseline, candidate, rate=args.rate or None).run(stream)
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
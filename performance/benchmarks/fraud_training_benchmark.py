@@ -0,0 +1,96 @@
+import os
+import time
+import resource
+import argparse
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+
+# Training pipeline benchmark: the original in-memory CSV flow against the cached,
+# downcast pipeline (cold cache, then warm cache). Each run happens in a fresh process
+# so its peak RSS (ru_maxrss) is measured in isolation.
+
+
+def write_transactions_csv(path, rows, seed=42, chunk=500000):
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk):
+        n = min(chunk, rows - start)
+        frame = pd.DataFrame({
+            'transaction_amount': np.round(rng.gamma(2.0, 800.0, n), 2),
+            'transaction_type': rng.integers(0, 2, n),
+            'merchant_id': rng.integers(0, 500, n),
+            'user_id': rng.integers(0, 100000, n),
+            'country': rng.integers(0, 30, n),
+            'hour': rng.integers(0, 24, n),
+        })
+        fraud = (frame['transaction_amount'] > 4000) & (frame['country'] == 7) | (rng.random(n) < 0.01)
+        frame['is_fraud'] = fraud.astype(int)
+        frame.to_csv(path, mode='a' if start else 'w', header=start == 0, index=False)
+
+
+def run_baseline(csv_path, trees, sample_fraction, cache_dir):
+    # The pipeline as it was: default dtypes, float64 scaling, single-threaded forest
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    start = time.perf_counter()
+    data = pd.read_csv(csv_path)
+    X, y = data.drop(columns=['is_fraud']), data['is_fraud']
+    load_seconds = time.perf_counter() - start
+    X_train, _, y_train, _ = train_test_split(StandardScaler().fit_transform(X), y, test_size=0.2, random_state=42)
+    RandomForestClassifier(n_estimators=trees, random_state=42).fit(X_train, y_train)
+    return load_seconds
+
+
+def run_pipeline(csv_path, trees, sample_fraction, cache_dir):
+    from fraud_detection.fraud_rules.ml_detection import MLFraudDetection
+    detection = MLFraudDetection(csv_path, cache_dir=cache_dir, sample_fraction=sample_fraction, n_jobs=-1)
+    detection.model.set_params(n_estimators=trees)
+    start = time.perf_counter()
+    X, y = detection.load_data()
+    load_seconds = time.perf_counter() - start
+    detection.split_data(detection.preprocess_data(X), y)
+    detection.train_model()
+    return load_seconds
+
+
+def measure(target, args, results):
+    start = time.perf_counter()
+    load_seconds = target(*args)
+    elapsed = time.perf_counter() - start
+    results.put((load_seconds, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def run(name, target, args):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=measure, args=(target, args, results))
+    process.start()
+    load_seconds, elapsed, peak_mb = results.get()
+    process.join()
+    print(f"{name:>22}: load {load_seconds:5.1f} s, total {elapsed:6.1f} s, peak RSS {peak_mb:,.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fraud model training pipeline benchmark")
+    parser.add_argument('--rows', type=int, default=2000000)
+    parser.add_argument('--trees', type=int, default=10)
+    parser.add_argument('--sample-fraction', type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'transactions.csv')
+        cache_dir = os.path.join(directory, 'cache')
+        write_transactions_csv(csv_path, args.rows)
+        print(f"{args.rows:,} rows, {os.path.getsize(csv_path) / 1e6:.0f} MB CSV, {args.trees} trees, "
+              f"{os.cpu_count()} CPUs")
+
+        params = (csv_path, args.trees, args.sample_fraction, cache_dir)
+        run('CSV, in memory', run_baseline, params)
+        run('pipeline, cold cache', run_pipeline, params)
+        run('pipeline, warm cache', run_pipeline, params)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import time
+import argparse
+import numpy as np
+from fraud_detection.fraud_rules.flat_forest import FlatForest
+from performance.benchmarks.fraud_inference_benchmark import train_detector
+
+# Single-row scoring benchmark: sklearn predict_proba against the flat-array evaluator,
+# for the forest alone and end to end through MLFraudDetection (scaling included).
+
+
+def per_call_us(fn, rows, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(rows[i % len(rows)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flat-array tree evaluator benchmark")
+    parser.add_argument('--rows', type=int, default=20000, help="Training rows")
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    detector, X = train_detector(args.rows)
+    detector.model.set_params(n_jobs=1)
+    flat = FlatForest.from_model(detector.model)
+    scaled = detector.scaler.transform(X.head(1000))
+
+    sklearn_us = per_call_us(lambda row: detector.model.predict_proba(row[None, :]), scaled, args.repeat)
+    flat_us = per_call_us(flat.predict_proba_row, scaled, args.repeat)
+    print(f"Forest only: sklearn {sklearn_us:.0f} us/row, flat {flat_us:.0f} us/row ({sklearn_us / flat_us:.1f}x)")
+
+    frames = [X.iloc[[i]] for i in range(1000)]
+    raw = X.head(1000).to_numpy()
+    predict_us = per_call_us(detector.predict, frames, args.repeat)
+    score_us = per_call_us(detector.score_transaction, raw, args.repeat)
+    print(f"End to end: predict {predict_us:.0f} us/row, score_transaction {score_us:.0f} us/row "
+          f"({predict_us / score_us:.1f}x)")
+
+    max_error = np.abs(flat.predict_proba(scaled) - detector.model.predict_proba(scaled)).max()
+    print(f"Max |flat - sklearn| probability difference: {max_error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
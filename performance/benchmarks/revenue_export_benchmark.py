@@ -0,0 +1,96 @@
+import os
+import csv
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from decimal import Decimal
+from reporting.financial_reports.revenue_report import REPORT_COLUMNS
+from reporting.financial_reports.columnar_export import ColumnarRevenueWriter
+
+# Revenue export benchmark: the same synthetic report rows written row by row to CSV
+# (as stream_revenue_report does) and to Parquet / Arrow IPC with ColumnarRevenueWriter,
+# comparing write time, peak traced memory, size on disk and full read time.
+
+
+def synthetic_rows(count, products, users):
+    rng = np.random.default_rng(0)
+    start = datetime(2024, 1, 1)
+    cents = rng.integers(100, 500000, count).tolist()
+    seconds = np.sort(rng.integers(0, 365 * 86400, count)).tolist()
+    product_ids = rng.integers(0, products, count).tolist()
+    user_ids = rng.zipf(1.3, count) % users
+    currencies = np.where(rng.random(count) < 0.8, 'USD', 'EUR').tolist()
+    for i in range(count):
+        yield (i + 1, Decimal(cents[i]).scaleb(-2), currencies[i], start + timedelta(seconds=seconds[i]),
+               f"Product {product_ids[i]}", f"user{user_ids[i]}@example.com")
+
+
+def directory_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def measure(write, rows):
+    """Write time of one pass, then peak traced memory of a second (tracing slows the writer down)."""
+    started = time.perf_counter()
+    write(rows)
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    write(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CSV vs Parquet vs Arrow IPC revenue export benchmark")
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        def write_csv(rows):
+            with open(os.path.join(directory, 'report.csv'), 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(REPORT_COLUMNS)
+                for row in rows:
+                    writer.writerow(row)
+
+        def columnar(name, file_format, partition_by_month=False):
+            def write(rows):
+                with ColumnarRevenueWriter(os.path.join(directory, name), file_format, partition_by_month) as writer:
+                    for row in rows:
+                        writer.write_row(row)
+            return write
+
+        targets = [
+            ('csv', 'report.csv', write_csv, lambda path: pd.read_csv(path, parse_dates=['Date'])),
+            ('parquet', 'report.parquet', columnar('report.parquet', 'parquet'), pd.read_parquet),
+            ('parquet/month', 'by_month', columnar('by_month', 'parquet', True), pd.read_parquet),
+            ('arrow', 'report.arrow', columnar('report.arrow', 'arrow'), pd.read_feather),
+        ]
+        rows = list(synthetic_rows(args.rows, args.products, args.users))
+        print(f"{args.rows:,} rows, {args.products} products, {args.users:,} users")
+        for label, name, write, read in targets:
+            elapsed, peak = measure(write, rows)
+            path = os.path.join(directory, name)
+            started = time.perf_counter()
+            frame = read(path)
+            read_elapsed = time.perf_counter() - started
+            assert len(frame) == args.rows
+            print(f"{label:<14} write {elapsed:6.2f}s  peak {peak / 2**20:6.1f} MiB  "
+                  f"size {directory_size(path) / 2**20:7.1f} MiB  read {read_elapsed:5.2f}s")
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from fraud_detection.risk_assessment.risk_scoring import (
+    RiskScoringEngine,
+    Transaction,
+    generate_user_behavior,
+)
+
+# Risk scoring benchmark: per-assessment cost as a user's history grows, comparing the
+# full-history UserBehavior scans with the running aggregates of the feature store,
+# then nightly re-scoring through assess_risk against assess_batch.
+
+RULE_WEIGHTS = {"large_amount": 1.5, "unusual_location": 1.2}
+LOCATIONS = np.array(["New York", "San Francisco", "Los Angeles", "Chicago", "Miami", "Las Vegas"])
+CARD_TYPES = np.array(["credit", "debit", "virtual", "prepaid"])
+
+
+def generate_batch(count, users, seed=42):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2024-01-01T00:00:00')
+    return pd.DataFrame({
+        'transaction_id': np.char.add('TX', np.arange(count).astype(str)),
+        'user_id': np.char.add('user', rng.integers(0, users, count).astype(str)),
+        'amount': np.round(rng.gamma(2.0, 120.0, count), 2),
+        'timestamp': start + rng.integers(0, 30 * 24 * 3600, count).astype('timedelta64[s]'),
+        'location': LOCATIONS[rng.integers(0, len(LOCATIONS), count)],
+        'card_type': CARD_TYPES[rng.integers(0, len(CARD_TYPES), count)],
+        'previous_fraud_score': rng.integers(0, 100, count),
+    })
+
+
+def benchmark_batch(count, row_sample, users=10000):
+    behavior = {f"user{u}": generate_user_behavior(f"user{u}", 20) for u in range(users)}
+    engine = RiskScoringEngine(behavior, RULE_WEIGHTS)
+    batch = generate_batch(count, users)
+
+    start = time.perf_counter()
+    levels = engine.assess_batch(batch)
+    batch_seconds = time.perf_counter() - start
+
+    sample = batch.head(row_sample)
+    transactions = [Transaction(**row) for row in sample.assign(
+        timestamp=sample['timestamp'].dt.to_pydatetime()).to_dict('records')]
+    start = time.perf_counter()
+    row_levels = [engine.assess_risk(transaction) for transaction in transactions]
+    row_seconds = time.perf_counter() - start
+
+    assert levels[:row_sample].tolist() == row_levels
+    print(f"assess_batch: {count:,} transactions in {batch_seconds:.2f}s ({count / batch_seconds:,.0f} txn/s); "
+          f"assess_risk: {row_sample / row_seconds:,.0f} txn/s (logging disabled)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Risk scoring history-length benchmark")
+    parser.add_argument('--assessments', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=5000000)
+    parser.add_argument('--row-sample', type=int, default=100000)
+    args = parser.parse_args()
+    logging.getLogger("RiskScoring").setLevel(logging.ERROR)
+
+    transaction = Transaction("TX1", "user1", 150.75, datetime.now(), "Las Vegas", "prepaid", 45)
+    for history_length in (10, 1000, 100000):
+        behavior = generate_user_behavior("user1", history_length)
+
+        start = time.perf_counter()
+        for _ in range(args.assessments):
+            behavior.average_transaction_amount()
+            behavior.frequent_locations()
+        scan_us = (time.perf_counter() - start) / args.assessments * 1e6
+
+        engine = RiskScoringEngine({"user1": behavior}, RULE_WEIGHTS)
+        start = time.perf_counter()
+        for _ in range(args.assessments):
+            engine.assess_risk(transaction)
+        store_us = (time.perf_counter() - start) / args.assessments * 1e6
+
+        print(f"history {history_length:>7,}: full-history features {scan_us:10.1f} us, "
+              f"assess_risk with feature store {store_us:6.1f} us")
+
+    benchmark_batch(args.batch, args.row_sample)
+
+
+if __name__ == "__main__":
+    main()
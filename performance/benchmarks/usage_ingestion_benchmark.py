@@ -0,0 +1,92 @@
+import time
+import random
+import argparse
+from threading import Thread
+from billing.usage.usage_ingestion import UsageBuffer, UsageAggregator
+
+# Benchmark for the metered usage ingest path (buffer append + hourly pre-aggregation).
+# No database is touched: the aggregator is only asked to fold events, not to flush them.
+
+
+class NullSession:
+    def execute(self, *args, **kwargs):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def generate_events(num_events, num_subscriptions, meters):
+    now = int(time.time())
+    return [
+        (
+            random.randrange(num_subscriptions),
+            random.choice(meters),
+            random.randint(1, 10),
+            now - random.randrange(7 * 24 * 3600),
+        )
+        for _ in range(num_events)
+    ]
+
+
+def bench_single_appends(events, num_threads):
+    buffer = UsageBuffer()
+    chunk = len(events) // num_threads
+
+    def worker(part):
+        for subscription_id, meter, quantity, timestamp in part:
+            buffer.append(subscription_id, meter, quantity, timestamp)
+
+    threads = [Thread(target=worker, args=(events[i * chunk:(i + 1) * chunk],)) for i in range(num_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return buffer, time.perf_counter() - start
+
+
+def bench_batch_appends(events, batch_size):
+    buffer = UsageBuffer()
+    start = time.perf_counter()
+    for i in range(0, len(events), batch_size):
+        buffer.append_many(events[i:i + batch_size])
+    return buffer, time.perf_counter() - start
+
+
+def bench_aggregation(buffer):
+    aggregator = UsageAggregator(buffer, db_session=NullSession())
+    start = time.perf_counter()
+    folded = aggregator.aggregate()
+    return folded, len(aggregator.pending), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Usage ingestion throughput benchmark")
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--subscriptions', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    meters = ['api_calls', 'storage_gb_hours', 'emails_sent']
+    events = generate_events(args.events, args.subscriptions, meters)
+
+    buffer, elapsed = bench_single_appends(events, args.threads)
+    print(f"Single appends ({args.threads} threads): {len(buffer)} events in {elapsed:.3f}s "
+          f"-> {len(buffer) / elapsed:,.0f} events/s")
+
+    folded, rows, elapsed = bench_aggregation(buffer)
+    print(f"Aggregation: {folded} events folded into {rows} hourly rows in {elapsed:.3f}s "
+          f"-> {folded / elapsed:,.0f} events/s")
+
+    buffer, elapsed = bench_batch_appends(events, args.batch_size)
+    print(f"Batch appends (batch={args.batch_size}): {len(buffer)} events in {elapsed:.3f}s "
+          f"-> {len(buffer) / elapsed:,.0f} events/s")
+
+
+if __name__ == "__main__":
+    main()
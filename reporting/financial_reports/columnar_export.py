@@ -0,0 +1,175 @@
+import os
+import logging
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from reporting.financial_reports.revenue_report import REPORT_COLUMNS, stream_revenue_report
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ColumnarExport")
+
+FORMATS = ('parquet', 'arrow')
+FILE_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+# Rows buffered per partition before they are written out as one row group / record batch
+ROW_GROUP_SIZE = 100000
+DEFAULT_COMPRESSION = 'zstd'
+# Columns with few distinct values per row group, stored as an index into a dictionary
+DICTIONARY_COLUMNS = ('Currency', 'Product Name', 'User Email')
+
+_DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+# Same column names as the CSV export; amounts stay exact decimals, never floats
+REVENUE_SCHEMA = pa.schema([
+    ('Transaction ID', pa.int64()),
+    ('Amount', pa.decimal128(38, 6)),
+    ('Currency', _DICTIONARY_TYPE),
+    ('Date', pa.timestamp('us')),
+    ('Product Name', _DICTIONARY_TYPE),
+    ('User Email', _DICTIONARY_TYPE),
+])
+
+
+class _GrowingDictionary:
+    """
+    One dictionary per column for the whole Arrow IPC file: the file format only allows
+    a dictionary to be extended between batches (written as a delta), never replaced.
+    Only the distinct values of each batch are looked up in Python.
+    """
+
+    def __init__(self):
+        self.positions = {}
+        self.values = []
+
+    def encode(self, array):
+        batch = array.dictionary_encode()
+        mapping = np.empty(len(batch.dictionary), dtype=np.int32)
+        for i, value in enumerate(batch.dictionary.to_pylist()):
+            position = self.positions.get(value)
+            if position is None:
+                position = self.positions[value] = len(self.values)
+                self.values.append(value)
+            mapping[i] = position
+        indices = mapping[batch.indices.to_numpy(zero_copy_only=False)]
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(self.values, pa.string()))
+
+
+class _PartitionWriter:
+    """Buffers one output file's rows and writes them out column-wise in row groups."""
+
+    def __init__(self, path, file_format, compression):
+        self.path = path
+        self.file_format = file_format
+        self.compression = compression
+        self.buffer = []
+        self.dictionaries = {name: _GrowingDictionary() for name in DICTIONARY_COLUMNS}
+        self.writer = None
+        self.rows = 0
+
+    def flush(self):
+        if not self.buffer:
+            return
+        arrays = []
+        for field, values in zip(REVENUE_SCHEMA, zip(*self.buffer)):
+            if field.name not in DICTIONARY_COLUMNS:
+                arrays.append(pa.array(values, field.type))
+            elif self.file_format == 'arrow':
+                arrays.append(self.dictionaries[field.name].encode(pa.array(values, pa.string())))
+            else:
+                # Parquet writes a dictionary page per column chunk anyway, so a per-batch dictionary is enough
+                arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        batch = pa.record_batch(arrays, schema=REVENUE_SCHEMA)
+
+        if self.writer is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if self.file_format == 'parquet':
+                self.writer = pq.ParquetWriter(self.path, REVENUE_SCHEMA, compression=self.compression,
+                                               use_dictionary=list(DICTIONARY_COLUMNS))
+            else:
+                options = ipc.IpcWriteOptions(compression=self.compression, emit_dictionary_deltas=True)
+                self.writer = ipc.new_file(self.path, REVENUE_SCHEMA, options=options)
+        if self.file_format == 'parquet':
+            self.writer.write_table(pa.Table.from_batches([batch]), row_group_size=len(batch))
+        else:
+            self.writer.write_batch(batch)
+        self.rows += len(batch)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ColumnarRevenueWriter:
+    """
+    Writes revenue report rows (in REPORT_COLUMNS order) to Parquet or Arrow IPC as
+    they arrive. Rows are buffered up to `row_group_size` per output file and then
+    written as one compressed row group, so memory is bounded by the buffers (one per
+    open month) and, for Arrow IPC, the distinct dictionary values, never by the number
+    of rows. With `partition_by_month` the path is a directory holding one
+    file per month in hive layout (month=YYYY-MM/), which pyarrow and pandas read back
+    as a single dataset with a `month` column.
+    """
+
+    def __init__(self, path, file_format='parquet', partition_by_month=False,
+                 row_group_size=ROW_GROUP_SIZE, compression=DEFAULT_COMPRESSION):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported export format '{file_format}', expected one of {FORMATS}")
+        self.path = path
+        self.file_format = file_format
+        self.partition_by_month = partition_by_month
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.partitions = {}
+
+    def _partition(self, created_at):
+        key = (created_at.year, created_at.month) if self.partition_by_month else None
+        partition = self.partitions.get(key)
+        if partition is None:
+            path = self.path
+            if key is not None:
+                path = os.path.join(self.path, f"month={key[0]:04d}-{key[1]:02d}",
+                                    f"part-0{FILE_EXTENSIONS[self.file_format]}")
+            partition = self.partitions[key] = _PartitionWriter(path, self.file_format, self.compression)
+        return partition
+
+    def write_row(self, row):
+        partition = self._partition(row[3])
+        partition.buffer.append(row)
+        if len(partition.buffer) >= self.row_group_size:
+            partition.flush()
+
+    def close(self):
+        for partition in self.partitions.values():
+            partition.close()
+        return sum(partition.rows for partition in self.partitions.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Stream the report's detail rows straight from the server-side cursor into a columnar
+# export, aggregating totals in the same pass
+def stream_revenue_export(connection, start_date, end_date, path, file_format='parquet',
+                          partition_by_month=False, row_group_size=ROW_GROUP_SIZE):
+    with ColumnarRevenueWriter(path, file_format, partition_by_month, row_group_size) as writer:
+        aggregator = stream_revenue_report(connection, start_date, end_date, writer=writer)
+    logger.info(f"Wrote {aggregator.rows} revenue rows as {file_format} to {path}")
+    print(f"Report successfully exported to {path}")
+    return aggregator
+
+
+# Export a report DataFrame (as built by create_revenue_dataframe) to Parquet or Arrow IPC
+def export_to_parquet(df, file_name, file_format='parquet', partition_by_month=False):
+    try:
+        with ColumnarRevenueWriter(file_name, file_format, partition_by_month) as writer:
+            for row in df[REPORT_COLUMNS].itertuples(index=False, name=None):
+                writer.write_row(row[:3] + (row[3].to_pydatetime(),) + row[4:])
+        print(f"Report successfully exported to {file_name}")
+    except Exception as e:
+        print(f"Failed to export report: {str(e)}")
+
@@ -1,7 +1,11 @@
+import csv
+import uuid
 import psycopg2
 import pandas as pd
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_EVEN
 
 # Database configuration
 DATABASE = {
@@ -12,6 +16,70 @@ DATABASE = {
     'port': '5432'
 }
 
+# Rows fetched per round trip by the server-side cursor in streaming mode
+STREAM_ITERSIZE = 5000
+
+# Digits after the decimal point per currency (ISO 4217); any other currency uses 2
+CURRENCY_EXPONENTS = {
+    'JPY': 0, 'KRW': 0, 'VND': 0, 'CLP': 0, 'ISK': 0, 'UGX': 0,
+    'BHD': 3, 'KWD': 3, 'OMR': 3, 'JOD': 3, 'TND': 3, 'IQD': 3, 'LYD': 3,
+}
+DEFAULT_CURRENCY_EXPONENT = 2
+
+REPORT_COLUMNS = ['Transaction ID', 'Amount', 'Currency', 'Date', 'Product Name', 'User Email']
+
+# Report ranges are whole days: start_date through end_date inclusive, the same days the
+# daily rollups cover, however far into end_date a transaction was created
+REVENUE_SELECT = """
+    SELECT
+        t.id AS transaction_id,
+        t.amount,
+        t.currency,
+        t.created_at,
+        p.name AS product_name,
+        u.email AS user_email
+    FROM transactions t
+    JOIN products p ON t.product_id = p.id
+    JOIN users u ON t.user_id = u.id
+    WHERE t.created_at >= %s::date AND t.created_at < %s::date + 1 AND t.status = 'completed'
+    """
+REVENUE_QUERY = REVENUE_SELECT + ";"
+# Report rows added to the range after a cached result's watermark
+REVENUE_DELTA_QUERY = REVENUE_SELECT + " AND t.id > %s;"
+
+# What a cached revenue report covered: highest id and updated_at and number of completed
+# transactions in the range
+REVENUE_WATERMARK_QUERY = """
+    SELECT COALESCE(MAX(id), 0), MAX(updated_at), COUNT(*)
+    FROM transactions
+    WHERE created_at >= %(start)s::date AND created_at < %(end)s::date + 1 AND status = 'completed';
+    """
+
+# The same, plus how many of the covered rows (id <= max_id) are still there and how many
+# of them were updated since; a late commit below max_id, a refund or an edit shows up here
+REVENUE_CHANGES_QUERY = """
+    SELECT COALESCE(MAX(id), 0), MAX(updated_at), COUNT(*),
+           COUNT(*) FILTER (WHERE id <= %(max_id)s),
+           COUNT(*) FILTER (WHERE id <= %(max_id)s
+                            AND updated_at > COALESCE(%(max_updated_at)s::timestamp, '-infinity'))
+    FROM transactions
+    WHERE created_at >= %(start)s::date AND created_at < %(end)s::date + 1 AND status = 'completed';
+    """
+
+# Completed revenue per (day, product, currency) from the daily rollups, plus the trigger
+# deltas the rollup job has not folded yet (see revenue_rollups.py)
+ROLLUP_REVENUE_QUERY = """
+    SELECT r.day, p.name AS product_name, r.currency, SUM(r.amount) AS amount
+    FROM (
+        SELECT day, product_id, currency, amount FROM daily_revenue_rollups WHERE day BETWEEN %(start)s AND %(end)s
+        UNION ALL
+        SELECT day, product_id, currency, amount FROM revenue_rollup_deltas WHERE day BETWEEN %(start)s AND %(end)s
+    ) r
+    JOIN products p ON r.product_id = p.id
+    GROUP BY r.day, p.name, r.currency
+    HAVING SUM(r.amount) <> 0;
+    """
+
 # Connect to the database
 def db_connect():
     try:
@@ -27,31 +95,145 @@ def db_connect():
         print(f"Database connection failed: {str(e)}")
         return None
 
+# Run a block in its own REPEATABLE READ transaction, so every statement (named cursors
+# included) reads one snapshot. The level is set on the session before the transaction
+# starts, since SET TRANSACTION only takes effect as a transaction's first statement, and
+# the previous settings are restored afterwards. The connection must not be inside a
+# transaction; the block's work is committed on success and rolled back on error.
+@contextmanager
+def repeatable_read(connection, readonly=True):
+    # None means the server default, which set_session only restores when given 'DEFAULT'
+    previous = [('DEFAULT' if value is None else value) for value in (connection.isolation_level, connection.readonly)]
+    connection.set_session(isolation_level='REPEATABLE READ', readonly=readonly)
+    try:
+        yield
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.set_session(isolation_level=previous[0], readonly=previous[1])
+
 # Fetch revenue data from the database
 def fetch_revenue_data(connection, start_date, end_date):
-    query = """
-    SELECT
-        t.id AS transaction_id,
-        t.amount,
-        t.currency,
-        t.created_at,
-        p.name AS product_name,
-        u.email AS user_email
-    FROM transactions t
-    JOIN products p ON t.product_id = p.id
-    JOIN users u ON t.user_id = u.id
-    WHERE t.created_at BETWEEN %s AND %s AND t.status = 'completed';
-    """
     cursor = connection.cursor()
-    cursor.execute(query, (start_date, end_date))
+    cursor.execute(REVENUE_QUERY, (start_date, end_date))
     transactions = cursor.fetchall()
     cursor.close()
     return transactions
 
+# Fetch pre-aggregated daily revenue for whole days from start_date to end_date, as a
+# DataFrame revenue_by_product and monthly_revenue_breakdown accept directly
+def fetch_rollup_revenue(connection, start_date, end_date):
+    with connection.cursor() as cursor:
+        cursor.execute(ROLLUP_REVENUE_QUERY, {'start': start_date, 'end': end_date})
+        rows = cursor.fetchall()
+    df = pd.DataFrame(rows, columns=['Date', 'Product Name', 'Currency', 'Amount'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+# Stream revenue rows through a named (server-side) cursor: only `itersize` rows are held
+# in memory at a time, however large the date range
+def stream_revenue_data(connection, start_date, end_date, itersize=STREAM_ITERSIZE):
+    # Cursor names must be unique per connection
+    cursor = connection.cursor(name=f"revenue_stream_{uuid.uuid4().hex}")
+    cursor.itersize = itersize
+    try:
+        cursor.execute(REVENUE_QUERY, (start_date, end_date))
+        for row in cursor:
+            yield row
+    finally:
+        cursor.close()
+
+# Convert a NUMERIC amount to an exact integer count of the currency's minor unit (e.g. cents)
+def to_minor_units(amount, currency):
+    exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_CURRENCY_EXPONENT)
+    return int(Decimal(amount).scaleb(exponent).to_integral_value(ROUND_HALF_EVEN))
+
+# Convert an integer minor-unit total back to a Decimal amount for display
+def from_minor_units(minor_units, currency):
+    exponent = CURRENCY_EXPONENTS.get(currency, DEFAULT_CURRENCY_EXPONENT)
+    return Decimal(minor_units).scaleb(-exponent)
+
+class RevenueAggregator:
+    """
+    Running revenue totals in integer minor units, kept per currency: overall, per
+    product and per calendar month. Memory grows with the number of distinct
+    products and months in the range, never with the number of transactions.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.totals = defaultdict(int)
+        self.by_product = defaultdict(int)
+        self.by_month = defaultdict(int)
+
+    def add(self, amount, currency, created_at, product_name):
+        minor_units = to_minor_units(amount, currency)
+        self.rows += 1
+        self.totals[currency] += minor_units
+        self.by_product[(product_name, currency)] += minor_units
+        self.by_month[((created_at.year, created_at.month), currency)] += minor_units
+
+    def to_dict(self):
+        """JSON-compatible form, for the report cache."""
+        return {
+            'rows': self.rows,
+            'totals': sorted(self.totals.items()),
+            'by_product': [[product, currency, total] for (product, currency), total in sorted(self.by_product.items())],
+            'by_month': [[year, month, currency, total] for ((year, month), currency), total in sorted(self.by_month.items())],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        aggregator = cls()
+        aggregator.rows = data['rows']
+        aggregator.totals.update((currency, total) for currency, total in data['totals'])
+        aggregator.by_product.update(((product, currency), total) for product, currency, total in data['by_product'])
+        aggregator.by_month.update(
+            (((year, month), currency), total) for year, month, currency, total in data['by_month']
+        )
+        return aggregator
+
+    def total_revenue(self):
+        return {currency: from_minor_units(total, currency) for currency, total in sorted(self.totals.items())}
+
+    def revenue_by_product(self):
+        return {key: from_minor_units(total, key[1]) for key, total in sorted(self.by_product.items())}
+
+    def monthly_revenue_breakdown(self):
+        return {
+            (f"{year:04d}-{month:02d}", currency): from_minor_units(total, currency)
+            for ((year, month), currency), total in sorted(self.by_month.items())
+        }
+
+# Aggregate revenue in a single pass over a server-side cursor, optionally writing the
+# detail rows to CSV, or to any `writer` with a write_row method, as they stream past
+def stream_revenue_report(connection, start_date, end_date, csv_path=None, itersize=STREAM_ITERSIZE, writer=None):
+    aggregator = RevenueAggregator()
+    rows = stream_revenue_data(connection, start_date, end_date, itersize)
+    if writer is not None:
+        for row in rows:
+            aggregator.add(row[1], row[2], row[3], row[4])
+            writer.write_row(row)
+        return aggregator
+    if csv_path is None:
+        for _, amount, currency, created_at, product_name, _ in rows:
+            aggregator.add(amount, currency, created_at, product_name)
+        return aggregator
+
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_COLUMNS)
+        for row in rows:
+            aggregator.add(row[1], row[2], row[3], row[4])
+            writer.writerow(row)
+    print(f"Report successfully exported to {csv_path}")
+    return aggregator
+
 # Generate a Pandas DataFrame from the fetched revenue data
 def create_revenue_dataframe(transactions):
-    columns = ['Transaction ID', 'Amount', 'Currency', 'Date', 'Product Name', 'User Email']
-    df = pd.DataFrame(transactions, columns=columns)
+    df = pd.DataFrame(transactions, columns=REPORT_COLUMNS)
     df['Date'] = pd.to_datetime(df['Date'])
     df['Amount'] = df['Amount'].apply(Decimal)
     return df
@@ -80,10 +262,111 @@ def export_to_csv(df, file_name):
     except Exception as e:
         print(f"Failed to export report: {str(e)}")
 
+# Generate revenue report in streaming mode: constant memory for any date range. The detail
+# rows go to CSV, or with export_format 'parquet' / 'arrow' to a columnar file (a directory
+# of monthly files with partition_by_month)
+def generate_streaming_revenue_report(connection, start_date, end_date, export_format='csv', partition_by_month=False):
+    current_time = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    report_name = f"revenue_report_{current_time}"
+    if export_format == 'csv':
+        aggregator = stream_revenue_report(connection, start_date, end_date, csv_path=f"{report_name}.csv")
+    else:
+        # Imported here: columnar_export builds on this module and needs pyarrow
+        from reporting.financial_reports.columnar_export import FILE_EXTENSIONS, stream_revenue_export
+        if not partition_by_month:
+            report_name += FILE_EXTENSIONS[export_format]
+        aggregator = stream_revenue_export(connection, start_date, end_date, report_name, export_format,
+                                           partition_by_month)
+    print_revenue_summary(aggregator)
+    return aggregator
+
+# Print the per-currency totals of a RevenueAggregator
+def print_revenue_summary(aggregator):
+    if not aggregator.rows:
+        print("No transactions found for the given period.")
+        return
+
+    # Totals are kept per currency; amounts in different currencies are never summed together
+    print("Total Revenue:")
+    for currency, revenue in aggregator.total_revenue().items():
+        print(f"{currency}: {revenue}")
+
+    print("\nRevenue by Product:")
+    for (product, currency), revenue in aggregator.revenue_by_product().items():
+        print(f"{product}: {revenue} {currency}")
+
+    print("\nMonthly Revenue Breakdown:")
+    for (month, currency), revenue in aggregator.monthly_revenue_breakdown().items():
+        print(f"{month}: {revenue} {currency}")
+
+# Revenue totals through a ReportCache: the cached RevenueAggregator is reused while no
+# completed transaction in the range changed, and only new transactions are added to it
+# otherwise. Each check and computation reads one REPEATABLE READ snapshot, so the
+# watermark always describes exactly the rows aggregated.
+def cached_revenue_report(connection, start_date, end_date, cache):
+    params = {'start': start_date, 'end': end_date}
+
+    def compute():
+        with repeatable_read(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(REVENUE_WATERMARK_QUERY, params)
+                max_id, max_updated_at, row_count = cursor.fetchone()
+            aggregator = stream_revenue_report(connection, start_date, end_date)
+        return aggregator, {'max_id': max_id, 'max_updated_at': max_updated_at, 'row_count': row_count}
+
+    def changes_since(watermark):
+        with repeatable_read(connection), connection.cursor() as cursor:
+            cursor.execute(REVENUE_CHANGES_QUERY, dict(params, **watermark))
+            max_id, max_updated_at, row_count, covered, updated = cursor.fetchone()
+            if covered != watermark['row_count'] or updated:
+                return None
+            rows = []
+            if max_id > watermark['max_id']:
+                cursor.execute(REVENUE_DELTA_QUERY, (start_date, end_date, watermark['max_id']))
+                rows = cursor.fetchall()
+        return rows, {'max_id': max_id, 'max_updated_at': max_updated_at, 'row_count': row_count}
+
+    def merge(aggregator, rows):
+        for _, amount, currency, created_at, product_name, _ in rows:
+            aggregator.add(amount, currency, created_at, product_name)
+        return aggregator
+
+    return cache.get_or_compute('revenue_report', params, compute, changes_since, merge,
+                                encode=RevenueAggregator.to_dict, decode=RevenueAggregator.from_dict)
+
 # Generate revenue report
-def generate_revenue_report(start_date, end_date):
+def generate_revenue_report(start_date, end_date, streaming=False, from_rollups=False, export_format='csv',
+                            partition_by_month=False, cache=None):
     connection = db_connect()
-    if connection:
+    if connection and cache is not None:
+        print(f"Generating cached revenue report from {start_date} to {end_date}")
+        try:
+            print_revenue_summary(cached_revenue_report(connection, start_date, end_date, cache))
+        finally:
+            connection.close()
+    elif connection and from_rollups:
+        print(f"Generating revenue report from daily rollups from {start_date} to {end_date}")
+        try:
+            df = fetch_rollup_revenue(connection, start_date, end_date)
+            if df.empty:
+                print("No transactions found for the given period.")
+            else:
+                print(f"Total Revenue: {calculate_total_revenue(df)}")
+                print("\nRevenue by Product:")
+                for product, revenue in revenue_by_product(df).items():
+                    print(f"{product}: {revenue}")
+                print("\nMonthly Revenue Breakdown:")
+                for month, revenue in monthly_revenue_breakdown(df).items():
+                    print(f"{month}: {revenue}")
+        finally:
+            connection.close()
+    elif connection and streaming:
+        print(f"Generating streaming revenue report from {start_date} to {end_date}")
+        try:
+            generate_streaming_revenue_report(connection, start_date, end_date, export_format, partition_by_month)
+        finally:
+            connection.close()
+    elif connection:
         print(f"Generating revenue report from {start_date} to {end_date}")
         transactions = fetch_revenue_data(connection, start_date, end_date)
         if transactions:
@@ -119,4 +402,4 @@ def generate_revenue_report(start_date, end_date):
 if __name__ == "__main__":
     start_date = '2024-01-01'
     end_date = '2024-12-31'
-    generate_revenue_report(start_date, end_date)
\ No newline at end of file
+    generate_revenue_report(start_date, end_date, streaming=True)
\ No newline at end of file
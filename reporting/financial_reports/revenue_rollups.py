@@ -0,0 +1,217 @@
+import time
+import logging
+import argparse
+from psycopg2.extensions import TransactionRollbackError
+from reporting.financial_reports.revenue_report import db_connect, repeatable_read
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("RevenueRollups")
+
+# Delta rows folded per transaction by the rollup job
+FOLD_BATCH_SIZE = 50000
+FOLD_INTERVAL_SECONDS = 30
+# Attempts for snapshot-consistent work that conflicts with a concurrent fold
+MAX_SERIALIZATION_RETRIES = 5
+
+# Moves a batch of trigger-written deltas into the rollups in one statement and returns how
+# many were moved. Deltas are deleted as they are folded, so no watermark can skip a row whose
+# transaction committed late, and SKIP LOCKED lets several job instances drain in parallel.
+FOLD_QUERY = """
+    WITH drained AS (
+        DELETE FROM revenue_rollup_deltas
+        WHERE id IN (
+            SELECT id FROM revenue_rollup_deltas ORDER BY id LIMIT %(batch_size)s FOR UPDATE SKIP LOCKED
+        )
+        RETURNING day, product_id, currency, amount, transaction_count
+    ), folded AS (
+        INSERT INTO daily_revenue_rollups (day, product_id, currency, amount, transaction_count, updated_at)
+        SELECT day, product_id, currency, SUM(amount), SUM(transaction_count), now()
+        FROM drained
+        GROUP BY day, product_id, currency
+        ON CONFLICT (day, product_id, currency)
+        DO UPDATE SET amount = daily_revenue_rollups.amount + EXCLUDED.amount,
+                      transaction_count = daily_revenue_rollups.transaction_count + EXCLUDED.transaction_count,
+                      updated_at = EXCLUDED.updated_at
+    )
+    SELECT count(*) FROM drained;
+    """
+
+# Completed revenue per (day, product, currency) straight from the raw table
+RAW_DAILY_REVENUE = """
+    SELECT created_at::date AS day, product_id, currency, SUM(amount) AS amount, COUNT(*) AS transaction_count
+    FROM transactions
+    WHERE status = 'completed' AND created_at >= %(start)s::date AND created_at < %(end)s::date + 1
+    GROUP BY 1, 2, 3
+    """
+
+# Rolled-up revenue including deltas not folded yet, so reads are never stale
+ROLLED_DAILY_REVENUE = """
+    SELECT day, product_id, currency, SUM(amount) AS amount, SUM(transaction_count) AS transaction_count
+    FROM (
+        SELECT day, product_id, currency, amount, transaction_count
+        FROM daily_revenue_rollups WHERE day BETWEEN %(start)s AND %(end)s
+        UNION ALL
+        SELECT day, product_id, currency, amount, transaction_count
+        FROM revenue_rollup_deltas WHERE day BETWEEN %(start)s AND %(end)s
+    ) rows
+    GROUP BY 1, 2, 3
+    """
+
+CONSISTENCY_QUERY = f"""
+    WITH raw AS ({RAW_DAILY_REVENUE}), rolled AS ({ROLLED_DAILY_REVENUE})
+    SELECT COALESCE(raw.day, rolled.day), COALESCE(raw.product_id, rolled.product_id),
+           COALESCE(raw.currency, rolled.currency),
+           COALESCE(raw.amount, 0), COALESCE(rolled.amount, 0),
+           COALESCE(raw.transaction_count, 0), COALESCE(rolled.transaction_count, 0)
+    FROM raw
+    FULL OUTER JOIN rolled
+        ON raw.day = rolled.day AND raw.product_id = rolled.product_id AND raw.currency = rolled.currency
+    WHERE COALESCE(raw.amount, 0) <> COALESCE(rolled.amount, 0)
+       OR COALESCE(raw.transaction_count, 0) <> COALESCE(rolled.transaction_count, 0)
+    ORDER BY 1, 2, 3;
+    """
+
+
+def fold_revenue_deltas(connection, batch_size=FOLD_BATCH_SIZE):
+    """Folds pending deltas into daily_revenue_rollups, one committed batch at a time; returns the number folded."""
+    folded = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(FOLD_QUERY, {'batch_size': batch_size})
+            batch = cursor.fetchone()[0]
+        connection.commit()
+        folded += batch
+        if batch < batch_size:
+            return folded
+
+
+def _in_snapshot(connection, work):
+    """
+    Runs `work(cursor)` in one REPEATABLE READ transaction, so every statement sees the
+    same snapshot of transactions, rollups and deltas. Retried when it conflicts with a
+    concurrent fold.
+    """
+    for attempt in range(1, MAX_SERIALIZATION_RETRIES + 1):
+        try:
+            with repeatable_read(connection, readonly=False), connection.cursor() as cursor:
+                return work(cursor)
+        except TransactionRollbackError as e:
+            if attempt == MAX_SERIALIZATION_RETRIES:
+                raise
+            logger.warning(f"Snapshot conflict with a concurrent fold, retrying ({attempt}): {e}")
+            time.sleep(0.1 * attempt)
+
+
+def backfill_revenue_rollups(connection, start_date, end_date):
+    """
+    Rebuilds the rollups for the days from start_date to end_date (inclusive) from raw
+    transactions. Pending deltas for those days are discarded in the same snapshot:
+    the recomputed totals already include them, while deltas committed after the
+    snapshot are kept and folded normally.
+    """
+    params = {'start': start_date, 'end': end_date}
+
+    def rebuild(cursor):
+        cursor.execute("DELETE FROM revenue_rollup_deltas WHERE day BETWEEN %(start)s AND %(end)s", params)
+        cursor.execute("DELETE FROM daily_revenue_rollups WHERE day BETWEEN %(start)s AND %(end)s", params)
+        cursor.execute(f"""
+            INSERT INTO daily_revenue_rollups (day, product_id, currency, amount, transaction_count, updated_at)
+            SELECT day, product_id, currency, amount, transaction_count, now() FROM ({RAW_DAILY_REVENUE}) raw
+        """, params)
+        return cursor.rowcount
+
+    rows = _in_snapshot(connection, rebuild)
+    logger.info(f"Backfilled {rows} revenue rollup rows from {start_date} to {end_date}")
+    return rows
+
+
+def check_revenue_rollups(connection, start_date, end_date, repair=False):
+    """
+    Compares rollups (plus pending deltas) with raw transactions per (day, product,
+    currency) in one snapshot. Returns the mismatching keys with both amounts and
+    counts; with `repair`, each affected day is backfilled.
+    """
+    def compare(cursor):
+        cursor.execute(CONSISTENCY_QUERY, {'start': start_date, 'end': end_date})
+        return cursor.fetchall()
+
+    mismatches = [
+        {
+            'day': day, 'product_id': product_id, 'currency': currency,
+            'raw_amount': raw_amount, 'rollup_amount': rollup_amount,
+            'raw_count': raw_count, 'rollup_count': rollup_count,
+        }
+        for day, product_id, currency, raw_amount, rollup_amount, raw_count, rollup_count
+        in _in_snapshot(connection, compare)
+    ]
+    if mismatches:
+        logger.warning(f"{len(mismatches)} revenue rollup rows disagree with raw transactions "
+                       f"between {start_date} and {end_date}")
+    else:
+        logger.info(f"Revenue rollups match raw transactions between {start_date} and {end_date}")
+    if repair:
+        for day in sorted({mismatch['day'] for mismatch in mismatches}):
+            backfill_revenue_rollups(connection, day, day)
+    return mismatches
+
+
+def run_rollup_job(interval=FOLD_INTERVAL_SECONDS):
+    """Folds deltas every `interval` seconds until interrupted."""
+    connection = db_connect()
+    if not connection:
+        return
+    logger.info("Starting revenue rollup job")
+    try:
+        while True:
+            try:
+                folded = fold_revenue_deltas(connection)
+                if folded:
+                    logger.info(f"Folded {folded} revenue deltas into daily rollups")
+            except Exception as e:
+                connection.rollback()
+                logger.error(f"Folding revenue deltas failed, retrying next cycle: {e}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logger.info("Stopping revenue rollup job")
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily revenue rollup maintenance")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run = commands.add_parser('run', help="Fold trigger deltas into the rollups periodically")
+    run.add_argument('--interval', type=float, default=FOLD_INTERVAL_SECONDS)
+    commands.add_parser('fold', help="Fold pending deltas once")
+    for name, help_text in (('backfill', "Rebuild the rollups for a day range from raw transactions"),
+                            ('check', "Compare the rollups with raw transactions")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('start_date')
+        command.add_argument('end_date')
+        if name == 'check':
+            command.add_argument('--repair', action='store_true', help="Backfill every day that disagrees")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run_rollup_job(args.interval)
+        return
+    connection = db_connect()
+    if not connection:
+        return
+    try:
+        if args.command == 'fold':
+            print(f"Folded {fold_revenue_deltas(connection)} revenue deltas")
+        elif args.command == 'backfill':
+            print(f"Backfilled {backfill_revenue_rollups(connection, args.start_date, args.end_date)} rollup rows")
+        else:
+            mismatches = check_revenue_rollups(connection, args.start_date, args.end_date, repair=args.repair)
+            for mismatch in mismatches:
+                print(mismatch)
+            print(f"{len(mismatches)} mismatching rollup rows")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import os
+import json
+import hashlib
+import logging
+import tempfile
+from decimal import Decimal
+from datetime import date, datetime, time
+
+# Logging configuration
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ReportCache")
+
+CACHE_FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", ".report_cache")
+# Total size of cached results on disk; least recently used entries are evicted beyond it
+MAX_CACHE_BYTES = 256 * 2**20
+# Entries are plain JSON, never pickles: reading the cache directory cannot run code
+ENTRY_SUFFIX = '.json'
+# Values JSON has no type for are stored as {tag: string} and restored on load
+TAGGED_TYPES = {'__datetime__': datetime, '__date__': date, '__decimal__': Decimal}
+
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip())
+        except ValueError:
+            return value.strip()
+    if isinstance(value, datetime):
+        # '2024-01-01', date(2024, 1, 1) and datetime(2024, 1, 1) select the same rows
+        if value.tzinfo is None and value.time() == time():
+            return value.date().isoformat()
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return normalize_params(value)
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(item) for item in value]
+    return value
+
+
+def normalize_params(params):
+    """Canonical form of report parameters: dates as ISO strings, stripped strings, None values dropped."""
+    return {name: _normalize_value(value) for name, value in sorted(params.items()) if value is not None}
+
+
+def compute_report_key(report_name, params):
+    """Content hash of a report name and its normalized parameters."""
+    payload = json.dumps([report_name, normalize_params(params)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _encode_tagged(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    if isinstance(value, date):
+        return {'__date__': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'__decimal__': str(value)}
+    raise TypeError(f"Cannot store {type(value).__name__} in the report cache")
+
+
+def _decode_tagged(obj):
+    if len(obj) == 1:
+        (tag, value), = obj.items()
+        if tag == '__datetime__':
+            return datetime.fromisoformat(value)
+        if tag == '__date__':
+            return date.fromisoformat(value)
+        if tag == '__decimal__':
+            return Decimal(value)
+    return obj
+
+
+class ReportCache:
+    """
+    Report results stored as JSON on local disk, one file per (report name, normalized params),
+    with an LRU bound on their total size: a hit refreshes the file's mtime, and
+    writes evict the oldest files once the directory exceeds `max_bytes`.
+
+    Every entry is tagged with the watermark of the transactions it covered (report
+    specific, e.g. max id, max updated_at and row count). On the next request the
+    report is asked what changed since that watermark and the entry is reused as is,
+    topped up with just the new rows, or recomputed when covered rows changed.
+
+    Results and watermarks must be JSON values (dates, datetimes and Decimals are
+    tagged and restored); get_or_compute takes encode/decode hooks for result objects.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.top_ups = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def load(self, key):
+        """The cached entry for a key, or None; unreadable entries are dropped."""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f, object_hook=_decode_tagged)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"Dropping unreadable report cache entry {path}: {e}")
+            self._remove(path)
+            return None
+        if not isinstance(entry, dict) or entry.get('format_version') != CACHE_FORMAT_VERSION:
+            self._remove(path)
+            return None
+        os.utime(path)
+        return entry
+
+    def store(self, key, entry):
+        """Writes an entry under a temporary name and moves it into place, then enforces the size bound."""
+        entry = dict(entry, format_version=CACHE_FORMAT_VERSION)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.report_cache_')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, default=_encode_tagged)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for item in scan:
+                if item.name.endswith(ENTRY_SUFFIX):
+                    stat = item.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, item.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+    def get_or_compute(self, report_name, params, compute, changes_since, merge, encode=None, decode=None):
+        """
+        Returns the report result for these parameters.
+        compute() -> (result, watermark) builds the report from scratch.
+        changes_since(watermark) -> (rows, watermark) gives the rows added to the report's
+        range since the watermark (empty when nothing changed), or None when rows the
+        entry already covers were changed or deleted and the result must be recomputed.
+        merge(result, rows) -> result applies the added rows to a cached result.
+        encode(result) / decode(stored) convert results that are not JSON values.
+        """
+        encode = encode or (lambda result: result)
+        decode = decode or (lambda stored: stored)
+        key = compute_report_key(report_name, params)
+        entry = self.load(key)
+        if entry is not None:
+            delta = changes_since(entry['watermark'])
+            if delta is not None:
+                rows, watermark = delta
+                if not rows:
+                    self.hits += 1
+                    if watermark != entry['watermark']:
+                        self.store(key, dict(entry, watermark=watermark))
+                    return decode(entry['result'])
+                self.top_ups += 1
+                result = merge(decode(entry['result']), rows)
+                self.store(key, dict(entry, result=encode(result), watermark=watermark))
+                logger.info(f"Topped up cached {report_name} report with {len(rows)} new rows")
+                return result
+            logger.info(f"Cached {report_name} report covers changed rows, recomputing")
+
+        self.misses += 1
+        result, watermark = compute()
+        self.store(key, {
+            'report': report_name,
+            'params': normalize_params(params),
+            'watermark': watermark,
+            'result': encode(result),
+        })
+        return result
@@ -0,0 +1,86 @@
+import json
+import base64
+import datetime
+from sqlalchemy import tuple_
+
+# Rows per statement page unless the caller asks for fewer, and the most a caller may ask for
+STATEMENT_PAGE_SIZE = 100
+MAX_STATEMENT_PAGE_SIZE = 1000
+# Rows fetched per round trip while a page is streamed
+STREAM_BATCH_SIZE = 500
+
+# Keyset pagination over (created_at, id): each page starts strictly after the last row of
+# the previous one, so fetching page N costs the same as page 1 and rows inserted meanwhile
+# never shift or repeat entries. Queries are expected to be backed by an index ending in
+# (created_at, id), e.g. (user_id, created_at, id). Rows without a created_at have no
+# place in that order and are left out of every page.
+
+def encode_cursor(created_at, row_id):
+    """Opaque cursor pointing just after the row with this (created_at, id)."""
+    payload = json.dumps([created_at.isoformat(), row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_cursor(cursor):
+    """Returns the (created_at, id) a cursor points after; ValueError if it was not made by encode_cursor."""
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid statement cursor")
+
+def page_limit(requested):
+    """Clamps a requested page size to [1, MAX_STATEMENT_PAGE_SIZE], defaulting to STATEMENT_PAGE_SIZE."""
+    if requested is None:
+        return STATEMENT_PAGE_SIZE
+    return max(1, min(int(requested), MAX_STATEMENT_PAGE_SIZE))
+
+def keyset_query(query, model, cursor=None, limit=STATEMENT_PAGE_SIZE, descending=False):
+    """
+    Restricts `query` to the rows after `cursor` in (created_at, id) order (newest first
+    with `descending`) and fetches one row more than `limit`, which tells whether
+    another page follows.
+    """
+    key = tuple_(model.created_at, model.id)
+    query = query.filter(model.created_at.isnot(None))
+    if cursor is not None:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.filter(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(model.created_at.desc(), model.id.desc())
+    else:
+        query = query.order_by(model.created_at, model.id)
+    return query.limit(limit + 1)
+
+def keyset_page(query, model, cursor=None, limit=STATEMENT_PAGE_SIZE, descending=False):
+    """One page of rows and the cursor of the next page (None on the last page)."""
+    rows = keyset_query(query, model, cursor, limit, descending).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def iter_keyset(query, model, page_size=STATEMENT_PAGE_SIZE, descending=False):
+    """Yields every row of `query` in (created_at, id) order, one keyset page in memory at a time."""
+    cursor = None
+    while True:
+        rows, cursor = keyset_page(query, model, cursor, page_size, descending)
+        yield from rows
+        if cursor is None:
+            return
+
+def stream_json_statement(rows, serialize, key, limit):
+    """
+    Serializes one page as JSON text chunks while the rows are still being fetched:
+    {"status": "success", "<key>": [...], "next_cursor": ...}. `rows` is the (possibly
+    lazy) result of keyset_query; the extra row it fetched is not emitted, it only
+    decides whether next_cursor is set.
+    """
+    yield f'{{"status": "success", "{key}": ['
+    last, next_cursor = None, None
+    for count, row in enumerate(rows):
+        if count == limit:
+            next_cursor = encode_cursor(last.created_at, last.id)
+            break
+        yield (', ' if count else '') + json.dumps(serialize(row), default=str)
+        last = row
+    yield f'], "next_cursor": {json.dumps(next_cursor)}}}'
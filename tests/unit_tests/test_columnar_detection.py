@@ -0,0 +1,140 @@
+import os
+import copy
+import time
+import random
+import unittest
+import importlib.util
+from datetime import datetime, timedelta
+from fraud_detection.fraud_rules.rule_based_detection import RuleBasedFraudDetection
+from fraud_detection.fraud_rules.rule_engine import RuleEngine, load_rule_definitions, DEFAULT_RULES_PATH
+
+HAS_PANDAS = importlib.util.find_spec('pandas') is not None and importlib.util.find_spec('numpy') is not None
+
+
+def make_transactions(count, cards, seed=11):
+    rng = random.Random(seed)
+    start = datetime(2024, 3, 1)
+    return [
+        {
+            'transaction_id': f'txn_{i}',
+            'amount': rng.choice([50, 9999, 10000, 10001, 25000]),
+            'country': rng.choice(['United States', 'Iran', 'Cuba', 'Canada']),
+            'card_number': f'card_{rng.randrange(cards)}',
+            # Coarse timestamps so ties and exact window boundaries occur
+            'transaction_time': start + timedelta(minutes=15 * rng.randrange(400)),
+            'status': rng.choice(['approved', 'declined']),
+            'merchant_id': f'merchant_{rng.randrange(30)}',
+        }
+        for i in range(count)
+    ]
+
+
+@unittest.skipUnless(HAS_PANDAS, "pandas and numpy are required for the columnar backend")
+class TestColumnarFraudDetection(unittest.TestCase):
+
+    def test_matches_row_engine(self):
+        from fraud_detection.fraud_rules.columnar_detection import ColumnarFraudDetection
+
+        transactions = make_transactions(3000, cards=40)
+        expected = RuleBasedFraudDetection(copy.deepcopy(transactions)).detect_fraud()
+        actual = ColumnarFraudDetection(copy.deepcopy(transactions)).detect_fraud()
+
+        self.assertEqual(
+            [(t['transaction_id'], t['rules_broken']) for t in actual],
+            [(t['transaction_id'], t['rules_broken']) for t in expected],
+        )
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), "changing the local time zone requires time.tzset")
+    def test_distinct_counts_match_row_engine_outside_utc(self):
+        from fraud_detection.fraud_rules.columnar_detection import ColumnarFraudDetection
+
+        # card_many_merchants counts distinct merchants per card in 4 hour sketch buckets
+        definitions = [rule for rule in load_rule_definitions(DEFAULT_RULES_PATH) if rule['name'] != 'card_many_merchants']
+        definitions.append({
+            'name': 'card_many_merchants', 'type': 'distinct', 'key': 'card_number',
+            'field': 'merchant_id', 'window_seconds': 86400, 'limit': 16,
+        })
+        original_tz = os.environ.get('TZ')
+
+        def restore_tz():
+            if original_tz is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = original_tz
+            time.tzset()
+
+        self.addCleanup(restore_tz)
+        # A 5 hour offset moves transactions between sketch buckets
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+
+        transactions = make_transactions(3000, cards=40)
+        expected = RuleBasedFraudDetection(copy.deepcopy(transactions), RuleEngine(definitions=definitions)).detect_fraud()
+        actual = ColumnarFraudDetection(copy.deepcopy(transactions), RuleEngine(definitions=definitions)).detect_fraud()
+
+        self.assertTrue(any('card_many_merchants' in t['rules_broken'] for t in expected))
+        self.assertEqual(
+            [(t['transaction_id'], t['rules_broken']) for t in actual],
+            [(t['transaction_id'], t['rules_broken']) for t in expected],
+        )
+
+    def test_distinct_counts_match_the_sketch_replay(self):
+        from fraud_detection.fraud_rules import columnar_detection
+        from fraud_detection.fraud_rules.rule_engine import DistinctCountRule, replay_distinct_counts
+        from fraud_detection.fraud_rules.sketches import epoch_seconds
+
+        transactions = make_transactions(2000, cards=40)
+        rng = random.Random(5)
+        for transaction in transactions:
+            # Missing keys and values, and ties at sub-second timestamps
+            transaction['ip_address'] = None if rng.random() < 0.05 else f"10.0.0.{rng.randrange(25)}"
+            if rng.random() < 0.05:
+                transaction['merchant_id'] = None
+            transaction['transaction_time'] += timedelta(microseconds=rng.choice([0, 250]))
+        columns = columnar_detection.TransactionColumns.from_records(transactions)
+        seconds = (columns.times // 1000) / 1e6
+
+        for definition in [
+            {'key': 'card_number', 'field': 'merchant_id', 'window_seconds': 86400},
+            {'key': 'ip_address', 'field': 'card_number', 'window_seconds': 3600, 'bucket_seconds': 700, 'precision': 6},
+        ]:
+            rule = DistinctCountRule(dict(definition, name='distinct', limit=5))
+            expected = replay_distinct_counts(
+                rule, [t.get(rule.key) for t in transactions], [t.get(rule.field) for t in transactions],
+                [epoch_seconds(t['transaction_time']) for t in transactions],
+            )
+            value_codes, values = columns.value_codes(rule.field)
+            actual = columnar_detection.distinct_counts(rule, columns.key_codes(rule.key), value_codes, values, seconds,
+                                                        order=columns.key_time_order(rule.key))
+            self.assertEqual(actual.tolist(), expected)
+
+            # Expanding the windows a few pairs at a time gives the same estimates
+            original = columnar_detection._MAX_DISTINCT_PAIRS
+            columnar_detection._MAX_DISTINCT_PAIRS = 7
+            try:
+                chunked = columnar_detection.distinct_counts(rule, columns.key_codes(rule.key), value_codes, values, seconds)
+            finally:
+                columnar_detection._MAX_DISTINCT_PAIRS = original
+            self.assertEqual(chunked.tolist(), expected)
+
+    def test_window_counts_split_into_chunks(self):
+        import numpy as np
+        from fraud_detection.fraud_rules import columnar_detection
+
+        cards = np.array([0, 1, 0, 2, 1, 0], dtype=np.int64)
+        times = np.array([0, 5, 10, 10, 20, 30], dtype=np.int64)
+        expected = columnar_detection.window_counts(cards, times, 10)
+
+        original = columnar_detection._MAX_COMPOSITE_KEY
+        columnar_detection._MAX_COMPOSITE_KEY = 50
+        try:
+            chunked = columnar_detection.window_counts(cards, times, 10)
+        finally:
+            columnar_detection._MAX_COMPOSITE_KEY = original
+
+        self.assertEqual(expected.tolist(), [1, 1, 2, 1, 1, 1])
+        self.assertEqual(chunked.tolist(), expected.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
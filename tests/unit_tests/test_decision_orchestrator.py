@@ -0,0 +1,122 @@
+import time
+import logging
+import unittest
+from datetime import datetime
+from fraud_detection.fraud_rules.decision_orchestrator import FraudDecisionOrchestrator
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, Transaction, UserBehavior
+
+
+class ScoredModel:
+    """Stands in for a compiled MLFraudDetection: fixed score after an optional delay."""
+
+    def __init__(self, probability, delay=0.0):
+        self.probability = probability
+        self.delay = delay
+        self.compiled_model = object()
+
+    def score_transaction(self, features):
+        time.sleep(self.delay)
+        return int(self.probability > 0.5), self.probability
+
+
+def authorization(transaction_id, amount=120, country='Canada', user_id='user1'):
+    return {
+        'transaction_id': transaction_id, 'user_id': user_id, 'amount': amount, 'country': country,
+        'card_number': f'card_{transaction_id}', 'transaction_time': datetime(2024, 1, 1, 12),
+        'status': 'approved', 'card_type': 'credit', 'previous_fraud_score': 0,
+    }
+
+
+class TestFraudDecisionOrchestrator(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("RiskScoring").setLevel(logging.WARNING)
+        logging.getLogger("FraudDecision").setLevel(logging.ERROR)
+        history = [Transaction(f"H{i}", "user1", 100, datetime(2023, 12, 1, 12), "Canada", "credit", 0)
+                   for i in range(5)]
+        self.risk_engine = RiskScoringEngine({"user1": UserBehavior("user1", history)}, {})
+
+    def tearDown(self):
+        logging.getLogger("RiskScoring").setLevel(logging.NOTSET)
+        logging.getLogger("FraudDecision").setLevel(logging.NOTSET)
+
+    def orchestrator(self, model, deadline_ms=30, risk_engine=None, max_workers=4, max_backlog=None):
+        orchestrator = FraudDecisionOrchestrator(ml_detector=model, risk_engine=risk_engine or self.risk_engine,
+                                                 deadline_ms=deadline_ms, ml_features=lambda t: [t['amount']],
+                                                 max_workers=max_workers, max_backlog=max_backlog)
+        self.addCleanup(orchestrator.close)
+        return orchestrator
+
+    def test_all_tiers_within_deadline(self):
+        orchestrator = self.orchestrator(ScoredModel(0.9))
+        result = orchestrator.decide(authorization('txn_1'))
+        self.assertEqual((result.decision, result.fallback, result.risk_level), ("decline", False, "Low"))
+        self.assertEqual(result.ml_probability, 0.9)
+
+        result = self.orchestrator(ScoredModel(0.1)).decide(authorization('txn_2'))
+        self.assertEqual(result.decision, "approve")
+
+    def test_slow_model_falls_back_to_rules(self):
+        orchestrator = self.orchestrator(ScoredModel(0.9, delay=0.2), deadline_ms=20)
+        result = orchestrator.decide(authorization('txn_1'))
+        self.assertTrue(result.fallback)
+        self.assertEqual((result.decision, result.timed_out), ("approve", ("ml",)))
+        self.assertLess(result.latency_ms, 150)
+
+        declined = orchestrator.decide(authorization('txn_2', country='Iran'))
+        self.assertEqual((declined.decision, declined.rules_broken), ("decline", ['suspicious_country']))
+        self.assertEqual(orchestrator.stats()['timeouts'], {'ml': 1, 'risk': 0})
+
+    def test_answered_tiers_still_decide_when_another_times_out(self):
+        class SlowRiskEngine:
+            def assess_risk(self, transaction):
+                time.sleep(0.2)
+                return "Low"
+
+        orchestrator = self.orchestrator(ScoredModel(0.9), deadline_ms=20, risk_engine=SlowRiskEngine())
+        result = orchestrator.decide(authorization('txn_1'))
+        self.assertEqual((result.decision, result.fallback, result.timed_out), ("decline", True, ("risk",)))
+        self.assertEqual((result.ml_probability, result.risk_level), (0.9, None))
+        self.assertEqual(orchestrator.stats()['fallbacks'], 1)
+
+    def test_cancelled_tiers_record_no_latency(self):
+        # One worker: the slow model holds it and the risk call is cancelled while still queued
+        orchestrator = self.orchestrator(ScoredModel(0.1, delay=0.1), deadline_ms=10, max_workers=1)
+        result = orchestrator.decide(authorization('txn_1'))
+        self.assertEqual(result.timed_out, ("ml", "risk"))
+        time.sleep(0.2)
+        self.assertEqual(orchestrator.histograms["ml"].observations, 1)
+        self.assertEqual(orchestrator.histograms["risk"].observations, 0)
+        # Only the model call had started, so only it could not be cancelled
+        self.assertEqual(orchestrator.stats()['uncancelled'], {'ml': 1, 'risk': 0})
+        self.assertIn('fraud_decision_uncancelled_total{tier="ml"} 1', orchestrator.export_metrics())
+
+    def test_full_backlog_sheds_tier_calls(self):
+        # The abandoned model call keeps the only backlog slot until it returns
+        orchestrator = self.orchestrator(ScoredModel(0.1, delay=0.2), deadline_ms=10, max_workers=1, max_backlog=1)
+        result = orchestrator.decide(authorization('txn_1'))
+        self.assertEqual((result.decision, result.timed_out), ("approve", ("ml", "risk")))
+        self.assertEqual(orchestrator.stats()['shed'], {'ml': 0, 'risk': 1})
+        self.assertEqual(orchestrator.stats()['backlog'], 1)
+        self.assertIn('fraud_decision_tier_backlog 1', orchestrator.export_metrics())
+
+        second = orchestrator.decide(authorization('txn_2'))
+        self.assertEqual(second.timed_out, ("ml", "risk"))
+        self.assertEqual(orchestrator.stats()['shed'], {'ml': 1, 'risk': 2})
+
+        time.sleep(0.3)
+        self.assertEqual(orchestrator.stats()['backlog'], 0)
+        self.assertIn('fraud_decision_shed_total{tier="risk"} 2', orchestrator.export_metrics())
+
+    def test_exports_tier_histograms(self):
+        orchestrator = self.orchestrator(ScoredModel(0.1))
+        for i in range(3):
+            orchestrator.decide(authorization(f'txn_{i}'))
+        metrics = orchestrator.export_metrics()
+        self.assertIn('fraud_decision_tier_latency_seconds_count{tier="decision"} 3', metrics)
+        self.assertIn('fraud_decision_tier_latency_seconds_bucket{tier="rules",le="+Inf"} 3', metrics)
+        self.assertIn('fraud_decision_decisions_total{decision="approve"} 3', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
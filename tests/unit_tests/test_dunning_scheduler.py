@@ -0,0 +1,180 @@
+import time
+import logging
+import unittest
+import importlib.util
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+
+HAS_SQLALCHEMY = importlib.util.find_spec('sqlalchemy') is not None
+
+
+class RecordingSession:
+    """Answers the claim SELECT from a list of due schedules and records every statement."""
+
+    def __init__(self, due):
+        self.due = due
+        self.statements = []
+        self.in_transaction = False
+        self.limits = []
+
+    def execute(self, statement, params=None):
+        self.in_transaction = True
+        sql = str(statement)
+        self.statements.append((sql, params))
+        if sql.lstrip().startswith('SELECT'):
+            self.limits.append(params['limit'])
+            rows = self.due[:params['limit']]
+            return SimpleNamespace(mappings=lambda: SimpleNamespace(all=lambda: rows))
+        return SimpleNamespace(rowcount=1)
+
+    def commit(self):
+        self.in_transaction = False
+
+    def rollback(self):
+        self.in_transaction = False
+
+
+class RecordingGateway:
+    def __init__(self, session, failing=()):
+        self.session = session
+        self.failing = set(failing)
+        self.calls = []
+
+    def renew_subscription(self, stripe_subscription_id):
+        self.calls.append((time.monotonic(), self.session.in_transaction))
+        if stripe_subscription_id in self.failing:
+            raise Exception("card declined")
+
+
+@unittest.skipUnless(HAS_SQLALCHEMY, "sqlalchemy is required for the dunning scheduler")
+class TestDunningScheduler(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("DunningScheduler").setLevel(logging.CRITICAL)
+
+    def tearDown(self):
+        logging.getLogger("DunningScheduler").setLevel(logging.NOTSET)
+
+    def test_jitter_spreads_retries_around_the_backoff(self):
+        from billing.dunning.dunning_scheduler import DunningPolicy
+
+        policy = DunningPolicy(backoff=[timedelta(days=1), timedelta(minutes=1)], jitter_seconds=3600)
+        now = datetime(2024, 3, 1)
+        retries = [policy.next_retry_at(1, now) for _ in range(200)]
+        self.assertTrue(all(now + timedelta(hours=23) <= retry <= now + timedelta(hours=25) for retry in retries))
+        self.assertGreater(len(set(retries)), 100)
+        self.assertGreater(max(retries) - min(retries), timedelta(hours=1))
+
+        # Jitter larger than the delay never schedules a retry in the past
+        self.assertTrue(all(policy.next_retry_at(2, now) >= now for _ in range(200)))
+
+    def test_batches_are_capped_paced_and_sent_without_a_transaction(self):
+        from billing.dunning.dunning_scheduler import DunningScheduler, DunningPolicy
+
+        due = [{'id': i, 'subscription_id': 100 + i, 'attempt': 1, 'stripe_subscription_id': f"sub_{i}"}
+               for i in range(20)]
+        session = RecordingSession(due)
+        gateway = RecordingGateway(session, failing={'sub_1'})
+        policy = DunningPolicy(jitter_seconds=0, max_retries_per_second=50)
+        scheduler = DunningScheduler(policy=policy, interval=0.1, db_session=session, stripe_api=gateway)
+
+        self.assertEqual(scheduler.process_due_retries(), 5)
+        self.assertEqual(session.limits, [5])
+        self.assertEqual(len(gateway.calls), 5)
+
+        # The claim is committed before the first gateway call; no lock is held while pacing
+        self.assertEqual([in_transaction for _, in_transaction in gateway.calls], [False] * 5)
+        claim = [params for sql, params in session.statements if 'claimed_until' in params and 'id' not in params]
+        self.assertEqual(claim[0]['ids'], [0, 1, 2, 3, 4])
+
+        # Calls are spread 1 / max_retries_per_second apart
+        times = [started for started, _ in gateway.calls]
+        self.assertGreaterEqual(times[-1] - times[0], 4 * 0.02 * 0.9)
+
+        # Outcomes are only written for schedules still carrying this claim
+        results = [params for sql, params in session.statements if 'attempt = :attempt' in sql]
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(params['claimed_until'] == claim[0]['claimed_until'] for params in results))
+        self.assertEqual([params.get('next_attempt') for params in results], [None, 2, None, None, None])
+        self.assertFalse(session.in_transaction)
+
+    def test_stopping_ends_the_pacing_and_leaves_unsent_schedules_claimed(self):
+        from billing.dunning.dunning_scheduler import DunningScheduler, DunningPolicy
+
+        due = [{'id': i, 'subscription_id': 100 + i, 'attempt': 1, 'stripe_subscription_id': f"sub_{i}"}
+               for i in range(5)]
+        session = RecordingSession(due)
+        gateway = RecordingGateway(session)
+        policy = DunningPolicy(jitter_seconds=0, max_retries_per_second=1)
+        scheduler = DunningScheduler(policy=policy, interval=5, db_session=session, stripe_api=gateway)
+
+        renew = gateway.renew_subscription
+
+        def renew_then_stop(stripe_subscription_id):
+            renew(stripe_subscription_id)
+            if len(gateway.calls) == 2:
+                scheduler.stop_scheduler()
+
+        gateway.renew_subscription = renew_then_stop
+        started = time.monotonic()
+        self.assertEqual(scheduler.process_due_retries(), 2)
+        # One second between calls, but the stop cuts the wait short
+        self.assertLess(time.monotonic() - started, 3)
+        results = [params for sql, params in session.statements if 'attempt = :attempt' in sql]
+        self.assertEqual([params['id'] for params in results], [0, 1])
+
+    def test_recovery_metrics_on_sqlite(self):
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        from billing.dunning.dunning_scheduler import DunningScheduler
+
+        engine = create_engine('sqlite://')
+        self.addCleanup(engine.dispose)
+        session = sessionmaker(bind=engine)()
+        self.addCleanup(session.close)
+        session.execute(text("""
+            CREATE TABLE dunning_schedules (
+                id INTEGER PRIMARY KEY, subscription_id BIGINT, attempt INTEGER, next_retry_at DATETIME,
+                status VARCHAR(20), recovered_at DATETIME, created_at DATETIME, updated_at DATETIME)
+        """))
+        created = datetime(2024, 3, 1)
+        rows = [('recovered', 1, created + timedelta(hours=6)), ('recovered', 3, created + timedelta(hours=30)),
+                ('exhausted', 4, None), ('scheduled', 2, None)]
+        for i, (status, attempt, recovered_at) in enumerate(rows):
+            session.execute(text("""
+                INSERT INTO dunning_schedules (id, subscription_id, attempt, next_retry_at, status,
+                                               recovered_at, created_at, updated_at)
+                VALUES (:id, :id, :attempt, :created, :status, :recovered_at, :created, :created)
+            """), {'id': i, 'attempt': attempt, 'status': status, 'recovered_at': recovered_at, 'created': created})
+        session.commit()
+
+        scheduler = DunningScheduler(db_session=session, stripe_api=RecordingGateway(session))
+        metrics = scheduler.recovery_metrics(since=created)
+        self.assertEqual((metrics['scheduled'], metrics['recovered'], metrics['exhausted']), (1, 2, 1))
+        self.assertAlmostEqual(metrics['recovery_rate'], 2 / 3)
+        self.assertEqual(metrics['avg_attempts_to_recover'], 2)
+        self.assertAlmostEqual(metrics['avg_hours_to_recover'], 18)
+
+    def test_each_batch_runs_in_a_unit_of_work_on_the_scheduler_session(self):
+        from billing.dunning.dunning_scheduler import DunningScheduler
+        from backend.src.models.identity_map import current_unit_of_work, NoUnitOfWork
+
+        session = RecordingSession([])
+        scheduler = DunningScheduler(interval=0, db_session=session, stripe_api=RecordingGateway(session))
+        seen = []
+
+        def process_due_retries():
+            seen.append(current_unit_of_work())
+            if len(seen) == 2:
+                scheduler.stop_scheduler()
+
+        scheduler.process_due_retries = process_due_retries
+        scheduler.run()
+        self.assertEqual([uow.session for uow in seen], [session, session])
+        self.assertIsNot(seen[0], seen[1])
+        with self.assertRaises(NoUnitOfWork):
+            current_unit_of_work()
+
+
+if __name__ == '__main__':
+    unittest.main()
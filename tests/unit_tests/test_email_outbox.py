@@ -0,0 +1,110 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+from datetime import datetime, timedelta
+
+# The dispatcher's default session comes from database_config (dotenv, PostgreSQL driver)
+HAS_DEPENDENCIES = all(importlib.util.find_spec(name) is not None for name in ('sqlalchemy', 'dotenv', 'psycopg2'))
+
+
+@unittest.skipUnless(HAS_DEPENDENCIES, "sqlalchemy, python-dotenv and psycopg2 are required for the email outbox")
+class TestOutboxDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from backend.src.models.outbox_model import EmailOutboxModel
+        import notifications.email_outbox  # noqa: F401 (patched below)
+
+        logging.getLogger("notifications.email_outbox").setLevel(logging.CRITICAL)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A file database so the dispatcher's sessions only see each other's committed work
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'outbox.db')}",
+                               connect_args={'check_same_thread': False})
+        self.addCleanup(engine.dispose)
+        EmailOutboxModel.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.Model = EmailOutboxModel
+
+        session = self.Session()
+        created = datetime.utcnow() - timedelta(minutes=5)
+        session.add_all([
+            EmailOutboxModel(id=i, recipient=f"user{i}@example.com", subject="Subscription Renewed",
+                             payload='{}', status='pending', attempts=0, created_at=created + timedelta(seconds=i))
+            for i in (1, 2, 3)
+        ])
+        session.commit()
+        session.close()
+
+    def tearDown(self):
+        logging.getLogger("notifications.email_outbox").setLevel(logging.NOTSET)
+
+    def dispatcher(self):
+        from notifications.email_outbox import OutboxDispatcher
+
+        dispatcher = OutboxDispatcher(batch_size=10, workers=2, session_factory=self.Session)
+        self.addCleanup(dispatcher.executor.shutdown)
+        return dispatcher
+
+    def rows(self):
+        session = self.Session()
+        try:
+            return {row.id: (row.status, row.attempts) for row in session.query(self.Model).all()}
+        finally:
+            session.close()
+
+    def test_claims_are_committed_before_sending(self):
+        statuses_while_sending = []
+
+        def send(recipient, subject, payload):
+            # Read from another session: the claim must already be visible, i.e. committed
+            statuses_while_sending.append(self.rows())
+            return recipient != "user2@example.com"
+
+        with mock.patch('notifications.email_outbox.send_subscription_email', side_effect=send):
+            self.assertEqual(self.dispatcher().dispatch_batch(), 3)
+
+        for statuses in statuses_while_sending:
+            self.assertEqual({status for status, _ in statuses.values()}, {'sending'})
+        self.assertEqual(self.rows(), {1: ('sent', 1), 2: ('pending', 1), 3: ('sent', 1)})
+
+    def test_failed_emails_are_retried_until_the_attempt_limit(self):
+        from notifications.email_outbox import MAX_DELIVERY_ATTEMPTS
+
+        dispatcher = self.dispatcher()
+        with mock.patch('notifications.email_outbox.send_subscription_email', side_effect=Exception("SMTP down")):
+            for _ in range(MAX_DELIVERY_ATTEMPTS):
+                dispatcher.dispatch_batch()
+            self.assertEqual(dispatcher.dispatch_batch(), 0)
+        self.assertEqual(set(self.rows().values()), {('dead', MAX_DELIVERY_ATTEMPTS)})
+
+    def test_stale_claims_are_taken_over(self):
+        from notifications.email_outbox import CLAIM_TIMEOUT_SECONDS
+
+        session = self.Session()
+        now = datetime.utcnow()
+        fresh, stale = session.get(self.Model, 1), session.get(self.Model, 2)
+        fresh.status, fresh.claimed_at = 'sending', now
+        stale.status, stale.claimed_at = 'sending', now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS + 1)
+        session.commit()
+        session.close()
+
+        dispatcher = self.dispatcher()
+        claimed = dispatcher.claim_batch()
+        self.assertEqual([email.id for email in claimed], [2, 3])
+
+        # The first claim's owner finishing late does not overwrite the new claim
+        late = [claimed[0]._replace(claimed_at=now - timedelta(seconds=CLAIM_TIMEOUT_SECONDS + 1))]
+        dispatcher.record_results(late, [None])
+        self.assertEqual(self.rows()[2], ('sending', 1))
+        dispatcher.record_results(claimed, [None, None])
+        self.assertEqual(self.rows(), {1: ('sending', 0), 2: ('sent', 1), 3: ('sent', 1)})
+
+
+if __name__ == '__main__':
+    unittest.main()
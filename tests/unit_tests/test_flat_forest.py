@@ -0,0 +1,51 @@
+import unittest
+import importlib.util
+
+HAS_SKLEARN = importlib.util.find_spec('sklearn') is not None and importlib.util.find_spec('pandas') is not None
+
+
+@unittest.skipUnless(HAS_SKLEARN, "scikit-learn and pandas are required for the ML fraud model")
+class TestFlatForest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import numpy as np
+        import pandas as pd
+        from fraud_detection.fraud_rules.ml_detection import MLFraudDetection
+
+        rng = np.random.default_rng(9)
+        X = pd.DataFrame({
+            'transaction_amount': rng.gamma(2.0, 800.0, 3000),
+            'merchant_id': rng.integers(0, 50, 3000),
+            'country': rng.integers(0, 5, 3000),
+        })
+        y = ((X['transaction_amount'] > 3000) & (X['country'] == 1) | (rng.random(3000) < 0.05)).astype(int)
+        cls.detector = MLFraudDetection(data_path=None)
+        cls.detector.model.set_params(n_estimators=20)
+        cls.detector.split_data(cls.detector.preprocess_data(X), y)
+        cls.detector.train_model()
+        cls.X = X.head(300)
+
+    def test_matches_predict_proba_for_rows_and_batches(self):
+        import numpy as np
+        from fraud_detection.fraud_rules.flat_forest import FlatForest
+
+        model = self.detector.model
+        flat = FlatForest.from_model(model)
+        scaled = self.detector.scaler.transform(self.X)
+        expected = model.predict_proba(scaled)
+
+        np.testing.assert_allclose(flat.predict_proba(scaled), expected, rtol=0, atol=1e-12)
+        for i in range(0, 300, 7):
+            np.testing.assert_allclose(flat.predict_proba_row(scaled[i]), expected[i], rtol=0, atol=1e-12)
+
+    def test_score_transaction_matches_predict(self):
+        labels, probabilities = self.detector.predict(self.X)
+        for i, row in enumerate(self.X.to_numpy()[:50]):
+            label, probability = self.detector.score_transaction(row)
+            self.assertEqual(label, labels[i])
+            self.assertAlmostEqual(probability, probabilities[i, 1], places=12)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import unittest
+import importlib.util
+
+HAS_SQLALCHEMY = importlib.util.find_spec('sqlalchemy') is not None
+
+
+@unittest.skipUnless(HAS_SQLALCHEMY, "sqlalchemy is required for the identity map")
+class TestModelLoader(unittest.TestCase):
+
+    def setUp(self):
+        from sqlalchemy import create_engine, event, Column, Integer, String
+        from sqlalchemy.orm import declarative_base, sessionmaker
+
+        engine = create_engine('sqlite://')
+        self.addCleanup(engine.dispose)
+        session = sessionmaker(bind=engine)()
+        self.addCleanup(session.close)
+        Base = declarative_base()
+
+        class Account(Base):
+            __tablename__ = 'accounts'
+            id = Column(Integer, primary_key=True)
+            stripe_id = Column(String(50))
+
+        Base.metadata.create_all(engine)
+        session.add_all([Account(id=1, stripe_id='sub_1'), Account(id=2, stripe_id='sub_2')])
+        session.commit()
+        self.Account = Account
+        self.session = session
+
+        self.queries = 0
+
+        def count(*args):
+            self.queries += 1
+
+        event.listen(engine, 'before_cursor_execute', count)
+
+    def test_keys_are_coerced_to_the_column_type(self):
+        from backend.src.models.identity_map import ModelLoader
+
+        loader = ModelLoader(self.session, self.Account)
+        self.assertEqual(loader.load('1').id, 1)
+        self.assertIs(loader.load(1), loader.load('1'))
+        self.assertEqual(self.queries, 1)
+
+        # The result is keyed as requested; a key that cannot be an id loads as None
+        found = loader.load_many(['2', 2, 'abc', None, 3])
+        self.assertEqual(list(found), ['2', 2, 'abc', None, 3])
+        self.assertIs(found['2'], found[2])
+        self.assertIsNone(found['abc'])
+        self.assertIsNone(found[3])
+        self.assertEqual(self.queries, 2)
+
+        # Not-found is cached under the coerced key as well
+        self.assertIsNone(loader.load('3'))
+        self.assertEqual(self.queries, 2)
+
+        loader.clear('1')
+        loader.load(1)
+        self.assertEqual(self.queries, 3)
+
+    def test_string_keys_are_left_alone(self):
+        from backend.src.models.identity_map import ModelLoader
+
+        loader = ModelLoader(self.session, self.Account, key='stripe_id')
+        self.assertEqual(loader.load_many(['sub_1', 'sub_9']), {'sub_1': loader.load('sub_1'), 'sub_9': None})
+        self.assertEqual(loader.load('sub_1').id, 1)
+        self.assertEqual(self.queries, 1)
+
+    def test_unit_of_work_loads_the_payment_models_through_its_session(self):
+        from backend.src.models.payment_model import Base, PaymentModel, PaymentMethodModel, UserModel
+        from backend.src.models.identity_map import unit_of_work, current_unit_of_work
+
+        Base.metadata.create_all(self.session.get_bind())
+        self.session.add_all([
+            UserModel(id=1, name='ada', email='ada@example.com', password_hash='x', stripe_customer_id='cus_1'),
+            PaymentMethodModel(id=1, method_type='card', user_id=1),
+            PaymentModel(id=5, amount=10.0, currency='USD', payment_method_id=1, user_id=1,
+                         stripe_subscription_id='sub_5'),
+        ])
+        self.session.commit()
+        self.queries = 0
+
+        with unit_of_work(self.session) as uow:
+            self.assertIs(current_unit_of_work(), uow)
+            self.assertEqual(uow.users_by_stripe_id.load('cus_1').id, 1)
+            subscription = uow.subscriptions_by_stripe_id.load_many(['sub_5', 'sub_9'])['sub_5']
+            uow.prime_subscription(subscription)
+            self.assertIs(uow.subscriptions.load('5'), subscription)
+            self.assertEqual(self.queries, 2)
+
+    def test_loaders_require_an_open_unit_of_work(self):
+        from backend.src.models.identity_map import current_unit_of_work, NoUnitOfWork, _current_unit_of_work
+
+        with self.assertRaises(NoUnitOfWork):
+            current_unit_of_work()
+
+        marker = object()
+        token = _current_unit_of_work.set(marker)
+        try:
+            self.assertIs(current_unit_of_work(), marker)
+        finally:
+            _current_unit_of_work.reset(token)
+
+
+if __name__ == '__main__':
+    unittest.main()
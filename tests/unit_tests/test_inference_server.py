@@ -0,0 +1,115 @@
+import unittest
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+
+HAS_SKLEARN = importlib.util.find_spec('sklearn') is not None and importlib.util.find_spec('pandas') is not None
+
+
+@unittest.skipUnless(HAS_SKLEARN, "scikit-learn and pandas are required for the ML fraud model")
+class TestFraudInferenceServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import numpy as np
+        import pandas as pd
+        from fraud_detection.fraud_rules.ml_detection import MLFraudDetection
+
+        rng = np.random.default_rng(3)
+        X = pd.DataFrame({
+            'transaction_amount': rng.gamma(2.0, 800.0, 2000),
+            'country': rng.integers(0, 5, 2000),
+        })
+        y = ((X['transaction_amount'] > 3000) | (rng.random(2000) < 0.05)).astype(int)
+        cls.detector = MLFraudDetection(data_path=None)
+        cls.detector.model.set_params(n_estimators=10)
+        cls.detector.split_data(cls.detector.preprocess_data(X), y)
+        cls.detector.train_model()
+        cls.X = X.head(200)
+
+    def test_model_predicts_single_threaded(self):
+        import os
+        import shutil
+        import tempfile
+        import joblib
+        from fraud_detection.fraud_rules.inference_server import FraudInferenceServer
+
+        self.assertEqual(self.detector.n_jobs, -1)
+        self.assertEqual(self.detector.model.n_jobs, 1)
+
+        # A model saved with its training n_jobs is loaded for single-threaded scoring
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        model_path = os.path.join(directory, "fraud")
+        self.detector.model.set_params(n_jobs=-1)
+        try:
+            joblib.dump(self.detector.model, model_path + "_model.pkl")
+            joblib.dump(self.detector.scaler, model_path + "_scaler.pkl")
+        finally:
+            self.detector.model.set_params(n_jobs=1)
+        server = FraudInferenceServer.from_artifacts(model_path)
+        self.assertEqual(server.detector.model.n_jobs, 1)
+
+    def test_batched_scores_match_direct_predictions(self):
+        from fraud_detection.fraud_rules.inference_server import FraudInferenceServer
+
+        expected_labels, expected_probabilities = self.detector.predict(self.X)
+        self.assertEqual(expected_labels.tolist(), self.detector.model.predict(self.detector.scaler.transform(self.X)).tolist())
+
+        server = FraudInferenceServer(self.detector, max_batch_size=16, max_wait_ms=5).start()
+        try:
+            rows = self.X.to_dict('records')
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(server.score, rows))
+        finally:
+            server.stop()
+
+        self.assertEqual([label for label, _ in results], expected_labels.tolist())
+        self.assertEqual([probability for _, probability in results], expected_probabilities[:, 1].tolist())
+        self.assertLess(server.stats()['batches'], len(rows))
+
+    def test_cancelled_requests_are_dropped_and_started_ones_run_to_completion(self):
+        import time
+        from fraud_detection.fraud_rules.inference_server import FraudInferenceServer
+
+        rows = self.X.to_dict('records')
+        server = FraudInferenceServer(self.detector, max_wait_ms=1)
+        cancelled = server.submit(rows[0])
+        self.assertTrue(cancelled.cancel())
+        server.start()
+        self.addCleanup(server.stop)
+
+        started = server.submit(rows[1])
+        while not (started.running() or started.done()):
+            time.sleep(0.001)
+        # A request in a batch that has started scoring can no longer be cancelled
+        self.assertFalse(started.cancel())
+        self.assertEqual(started.result(timeout=5), server.score(rows[1], timeout=5))
+        self.assertEqual(server.stats()['requests'], 2)
+
+    def test_submit_rejects_what_it_cannot_score(self):
+        from types import SimpleNamespace
+        from fraud_detection.fraud_rules.inference_server import FraudInferenceServer
+
+        unnamed = FraudInferenceServer(SimpleNamespace(scaler=object()))
+        with self.assertRaises(TypeError):
+            unnamed.submit({'transaction_amount': 10.0, 'country': 1})
+        with self.assertRaises(ValueError):
+            FraudInferenceServer(self.detector).submit({'transaction_amount': 10.0})
+
+        # Requests still queued when a server that never started is stopped fail instead of hanging
+        server = FraudInferenceServer(self.detector)
+        queued = server.submit([10.0, 1])
+        server.stop()
+        with self.assertRaises(RuntimeError):
+            queued.result(timeout=1)
+        with self.assertRaises(RuntimeError):
+            server.submit([10.0, 1])
+
+        # A restarted server accepts requests again
+        server.start()
+        self.addCleanup(server.stop)
+        self.assertEqual(len(server.score([10.0, 1], timeout=5)), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import logging
+import unittest
+from decimal import Decimal
+from datetime import datetime
+from billing.invoices.invoice_preview import InvoicePreviewEngine, compute_preview_key, invoice_preview_engine
+from billing.tax.tax_rate_events import publish_tax_rates
+
+
+class TestInvoicePreviewEngine(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("InvoicePreview").setLevel(logging.WARNING)
+        logging.getLogger("TaxRateEvents").setLevel(logging.WARNING)
+        self.params = {
+            'status': 'active',
+            'plan_id': 'pro',
+            'quantity': 1,
+            'tax_region': 'US',
+            'period_start': datetime(2024, 3, 1),
+            'period_end': datetime(2024, 3, 31),
+        }
+        self.loads = 0
+        self.computed = 0
+
+    def tearDown(self):
+        logging.getLogger("InvoicePreview").setLevel(logging.NOTSET)
+        logging.getLogger("TaxRateEvents").setLevel(logging.NOTSET)
+
+    def preview(self, engine, subscription_id=1, user_id=7):
+        def load_params():
+            self.loads += 1
+            return dict(self.params)
+
+        def compute_preview(params):
+            self.computed += 1
+            return f"{params['status']} {params['plan_id']} #{self.computed}"
+
+        return engine.get_preview(subscription_id, user_id, load_params, compute_preview)
+
+    def test_hit_skips_loading_and_computing(self):
+        engine = InvoicePreviewEngine()
+        first = self.preview(engine)
+        self.assertEqual(self.preview(engine), first)
+        self.assertEqual((self.loads, self.computed), (1, 1))
+        self.assertEqual(engine.stats(), {'hits': 1, 'misses': 1, 'entries': 1})
+
+        # Another user never gets this user's preview
+        self.preview(engine, user_id=8)
+        self.assertEqual(self.computed, 2)
+
+    def test_stale_entry_with_unchanged_inputs_is_revalidated(self):
+        engine = InvoicePreviewEngine()
+        first = self.preview(engine)
+        engine.invalidate(1)
+        self.assertEqual(self.preview(engine), first)
+        self.assertEqual((self.loads, self.computed), (2, 1))
+
+    def test_invalidated_entry_is_recomputed_after_changes(self):
+        engine = InvoicePreviewEngine()
+        self.preview(engine)
+        self.params['plan_id'] = 'enterprise'
+        # Without invalidation the cached preview is still served
+        self.assertEqual(self.preview(engine), "active pro #1")
+        engine.invalidate(1)
+        self.assertEqual(self.preview(engine), "active enterprise #2")
+
+        # Cancelling changes neither plan nor period but must not keep the upcoming invoice
+        self.params['status'] = 'canceled'
+        engine.invalidate(1)
+        self.assertEqual(self.preview(engine), "canceled enterprise #3")
+
+    def test_preview_key_without_billing_date(self):
+        self.params.update(period_start=None, period_end=None)
+        self.assertNotEqual(compute_preview_key(**self.params), compute_preview_key(**dict(self.params, quantity=2)))
+
+    def test_tax_rate_changes_drop_every_preview(self):
+        rates = {'US': Decimal('5.00'), 'EU': Decimal('20.00')}
+        publish_tax_rates(rates)
+        self.preview(invoice_preview_engine, subscription_id=1)
+        self.preview(invoice_preview_engine, subscription_id=2)
+
+        # Reloading the same rates keeps the cache
+        self.assertFalse(publish_tax_rates(dict(rates)))
+        self.assertEqual(invoice_preview_engine.stats()['entries'], 2)
+
+        self.assertTrue(publish_tax_rates(dict(rates, US=Decimal('6.00'))))
+        self.assertEqual(invoice_preview_engine.stats()['entries'], 0)
+        self.preview(invoice_preview_engine, subscription_id=1)
+        self.assertEqual(self.computed, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+
+HAS_SKLEARN = importlib.util.find_spec('sklearn') is not None and importlib.util.find_spec('pandas') is not None
+
+
+@unittest.skipUnless(HAS_SKLEARN, "scikit-learn and pandas are required for the ML fraud model")
+class TestModelArtifacts(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        import numpy as np
+        import pandas as pd
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        rng = np.random.default_rng(5)
+        cls.X = pd.DataFrame({
+            'transaction_amount': rng.gamma(2.0, 800.0, 3000),
+            'merchant_id': rng.integers(0, 50, 3000),
+            'country': rng.integers(0, 5, 3000),
+        })
+        y = ((cls.X['transaction_amount'] > 3000) | (rng.random(3000) < 0.05)).astype(int)
+        cls.scaler = StandardScaler().fit(cls.X)
+        cls.model = RandomForestClassifier(n_estimators=15, random_state=42).fit(cls.scaler.transform(cls.X), y)
+
+    def setUp(self):
+        self.artifact_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.artifact_dir)
+
+    def test_memory_mapped_model_matches_sklearn(self):
+        import numpy as np
+        from fraud_detection.fraud_rules.model_artifacts import save_model_artifacts, load_model_artifacts
+
+        version = save_model_artifacts(self.model, self.scaler, self.artifact_dir)
+        loaded = load_model_artifacts(self.artifact_dir)
+        self.assertEqual(loaded.version, version)
+        self.assertIsInstance(loaded.model.threshold, np.memmap)
+
+        expected = self.model.predict_proba(self.scaler.transform(self.X))
+        actual = loaded.model.predict_proba(loaded.scaler.transform(self.X))
+        np.testing.assert_allclose(actual, expected, rtol=0, atol=1e-12)
+
+    def test_checksum_mismatch_is_rejected(self):
+        from fraud_detection.fraud_rules.model_artifacts import (
+            ArtifactIntegrityError, save_model_artifacts, load_model_artifacts
+        )
+
+        version = save_model_artifacts(self.model, self.scaler, self.artifact_dir)
+        path = os.path.join(self.artifact_dir, 'versions', version, 'threshold.npy')
+        with open(path, 'r+b') as f:
+            f.seek(-8, os.SEEK_END)
+            f.write(b'\x00' * 8)
+        with self.assertRaises(ArtifactIntegrityError):
+            load_model_artifacts(self.artifact_dir)
+
+    def test_store_swaps_to_published_version(self):
+        from fraud_detection.fraud_rules.model_artifacts import ModelStore, save_model_artifacts, publish_version
+
+        first = save_model_artifacts(self.model, self.scaler, self.artifact_dir, version='v1')
+        store = ModelStore(self.artifact_dir, reload_interval=0)
+        second = save_model_artifacts(self.model, self.scaler, self.artifact_dir, version='v2', publish=False)
+        self.assertEqual(store.current().version, first)
+
+        publish_version(self.artifact_dir, second)
+        self.assertEqual(store.current().version, second)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from fraud_detection.risk_assessment.reference_tables import (
+    BinTable, IPGeoTable, ReferenceTables, RangeTable, current_table_version, VERSIONS_DIR
+)
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, Transaction, UserBehavior
+from fraud_detection.fraud_rules.rule_engine import RuleEngine, DEFAULT_RULES_PATH, load_rule_definitions
+from fraud_detection.fraud_rules.streaming_detection import StreamingFraudDetection
+
+IP_RANGES = [
+    ("10.0.0.0", "10.0.255.255", "US", "New York"),
+    ("10.1.0.0", "10.1.0.255", "FR", "Paris"),
+    ("5.160.0.0", "5.160.255.255", "IR", "Tehran"),
+]
+BIN_RANGES = [
+    ("411111", "411111", "credit", "US"),
+    ("52000000", "52009999", "prepaid", "GB"),
+    ("535000", "535999", "virtual", "US"),
+]
+
+
+class TestReferenceTables(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("RiskScoring").setLevel(logging.WARNING)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        IPGeoTable.build(os.path.join(self.directory, 'ip_geo'), IP_RANGES)
+        BinTable.build(os.path.join(self.directory, 'card_bins'), BIN_RANGES)
+        self.tables = ReferenceTables.load(self.directory)
+
+    def tearDown(self):
+        logging.getLogger("RiskScoring").setLevel(logging.NOTSET)
+
+    def test_lookups_by_binary_search(self):
+        self.assertEqual(self.tables.geolocate("10.1.0.17"), ("FR", "Paris"))
+        self.assertEqual(self.tables.geolocate("10.0.255.255"), ("US", "New York"))
+        self.assertIsNone(self.tables.geolocate("10.1.1.0"))
+        self.assertIsNone(self.tables.geolocate("2001:db8::1"))
+        self.assertEqual(self.tables.card_info("4111 1111 1111 1111"), ("credit", "US"))
+        self.assertEqual(self.tables.card_info("5200-0012-3456-7890"), ("prepaid", "GB"))
+        self.assertIsNone(self.tables.card_info("4111 1200 0000 0000"))
+
+        countries, locations = self.tables.ip_table.lookup_many(["5.160.3.4", "1.1.1.1", "10.0.0.1"])
+        self.assertEqual(countries.tolist(), ["IR", None, "US"])
+        self.assertEqual(locations.tolist(), ["Tehran", None, "New York"])
+        self.assertIsInstance(self.tables.ip_table.arrays['start'], np.memmap)
+
+    def test_rejects_overlapping_ranges(self):
+        with self.assertRaises(ValueError):
+            IPGeoTable.build(os.path.join(self.directory, 'bad'), IP_RANGES + [("10.0.1.0", "10.0.1.255", "US", "Boston")])
+
+    def test_rebuilds_publish_a_new_version(self):
+        path = os.path.join(self.directory, 'ip_geo')
+        before = self.tables.ip_table
+        first = current_table_version(path)
+        second = IPGeoTable.build(path, IP_RANGES[:1])
+        self.assertNotEqual(second, first)
+
+        # Tables opened earlier keep their files; new loads see the new version
+        self.assertEqual(before.lookup("10.1.0.17"), ("FR", "Paris"))
+        self.assertIsNone(ReferenceTables.load(self.directory).geolocate("10.1.0.17"))
+
+        # A failed build leaves the published version in place
+        with self.assertRaises(ValueError):
+            IPGeoTable.build(path, IP_RANGES + [("10.0.1.0", "10.0.1.255", "US", "Boston")])
+        self.assertEqual(current_table_version(path), second)
+
+        third = IPGeoTable.build(path, IP_RANGES)
+        self.assertEqual(sorted(os.listdir(os.path.join(path, VERSIONS_DIR))), [second, third])
+        self.assertEqual(len(RangeTable.load(path)), 3)
+
+    def test_risk_scoring_uses_lookups_in_row_and_batch_paths(self):
+        history = [Transaction(f"H{i}", "user1", 100, datetime(2024, 1, 1, 12), "New York", "credit", 0) for i in range(3)]
+        engine = RiskScoringEngine({"user1": UserBehavior("user1", history)}, {}, reference_tables=self.tables)
+        transactions = [
+            # The IP resolves to France while the BIN is a GB prepaid card
+            Transaction("T1", "user1", 100, datetime(2024, 1, 2, 12), "New York", "credit", 0,
+                        ip_address="10.1.0.5", card_number="5200001234567890"),
+            Transaction("T2", "user1", 100, datetime(2024, 1, 2, 12), "New York", "credit", 0,
+                        ip_address="10.0.0.5", card_number="4111111111111111"),
+            Transaction("T3", "user1", 100, datetime(2024, 1, 2, 12), "New York", "credit", 0),
+        ]
+        levels = [engine.assess_risk(transaction) for transaction in transactions]
+        self.assertEqual(levels, ["Medium", "Low", "Low"])
+        batch = pd.DataFrame([vars(transaction) for transaction in transactions])
+        self.assertEqual(engine.assess_batch(batch).tolist(), levels)
+
+    def test_ip_locations_do_not_replace_stated_locations(self):
+        # The table names cities differently from the free text user histories were built from
+        IPGeoTable.build(os.path.join(self.directory, 'ip_geo'), [("10.0.0.0", "10.0.255.255", "US", "NEW YORK NY")])
+        tables = ReferenceTables.load(self.directory)
+        history = [Transaction(f"H{i}", "user1", 100, datetime(2024, 1, 1, 12), "New York", "credit", 0) for i in range(3)]
+        plain = RiskScoringEngine({"user1": UserBehavior("user1", history)}, {})
+        engine = RiskScoringEngine({"user1": UserBehavior("user1", history)}, {}, reference_tables=tables)
+        transaction = Transaction("T1", "user1", 100, datetime(2024, 1, 2, 12), "New York", "credit", 0,
+                                  ip_address="10.0.0.5", card_number="4111111111111111")
+
+        resolved = engine.apply_reference_data(transaction)
+        self.assertEqual((resolved.location, resolved.ip_location, resolved.ip_country), ("New York", "NEW YORK NY", "US"))
+        self.assertEqual(engine.assess_risk(transaction), plain.assess_risk(transaction))
+        batch = pd.DataFrame([vars(transaction)])
+        self.assertEqual(engine.assess_batch(batch).tolist(), plain.assess_batch(batch).tolist())
+
+    def test_streaming_rules_use_lookups(self):
+        # The lookup rules ship disabled; enable them as a backtest would
+        definitions = [dict(rule, enabled=True) for rule in load_rule_definitions(DEFAULT_RULES_PATH)
+                       if rule['name'] in ('suspicious_ip_country', 'issuer_country_mismatch')]
+        detector = StreamingFraudDetection(reference_tables=self.tables, rule_engine=RuleEngine(definitions=definitions))
+        transaction = {
+            'transaction_id': 'txn_1', 'amount': 10, 'country': 'Canada', 'card_number': '4111111111111111',
+            'transaction_time': datetime(2024, 1, 1), 'status': 'approved', 'ip_address': '5.160.0.9',
+        }
+        self.assertEqual(detector.evaluate(transaction), ['suspicious_ip_country', 'issuer_country_mismatch'])
+        self.assertEqual((transaction['ip_country'], transaction['card_type']), ('IR', 'credit'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import time
+import logging
+import unittest
+from datetime import datetime, timedelta
+from fraud_detection.fraud_rules.replay_harness import ReplayConfig, ShadowReplay
+from fraud_detection.fraud_rules.rule_based_detection import RuleBasedFraudDetection
+from fraud_detection.fraud_rules.rule_engine import RuleEngine
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, Transaction, UserBehavior
+
+
+def rules(large_amount):
+    return RuleBasedFraudDetection([], RuleEngine(definitions=[
+        {'name': 'large_amount', 'type': 'threshold', 'field': 'amount', 'operator': 'gt', 'value': large_amount},
+        {'name': 'high_frequency', 'type': 'velocity', 'key': 'card_number', 'window_seconds': 3600, 'limit': 5},
+    ]))
+
+
+class TestShadowReplay(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("RiskScoring").setLevel(logging.WARNING)
+        start = datetime(2024, 1, 1, 12)
+        self.stream = [
+            {'transaction_id': f'txn_{i}', 'user_id': 'user1', 'amount': 1000 * (i % 12), 'country': 'Canada',
+             'card_number': f'card_{i % 7}', 'transaction_time': start + timedelta(minutes=i), 'status': 'approved',
+             'location': 'Toronto', 'card_type': 'credit', 'previous_fraud_score': 0}
+            for i in range(60)
+        ]
+        history = [Transaction("H1", "user1", 5000, start - timedelta(days=1), "Toronto", "credit", 0)]
+        self.behavior = {"user1": UserBehavior("user1", history)}
+
+    def tearDown(self):
+        logging.getLogger("RiskScoring").setLevel(logging.NOTSET)
+
+    def test_shadow_diff_against_baseline(self):
+        baseline = ReplayConfig("baseline", rules(10000), RiskScoringEngine(self.behavior, {}))
+        candidate = ReplayConfig("candidate", rules(8000), RiskScoringEngine(self.behavior, {}))
+        report = ShadowReplay(baseline, candidate).run(self.stream)
+
+        # Amounts 9000 and 10000 break only the candidate's lower threshold
+        expected = sum(1 for t in self.stream if 8000 < t['amount'] <= 10000)
+        self.assertEqual(report.diffs['rules_added'], {'large_amount': expected})
+        self.assertEqual(sum(report.decisions['baseline'].values()), len(self.stream))
+        self.assertLessEqual(report.diffs['changed'], expected)
+        self.assertEqual(set(report.latencies['baseline']), {'rules', 'risk'})
+        self.assertIn('p99', report.latencies['candidate']['rules'])
+        self.assertIn('Decision changes', report.format())
+
+    def test_rate_limited_replay(self):
+        baseline = ReplayConfig("baseline", rules(10000))
+        started = time.perf_counter()
+        report = ShadowReplay(baseline, rate=2000).run(self.stream[:40])
+        self.assertGreaterEqual(time.perf_counter() - started, 39 / 2000)
+        self.assertIsNone(report.diffs)
+        self.assertLess(report.throughput, 2200)
+
+
+if __name__ == '__main__':
+    unittest.main()
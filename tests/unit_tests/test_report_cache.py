@@ -0,0 +1,119 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from decimal import Decimal
+from datetime import date, datetime
+from reporting.report_cache import ReportCache, compute_report_key
+
+
+class TableReport:
+    """Sum of amounts over an in-memory list of (id, amount) rows, with watermark hooks."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        max_id = max((row_id for row_id, _ in self.rows), default=0)
+        return sum(amount for _, amount in self.rows), {'max_id': max_id, 'row_count': len(self.rows)}
+
+    def changes_since(self, watermark):
+        covered = [row for row in self.rows if row[0] <= watermark['max_id']]
+        if len(covered) != watermark['row_count']:
+            return None
+        delta = [row for row in self.rows if row[0] > watermark['max_id']]
+        max_id = max((row_id for row_id, _ in delta), default=watermark['max_id'])
+        return delta, {'max_id': max_id, 'row_count': len(self.rows)}
+
+    @staticmethod
+    def merge(total, rows):
+        return total + sum(amount for _, amount in rows)
+
+    def run(self, cache, params):
+        return cache.get_or_compute('table', params, self.compute, self.changes_since, self.merge)
+
+
+class TestReportCache(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("ReportCache").setLevel(logging.WARNING)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def tearDown(self):
+        logging.getLogger("ReportCache").setLevel(logging.NOTSET)
+
+    def test_params_are_normalized(self):
+        key = compute_report_key('revenue', {'start': '2024-01-01', 'end': datetime(2024, 1, 31)})
+        self.assertEqual(key, compute_report_key('revenue', {'end': date(2024, 1, 31), 'start': ' 2024-01-01T00:00 ',
+                                                             'currency': None}))
+        self.assertNotEqual(key, compute_report_key('revenue', {'start': '2024-01-01', 'end': '2024-02-01'}))
+        self.assertNotEqual(key, compute_report_key('transactions', {'start': '2024-01-01', 'end': '2024-01-31'}))
+
+    def test_reuse_top_up_and_recompute(self):
+        cache = ReportCache(self.directory)
+        report = TableReport([(1, 10), (2, 20)])
+        params = {'start': '2024-01-01', 'end': '2024-01-31'}
+        self.assertEqual(report.run(cache, params), 30)
+        self.assertEqual(report.run(ReportCache(self.directory), params), 30)
+
+        report.rows.append((3, 5))
+        self.assertEqual(report.run(cache, params), 35)
+        self.assertEqual((cache.hits, cache.top_ups, cache.misses, report.computed), (0, 1, 1, 1))
+
+        # A covered row disappearing cannot be applied incrementally
+        report.rows.pop(0)
+        self.assertEqual(report.run(cache, params), 25)
+        self.assertEqual((cache.misses, report.computed), (2, 2))
+
+    def test_entries_are_json_with_typed_values(self):
+        cache = ReportCache(self.directory)
+        totals = {'rows': 2, 'totals': {'USD': Decimal('10.50')}}
+        watermark = {'max_id': 7, 'max_updated_at': datetime(2024, 1, 31, 12, 30), 'day': date(2024, 1, 31)}
+        report = {'computed': 0}
+
+        def compute():
+            report['computed'] += 1
+            return totals, watermark
+
+        def run(cache):
+            return cache.get_or_compute('totals', {'start': '2024-01-01'}, compute, lambda w: ([], w), None,
+                                        encode=lambda result: [result], decode=lambda stored: stored[0])
+
+        self.assertEqual(run(cache), totals)
+        # A new process reads back the same values and watermark, so the entry is a hit
+        self.assertEqual(run(ReportCache(self.directory)), totals)
+        self.assertEqual(report['computed'], 1)
+        [name] = os.listdir(self.directory)
+        with open(os.path.join(self.directory, name)) as f:
+            self.assertIn('"__decimal__": "10.50"', f.read())
+
+        with self.assertRaises(TypeError):
+            cache.store('bad', {'watermark': None, 'result': object()})
+        self.assertEqual(os.listdir(self.directory), [name])
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = ReportCache(self.directory)
+        for i in range(3):
+            cache.store(str(i), {'watermark': None, 'result': 'x' * 1000})
+            os.utime(os.path.join(self.directory, f"{i}.json"), ns=(i * 10**9, i * 10**9))
+        entry_bytes = os.path.getsize(os.path.join(self.directory, "0.json"))
+        self.assertIsNotNone(cache.load("0"))
+
+        cache.max_bytes = 3 * entry_bytes
+        cache.store("3", {'watermark': None, 'result': 'x' * 1000})
+        self.assertEqual(sorted(os.listdir(self.directory)), ["0.json", "2.json", "3.json"])
+
+    def test_unreadable_entry_is_a_miss(self):
+        cache = ReportCache(self.directory)
+        with open(os.path.join(self.directory, "broken.json"), 'wb') as f:
+            f.write(b'not a pickle')
+        self.assertIsNone(cache.load("broken"))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "broken.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
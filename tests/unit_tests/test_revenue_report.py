@@ -0,0 +1,126 @@
+import os
+import csv
+import shutil
+import tempfile
+import unittest
+import importlib.util
+from decimal import Decimal
+from datetime import datetime
+
+HAS_DEPENDENCIES = all(importlib.util.find_spec(name) is not None for name in ('psycopg2', 'pandas'))
+
+
+class FakeCursor:
+    """Server-side cursor stand-in: iterates over fixed rows and records how it was used."""
+
+    def __init__(self, rows, name=None):
+        self.rows = rows
+        self.name = name
+        self.itersize = None
+        self.executed = []
+        self.closed = False
+
+    def execute(self, query, params=None):
+        self.executed.append((query, params))
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+        self.cursors = []
+
+    def cursor(self, name=None):
+        cursor = FakeCursor(self.rows, name)
+        self.cursors.append(cursor)
+        return cursor
+
+
+@unittest.skipUnless(HAS_DEPENDENCIES, "psycopg2 and pandas are required for revenue reports")
+class TestRevenueAggregator(unittest.TestCase):
+
+    def setUp(self):
+        # (transaction id, amount, currency, created at, product, user email), as REVENUE_QUERY returns them
+        self.rows = [
+            (1, Decimal('10.005'), 'USD', datetime(2024, 1, 31, 23, 59), 'Pro', 'ada@example.com'),
+            (2, Decimal('0.10'), 'USD', datetime(2024, 2, 1), 'Pro', 'ada@example.com'),
+            (3, Decimal('0.20'), 'USD', datetime(2024, 2, 14), 'Basic', 'bob@example.com'),
+            (4, Decimal('1500'), 'JPY', datetime(2024, 2, 2), 'Pro', 'kei@example.com'),
+            (5, Decimal('2.3455'), 'KWD', datetime(2024, 3, 5), 'Basic', 'noor@example.com'),
+            (6, Decimal('-0.10'), 'USD', datetime(2024, 2, 20), 'Pro', 'ada@example.com'),
+        ]
+
+    def test_minor_units_follow_the_currency_exponent(self):
+        from reporting.financial_reports.revenue_report import to_minor_units, from_minor_units
+
+        # Half-way amounts round to even
+        self.assertEqual(to_minor_units(Decimal('10.005'), 'USD'), 1000)
+        self.assertEqual(to_minor_units(Decimal('10.015'), 'USD'), 1002)
+        self.assertEqual(to_minor_units(Decimal('1500'), 'JPY'), 1500)
+        self.assertEqual(to_minor_units(Decimal('2.3455'), 'KWD'), 2346)
+        self.assertEqual(to_minor_units(Decimal('3.5'), 'XYZ'), 350)
+        self.assertEqual(to_minor_units('0.1', 'USD'), 10)
+
+        self.assertEqual(from_minor_units(1000, 'USD'), Decimal('10.00'))
+        self.assertEqual(from_minor_units(1500, 'JPY'), Decimal('1500'))
+        self.assertEqual(from_minor_units(2346, 'KWD'), Decimal('2.346'))
+
+    def test_streamed_totals_per_currency_product_and_month(self):
+        from reporting.financial_reports.revenue_report import stream_revenue_report, REVENUE_QUERY
+
+        connection = FakeConnection(self.rows)
+        aggregator = stream_revenue_report(connection, '2024-01-01', '2024-03-31', itersize=2)
+
+        # One named (server-side) cursor, fetched in pages of itersize and closed afterwards
+        cursor, = connection.cursors
+        self.assertTrue(cursor.name.startswith('revenue_stream_'))
+        self.assertEqual(cursor.itersize, 2)
+        self.assertEqual(cursor.executed, [(REVENUE_QUERY, ('2024-01-01', '2024-03-31'))])
+        self.assertTrue(cursor.closed)
+
+        self.assertEqual(aggregator.rows, 6)
+        # Currencies are never summed together
+        self.assertEqual(aggregator.total_revenue(), {
+            'JPY': Decimal('1500'), 'KWD': Decimal('2.346'), 'USD': Decimal('10.20'),
+        })
+        self.assertEqual(aggregator.revenue_by_product(), {
+            ('Basic', 'KWD'): Decimal('2.346'),
+            ('Basic', 'USD'): Decimal('0.20'),
+            ('Pro', 'JPY'): Decimal('1500'),
+            ('Pro', 'USD'): Decimal('10.00'),
+        })
+        self.assertEqual(aggregator.monthly_revenue_breakdown(), {
+            ('2024-01', 'USD'): Decimal('10.00'),
+            ('2024-02', 'JPY'): Decimal('1500'),
+            ('2024-02', 'USD'): Decimal('0.20'),
+            ('2024-03', 'KWD'): Decimal('2.346'),
+        })
+
+    def test_csv_export_and_cache_round_trip(self):
+        from reporting.financial_reports.revenue_report import (
+            RevenueAggregator, stream_revenue_report, REPORT_COLUMNS,
+        )
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'revenue.csv')
+        aggregator = stream_revenue_report(FakeConnection(self.rows), '2024-01-01', '2024-03-31', csv_path=path)
+        with open(path, newline='') as f:
+            lines = list(csv.reader(f))
+        self.assertEqual(lines[0], REPORT_COLUMNS)
+        self.assertEqual([line[0] for line in lines[1:]], ['1', '2', '3', '4', '5', '6'])
+
+        restored = RevenueAggregator.from_dict(aggregator.to_dict())
+        self.assertEqual(restored.rows, aggregator.rows)
+        self.assertEqual(restored.total_revenue(), aggregator.total_revenue())
+        self.assertEqual(restored.revenue_by_product(), aggregator.revenue_by_product())
+        self.assertEqual(restored.monthly_revenue_breakdown(), aggregator.monthly_revenue_breakdown())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import uuid
+import shutil
+import logging
+import tempfile
+import unittest
+import importlib.util
+from decimal import Decimal
+from datetime import date
+
+# These tests run the rollup SQL (trigger, fold, snapshot checks) against a real PostgreSQL
+# database; point TEST_POSTGRES_DSN at a scratch database to run them
+POSTGRES_DSN = os.getenv("TEST_POSTGRES_DSN")
+HAS_DEPENDENCIES = all(importlib.util.find_spec(name) is not None
+                       for name in ('psycopg2', 'sqlalchemy', 'alembic', 'pandas'))
+MIGRATION_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'database', 'migrations',
+                              '005_create_revenue_rollup_tables.py')
+
+TABLES = """
+    CREATE TABLE users (id BIGSERIAL PRIMARY KEY, email TEXT NOT NULL);
+    CREATE TABLE products (id BIGSERIAL PRIMARY KEY, name TEXT NOT NULL);
+    CREATE TABLE transactions (
+        id BIGSERIAL PRIMARY KEY, user_id BIGINT NOT NULL, product_id BIGINT NOT NULL,
+        amount NUMERIC NOT NULL, currency VARCHAR(3) NOT NULL, status VARCHAR(20) NOT NULL,
+        created_at TIMESTAMP NOT NULL DEFAULT now(), updated_at TIMESTAMP NOT NULL DEFAULT now()
+    );
+    INSERT INTO users (email) VALUES ('ada@example.com');
+    INSERT INTO products (name) VALUES ('Pro'), ('Team');
+    """
+
+
+def run_migration(dsn, schema, path):
+    """Applies an Alembic migration module's upgrade() inside `schema`."""
+    from sqlalchemy import create_engine
+    from alembic.migration import MigrationContext
+    from alembic.operations import Operations
+
+    spec = importlib.util.spec_from_file_location(f"migration_{uuid.uuid4().hex}", path)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    engine = create_engine(dsn.replace('postgresql://', 'postgresql+psycopg2://', 1),
+                           connect_args={'options': f'-csearch_path={schema}'})
+    try:
+        with engine.begin() as connection:
+            with Operations.context(MigrationContext.configure(connection)):
+                migration.upgrade()
+    finally:
+        engine.dispose()
+
+
+@unittest.skipUnless(HAS_DEPENDENCIES and POSTGRES_DSN, "needs psycopg2, sqlalchemy, alembic and TEST_POSTGRES_DSN")
+class TestRevenueRollups(unittest.TestCase):
+
+    def setUp(self):
+        import psycopg2
+
+        logging.getLogger("RevenueRollups").setLevel(logging.CRITICAL)
+        self.schema = f"rollup_test_{uuid.uuid4().hex[:12]}"
+        admin = psycopg2.connect(POSTGRES_DSN)
+        admin.autocommit = True
+        with admin.cursor() as cursor:
+            cursor.execute(f"CREATE SCHEMA {self.schema}")
+        self.addCleanup(admin.close)
+        self.addCleanup(admin.cursor().execute, f"DROP SCHEMA {self.schema} CASCADE")
+
+        self.connection = psycopg2.connect(POSTGRES_DSN, options=f'-csearch_path={self.schema}')
+        self.addCleanup(self.connection.close)
+        self.execute(TABLES)
+        run_migration(POSTGRES_DSN, self.schema, MIGRATION_PATH)
+
+    def tearDown(self):
+        logging.getLogger("RevenueRollups").setLevel(logging.NOTSET)
+
+    def execute(self, sql, params=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall() if cursor.description else None
+        self.connection.commit()
+        return rows
+
+    def pay(self, amount, created_at, product_id=1, status='completed', currency='USD'):
+        return self.execute("""
+            INSERT INTO transactions (user_id, product_id, amount, currency, status, created_at)
+            VALUES (1, %s, %s, %s, %s, %s) RETURNING id
+        """, (product_id, Decimal(amount), currency, status, created_at))[0][0]
+
+    def rollups(self):
+        return {
+            (day, product_id, currency): (amount, count)
+            for day, product_id, currency, amount, count in self.execute(
+                "SELECT day, product_id, currency, amount, transaction_count FROM daily_revenue_rollups"
+            )
+        }
+
+    def test_fold_moves_deltas_into_rollups(self):
+        from reporting.financial_reports.revenue_rollups import fold_revenue_deltas
+
+        self.pay('10.00', '2024-03-01 09:00')
+        refunded = self.pay('5.50', '2024-03-01 23:59:59')
+        self.pay('7.25', '2024-03-02 00:00', product_id=2)
+        self.pay('99.00', '2024-03-02 12:00', status='pending')
+        self.execute("UPDATE transactions SET status = 'refunded' WHERE id = %s", (refunded,))
+
+        self.assertEqual(fold_revenue_deltas(self.connection, batch_size=2), 4)
+        self.assertEqual(self.rollups(), {
+            (date(2024, 3, 1), 1, 'USD'): (Decimal('10.00'), 1),
+            (date(2024, 3, 2), 2, 'USD'): (Decimal('7.25'), 1),
+        })
+        self.assertEqual(self.execute("SELECT count(*) FROM revenue_rollup_deltas"), [(0,)])
+        self.assertEqual(fold_revenue_deltas(self.connection), 0)
+
+    def test_check_finds_and_repairs_drift(self):
+        from reporting.financial_reports.revenue_rollups import (
+            fold_revenue_deltas, check_revenue_rollups, backfill_revenue_rollups
+        )
+
+        self.pay('10.00', '2024-03-01 09:00')
+        self.pay('20.00', '2024-03-31 18:30')
+        fold_revenue_deltas(self.connection)
+        # Unfolded deltas count as rolled up
+        self.pay('1.00', '2024-03-31 23:00')
+        self.assertEqual(check_revenue_rollups(self.connection, '2024-03-01', '2024-03-31'), [])
+
+        self.execute("UPDATE daily_revenue_rollups SET amount = amount + 1 WHERE day = '2024-03-31'")
+        mismatches = check_revenue_rollups(self.connection, '2024-03-01', '2024-03-31', repair=True)
+        self.assertEqual([(m['day'], m['raw_amount'], m['rollup_amount']) for m in mismatches],
+                         [(date(2024, 3, 31), Decimal('21.00'), Decimal('22.00'))])
+        self.assertEqual(check_revenue_rollups(self.connection, '2024-03-01', '2024-03-31'), [])
+
+        # A backfill absorbs the pending deltas of its days and leaves the others
+        self.pay('3.00', '2024-04-01 08:00')
+        self.assertEqual(backfill_revenue_rollups(self.connection, '2024-03-01', '2024-03-31'), 2)
+        self.assertEqual(self.execute("SELECT day FROM revenue_rollup_deltas"), [(date(2024, 4, 1),)])
+        self.assertEqual(self.rollups()[(date(2024, 3, 31), 1, 'USD')], (Decimal('21.00'), 2))
+
+    def test_raw_and_rollup_reports_cover_the_same_days(self):
+        from reporting.financial_reports.revenue_report import fetch_revenue_data, fetch_rollup_revenue
+
+        self.pay('10.00', '2024-02-29 23:59:59')
+        self.pay('20.00', '2024-03-01 00:00')
+        self.pay('30.00', '2024-03-31 18:30')
+        self.pay('40.00', '2024-04-01 00:00')
+
+        raw = fetch_revenue_data(self.connection, '2024-03-01', '2024-03-31')
+        rolled = fetch_rollup_revenue(self.connection, '2024-03-01', '2024-03-31')
+        self.connection.commit()
+        self.assertEqual(sorted(row[1] for row in raw), [Decimal('20.00'), Decimal('30.00')])
+        self.assertEqual(sum(rolled['Amount']), sum(row[1] for row in raw))
+
+    def test_cached_report_tops_up_and_recomputes(self):
+        from reporting.report_cache import ReportCache
+        from reporting.financial_reports.revenue_report import cached_revenue_report
+
+        logging.getLogger("ReportCache").setLevel(logging.CRITICAL)
+        self.addCleanup(logging.getLogger("ReportCache").setLevel, logging.NOTSET)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = ReportCache(directory)
+        isolation_level = self.connection.isolation_level
+
+        def totals():
+            return cached_revenue_report(self.connection, '2024-03-01', '2024-03-31', cache).total_revenue()
+
+        self.pay('10.00', '2024-03-01 09:00')
+        first = self.pay('20.00', '2024-03-31 18:30', currency='EUR')
+        self.assertEqual(totals(), {'EUR': Decimal('20.00'), 'USD': Decimal('10.00')})
+        # The snapshot level is set per transaction and the session's own level restored
+        self.assertEqual(self.connection.isolation_level, isolation_level)
+
+        self.pay('5.00', '2024-03-15 12:00')
+        self.assertEqual(totals(), {'EUR': Decimal('20.00'), 'USD': Decimal('15.00')})
+        self.assertEqual(totals(), {'EUR': Decimal('20.00'), 'USD': Decimal('15.00')})
+        self.execute("UPDATE transactions SET status = 'refunded', updated_at = now() WHERE id = %s", (first,))
+        self.assertEqual(totals(), {'USD': Decimal('15.00')})
+        self.assertEqual((cache.misses, cache.top_ups, cache.hits), (2, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
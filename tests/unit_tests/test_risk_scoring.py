@@ -0,0 +1,67 @@
+import random
+import logging
+import unittest
+from datetime import datetime, timedelta
+import pandas as pd
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, Transaction, UserBehavior
+
+LOCATIONS = ["New York", "San Francisco", "Chicago", "Miami", "Las Vegas"]
+RULE_WEIGHTS = {
+    "large_amount": 1.5,
+    "unusual_location": 1.2,
+    "transaction_time": 1.1,
+    "previous_fraud_score": 1.8,
+    "card_type": 1.3,
+}
+
+
+def make_transaction(rng, user_id, i, start=datetime(2024, 1, 1)):
+    return Transaction(
+        transaction_id=f"TX{i}",
+        user_id=user_id,
+        # Round amounts so some land exactly on twice a user's average
+        amount=rng.choice([25, 50, 100, 200, 400, 1000]),
+        timestamp=start + timedelta(hours=rng.randrange(24 * 30), minutes=rng.randrange(60)),
+        location=rng.choice(LOCATIONS),
+        card_type=rng.choice(["credit", "debit", "virtual", "prepaid"]),
+        previous_fraud_score=rng.choice([0, 50, 51, 90]),
+    )
+
+
+class TestRiskScoringBatch(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("RiskScoring").setLevel(logging.WARNING)
+        self.rng = random.Random(12)
+        histories = {
+            f"user{u}": UserBehavior(f"user{u}", [
+                make_transaction(self.rng, f"user{u}", i) for i in range(self.rng.randrange(0, 8))
+            ])
+            for u in range(15)
+        }
+        self.engine = RiskScoringEngine(histories, RULE_WEIGHTS)
+
+    def tearDown(self):
+        logging.getLogger("RiskScoring").setLevel(logging.NOTSET)
+
+    def test_batch_matches_assess_risk(self):
+        transactions = [make_transaction(self.rng, f"user{self.rng.randrange(18)}", i) for i in range(2000)]
+        columns = pd.DataFrame([vars(transaction) for transaction in transactions])
+
+        levels = self.engine.assess_batch(columns)
+        self.assertEqual(levels.tolist(), [self.engine.assess_risk(transaction) for transaction in transactions])
+        self.assertEqual(set(levels.tolist()), {"Low", "Medium", "High"})
+
+    def test_dict_of_columns_and_empty_batch(self):
+        transactions = [make_transaction(self.rng, "user1", i) for i in range(10)]
+        columns = {name: [getattr(tx, name) for tx in transactions] for name in vars(transactions[0])}
+
+        self.assertEqual(self.engine.assess_batch(columns).tolist(),
+                         [self.engine.assess_risk(transaction) for transaction in transactions])
+        empty = {name: [] for name in columns}
+        empty["timestamp"] = pd.to_datetime(empty["timestamp"])
+        self.assertEqual(len(self.engine.assess_batch(empty)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from fraud_detection.fraud_rules.rule_engine import Rule, RuleEngine, BatchVelocityContext, DEFAULT_RULES_PATH
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.rules_path = os.path.join(self.directory, 'fraud_rules.yaml')
+        shutil.copy(DEFAULT_RULES_PATH, self.rules_path)
+        self.transaction = {
+            'transaction_id': 'txn_1',
+            'amount': 12000,
+            'country': 'Iran',
+            'card_number': 'card_1',
+            'transaction_time': datetime(2024, 1, 1),
+            'status': 'approved',
+        }
+        self.engine = RuleEngine(self.rules_path, reload_interval=0)
+        self.context = BatchVelocityContext([self.transaction])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _rewrite_rules(self, content):
+        with open(self.rules_path, 'w') as f:
+            f.write(content)
+        mtime = os.path.getmtime(self.rules_path) + 1
+        os.utime(self.rules_path, (mtime, mtime))
+
+    def test_short_circuit_skips_velocity_rules(self):
+        self.assertEqual(self.engine.evaluate(self.transaction, self.context), ['large_amount', 'suspicious_country'])
+        self.assertEqual(self.engine.first_broken_rule(self.transaction, self.context), 'large_amount')
+
+        stats = self.engine.rule_stats()
+        self.assertEqual(stats['large_amount']['evaluations'], 2)
+        self.assertEqual(stats['large_amount']['hits'], 2)
+        self.assertEqual(stats['high_frequency']['evaluations'], 1)
+
+    def test_velocity_indexes_are_built_on_first_lookup(self):
+        batch = [dict(self.transaction, transaction_id=f'txn_{i}') for i in range(3)]
+        context = self.engine.build_context(batch)
+        self.assertEqual([self.engine.first_broken_rule(t, context) for t in batch], ['large_amount'] * 3)
+        self.assertEqual(context.indexes, {})
+
+        small = dict(self.transaction, amount=10, country='Canada')
+        context = self.engine.build_context(batch + [small])
+        self.assertIsNone(self.engine.first_broken_rule(small, context))
+        self.assertEqual(sorted(context.indexes), ['high_frequency', 'multiple_declines'])
+
+    def test_counters_add_up_across_threads(self):
+        with self.assertRaises(TypeError):
+            Rule({'name': 'abstract'})
+
+        plan = self.engine.plan
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: self.engine.first_broken_rule(self.transaction, self.context), range(4000)))
+        self.assertEqual(plan.short_circuit_evaluations, 4000)
+        self.assertEqual(self.engine.rule_stats()['large_amount']['hits'], 4000)
+
+    def test_disabled_rules_are_left_out(self):
+        names = [rule.name for rule in self.engine.rules]
+        self.assertIn('high_frequency', names)
+        self.assertNotIn('card_many_merchants', names)
+
+        self._rewrite_rules(
+            "rules:\n"
+            "  - {name: large_amount, type: threshold, field: amount, operator: gt, value: 10000}\n"
+            "  - {name: suspicious_country, type: membership, field: country, values: [Iran], enabled: false}\n"
+        )
+        self.assertEqual(self.engine.evaluate(self.transaction, self.context), ['large_amount'])
+
+    def test_hot_reload_and_broken_config(self):
+        self._rewrite_rules(
+            "rules:\n"
+            "  - {name: very_large_amount, type: threshold, field: amount, operator: gt, value: 50000}\n"
+        )
+        self.assertEqual(self.engine.evaluate(self.transaction, self.context), [])
+        self.assertEqual([rule.name for rule in self.engine.rules], ['very_large_amount'])
+
+        self._rewrite_rules("rules:\n  - {name: broken, type: unknown}\n")
+        self.assertFalse(self.engine.maybe_reload())
+        self.assertEqual([rule.name for rule in self.engine.rules], ['very_large_amount'])
+
+    def test_reload_takes_effect_between_batches(self):
+        batch = [dict(self.transaction, transaction_id=f'txn_{i}', amount=100, country='Canada') for i in range(3)]
+        context = self.engine.build_context(batch)
+        self.assertEqual(self.engine.evaluate(batch[0], context), [])
+
+        # A velocity rule added mid-batch is not in this context's plan; the batch keeps its plan
+        self._rewrite_rules(
+            "rules:\n"
+            "  - {name: any_repeat, type: velocity, key: card_number, window_seconds: 3600, limit: 1}\n"
+        )
+        self.assertEqual([self.engine.evaluate(t, context) for t in batch[1:]], [[], []])
+        self.assertIsNone(self.engine.first_broken_rule(batch[2], context))
+
+        context = self.engine.build_context(batch)
+        self.assertEqual(self.engine.evaluate(batch[2], context), ['any_repeat'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import random
+import logging
+import unittest
+from datetime import datetime, timedelta
+from fraud_detection.fraud_rules.sketches import (
+    CountMinSketch,
+    HyperLogLog,
+    KeyedDistinctCounters,
+    WindowedCountMin,
+    WindowedHyperLogLog,
+    epoch_seconds,
+)
+from fraud_detection.fraud_rules.rule_engine import RuleEngine, BatchVelocityContext, DEFAULT_RULES_PATH, load_rule_definitions
+from fraud_detection.fraud_rules.streaming_detection import StreamingFraudDetection
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, Transaction
+from fraud_detection.risk_assessment.user_features import UserActivitySketches
+
+
+class TestSketches(unittest.TestCase):
+
+    def test_hyperloglog_estimate_and_merge(self):
+        single, first, second = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+        for i in range(5000):
+            single.add(f"merchant_{i}")
+            (first if i % 2 else second).add(f"merchant_{i}")
+
+        self.assertAlmostEqual(single.count(), 5000, delta=5000 * 0.1)
+        merged = first.merge(second)
+        self.assertEqual(merged.registers.tolist(), single.registers.tolist())
+        self.assertEqual(HyperLogLog.from_dict(json.loads(json.dumps(merged.to_dict()))).count(), merged.count())
+
+    def test_count_min_never_undercounts(self):
+        rng = random.Random(2)
+        sketch, other = CountMinSketch(width=64), CountMinSketch(width=64)
+        exact = {}
+        for _ in range(5000):
+            item = f"ip_{rng.randrange(300)}"
+            exact[item] = exact.get(item, 0) + 1
+            sketch.add(item)
+            other.add(item)
+        for item, count in exact.items():
+            self.assertGreaterEqual(sketch.estimate(item), count)
+        sketch.merge(other)
+        self.assertGreaterEqual(sketch.estimate("ip_1"), 2 * exact["ip_1"])
+
+    def test_windowed_sketch_forgets_old_buckets(self):
+        sketch = WindowedHyperLogLog(window_seconds=3600, bucket_seconds=600)
+        for i in range(50):
+            sketch.add(f"old_{i}", 1000)
+        for i in range(5):
+            sketch.add(f"new_{i}", 10000)
+        self.assertAlmostEqual(sketch.count(10000), 5, delta=1)
+
+    def test_keyed_counters_merge_across_workers(self):
+        combined = KeyedDistinctCounters(timedelta(hours=1), bucket_seconds=600)
+        workers = [KeyedDistinctCounters(timedelta(hours=1), bucket_seconds=600) for _ in range(2)]
+        for i in range(400):
+            combined.add(f"ip_{i % 4}", f"card_{i}", 1000 + i)
+            workers[i % 2].add(f"ip_{i % 4}", f"card_{i}", 1000 + i)
+
+        restored = KeyedDistinctCounters(timedelta(hours=1), bucket_seconds=600).load_dict(
+            json.loads(json.dumps(workers[1].to_dict()))
+        )
+        merged = workers[0].merge(restored)
+        for key in ("ip_0", "ip_1", "ip_2", "ip_3"):
+            self.assertEqual(merged.count(key, 1400), combined.count(key, 1400))
+
+    def test_merge_does_not_share_state(self):
+        merged = KeyedDistinctCounters(timedelta(hours=1), bucket_seconds=600)
+        other = KeyedDistinctCounters(timedelta(hours=1), bucket_seconds=600)
+        merged.add("ip_0", "card_0", 1000)
+        other.add("ip_0", "card_1", 1700)
+        other.add("ip_1", "card_2", 1000)
+        merged.merge(other)
+        before = {key: merged.count(key, 1800) for key in ("ip_0", "ip_1")}
+
+        # New buckets and new keys taken from `other` evolve independently afterwards
+        for i in range(50):
+            other.add("ip_0", f"late_{i}", 1750)
+            other.add("ip_1", f"late_{i}", 1750)
+            merged.add("ip_1", f"merged_{i}", 1750)
+        self.assertEqual(merged.count("ip_0", 1800), before["ip_0"])
+        self.assertAlmostEqual(other.count("ip_1", 1800), 51, delta=5)
+        self.assertAlmostEqual(merged.count("ip_1", 1800), 51, delta=5)
+        self.assertAlmostEqual(before["ip_1"], 1, delta=0.1)
+
+        counts = WindowedCountMin(window_seconds=3600, bucket_seconds=600)
+        source = WindowedCountMin(window_seconds=3600, bucket_seconds=600)
+        source.add("ip_0", 1000)
+        counts.merge(source)
+        source.add("ip_0", 1000, count=5)
+        self.assertEqual(counts.estimate("ip_0", 1000), 1)
+
+
+class TestSketchFeatures(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("RiskScoring").setLevel(logging.WARNING)
+
+    def tearDown(self):
+        logging.getLogger("RiskScoring").setLevel(logging.NOTSET)
+
+    def test_distinct_rule_in_rule_engine(self):
+        engine = RuleEngine(definitions=[{
+            'name': 'card_many_merchants', 'type': 'distinct', 'key': 'card_number',
+            'field': 'merchant_id', 'window_seconds': 86400, 'limit': 10,
+        }])
+        start = datetime(2024, 1, 1)
+        transactions = [
+            {'card_number': 'card_a', 'merchant_id': f'm{i}', 'transaction_time': start + timedelta(minutes=i)}
+            for i in range(20)
+        ] + [
+            {'card_number': 'card_b', 'merchant_id': 'm1', 'transaction_time': start + timedelta(minutes=i)}
+            for i in range(20)
+        ]
+        context = BatchVelocityContext(transactions)
+        broken = [bool(engine.evaluate(t, context)) for t in transactions]
+        self.assertFalse(any(broken[:5]))
+        self.assertTrue(all(broken[15:20]))
+        self.assertFalse(any(broken[20:]))
+
+    def test_streaming_distinct_card_rule(self):
+        definitions = [dict(rule, enabled=True) if rule['name'] == 'ip_many_cards' else rule
+                       for rule in load_rule_definitions(DEFAULT_RULES_PATH)]
+        detector = StreamingFraudDetection(rule_engine=RuleEngine(definitions=definitions))
+        start = datetime(2024, 1, 1)
+        results = [
+            detector.evaluate({
+                'transaction_id': f'txn_{i}', 'amount': 10, 'country': 'Canada', 'card_number': f'card_{i}',
+                'transaction_time': start + timedelta(seconds=i), 'status': 'approved', 'ip_address': '10.0.0.1',
+            })
+            for i in range(10)
+        ]
+        self.assertNotIn('ip_many_cards', results[2])
+        self.assertIn('ip_many_cards', results[-1])
+
+    def test_activity_rules_match_between_row_and_batch_scoring(self):
+        import pandas as pd
+
+        sketches = UserActivitySketches()
+        engine = RiskScoringEngine({}, {"transaction_velocity": 2.0}, activity_sketches=sketches)
+        start = datetime(2024, 1, 1, 12)
+        locations = ["Paris", "Berlin", "Rome", "Madrid", "Oslo"]
+        history = [
+            Transaction(f"TX{i}", "user1", 20, start + timedelta(minutes=i), locations[i % 5], "credit", 0)
+            for i in range(15)
+        ]
+        for transaction in history:
+            engine.record_transaction(transaction)
+
+        probe = [Transaction("TX100", "user1", 20, start + timedelta(minutes=20), "Paris", "credit", 0)]
+        batch = pd.DataFrame([vars(transaction) for transaction in probe])
+        self.assertEqual(engine.assess_batch(batch).tolist(), [engine.assess_risk(probe[0])])
+        self.assertEqual(engine.assess_risk(probe[0]), "Medium")
+
+    @unittest.skipUnless(hasattr(time, 'tzset'), "changing the local time zone requires time.tzset")
+    def test_activity_sketches_ignore_the_host_time_zone(self):
+        original_tz = os.environ.get('TZ')
+
+        def restore_tz():
+            if original_tz is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = original_tz
+            time.tzset()
+
+        self.addCleanup(restore_tz)
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+
+        # Naive transaction times are UTC, as in every other engine
+        sketches = UserActivitySketches()
+        start = datetime(2024, 1, 1, 12)
+        for i in range(3):
+            sketches.update(Transaction(f"TX{i}", "user1", 20, start + timedelta(minutes=i), "Paris", "credit", 0))
+        now = epoch_seconds(start + timedelta(minutes=5))
+        self.assertEqual(sketches.transaction_count("user1", now), 3)
+        self.assertEqual(round(sketches.distinct_location_count("user1", now)), 1)
+        # Two hours later (UTC) they have left the one hour velocity window
+        self.assertEqual(sketches.transaction_count("user1", epoch_seconds(start + timedelta(hours=2))), 0)
+        self.test_activity_rules_match_between_row_and_batch_scoring()
+
+
+if __name__ == '__main__':
+    unittest.main()
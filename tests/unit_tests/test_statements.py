@@ -0,0 +1,87 @@
+import json
+import unittest
+import importlib.util
+from datetime import datetime, timedelta
+
+HAS_SQLALCHEMY = importlib.util.find_spec('sqlalchemy') is not None
+
+
+@unittest.skipUnless(HAS_SQLALCHEMY, "sqlalchemy is required for statement pages")
+class TestKeysetPages(unittest.TestCase):
+
+    def setUp(self):
+        from sqlalchemy import create_engine, Column, Integer, DateTime
+        from sqlalchemy.orm import declarative_base, sessionmaker
+
+        engine = create_engine('sqlite://')
+        self.addCleanup(engine.dispose)
+        Base = declarative_base()
+
+        class Entry(Base):
+            __tablename__ = 'entries'
+            id = Column(Integer, primary_key=True)
+            created_at = Column(DateTime, nullable=True)
+
+        Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+        # Rows 3 and 4 share a timestamp; row 7 has none
+        start = datetime(2024, 3, 1, 9, 30)
+        created = {1: start, 2: start + timedelta(seconds=1), 3: start + timedelta(minutes=1),
+                   4: start + timedelta(minutes=1), 5: start + timedelta(hours=1, microseconds=250),
+                   6: start + timedelta(days=1), 7: None}
+        self.session.add_all([Entry(id=i, created_at=at) for i, at in created.items()])
+        self.session.commit()
+        self.Entry = Entry
+
+    def pages(self, page_size, descending=False):
+        from reporting.user_activity.statements import keyset_page
+
+        ids, cursors, cursor = [], [], None
+        while True:
+            rows, cursor = keyset_page(self.session.query(self.Entry.id, self.Entry.created_at),
+                                       self.Entry, cursor, page_size, descending)
+            ids.append([row.id for row in rows])
+            if cursor is None:
+                return ids, cursors
+            cursors.append(cursor)
+
+    def test_cursors_round_trip_across_pages(self):
+        from reporting.user_activity.statements import encode_cursor, decode_cursor
+
+        moment = datetime(2024, 3, 1, 10, 30, 0, 250)
+        self.assertEqual(decode_cursor(encode_cursor(moment, 42)), (moment, 42))
+
+        # Every page starts right after the previous one, ties broken by id; the extra row
+        # fetched per page means a full last page carries no cursor
+        self.assertEqual(self.pages(2)[0], [[1, 2], [3, 4], [5, 6]])
+        self.assertEqual(self.pages(4)[0], [[1, 2, 3, 4], [5, 6]])
+        self.assertEqual(self.pages(3, descending=True)[0], [[6, 5, 4], [3, 2, 1]])
+        _, cursors = self.pages(2)
+        self.assertEqual([decode_cursor(cursor)[1] for cursor in cursors], [2, 4])
+
+    def test_rows_without_a_timestamp_are_left_out(self):
+        from reporting.user_activity.statements import keyset_query, stream_json_statement
+
+        rows = keyset_query(self.session.query(self.Entry.id, self.Entry.created_at), self.Entry,
+                            limit=10, descending=True).all()
+        self.assertNotIn(7, [row.id for row in rows])
+
+        body = ''.join(stream_json_statement(rows, lambda row: {'id': row.id}, 'entries', 5))
+        page = json.loads(body)
+        self.assertEqual([entry['id'] for entry in page['entries']], [6, 5, 4, 3, 2])
+        self.assertIsNotNone(page['next_cursor'])
+
+    def test_foreign_cursors_are_rejected(self):
+        from reporting.user_activity.statements import decode_cursor, keyset_query
+
+        for cursor in ('not a cursor', 'WzEsIDJd', ''):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+        with self.assertRaises(ValueError):
+            keyset_query(self.session.query(self.Entry.id), self.Entry, 'WzEsIDJd')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+from fraud_detection.fraud_rules import streaming_detection
+from fraud_detection.fraud_rules.rule_engine import RuleEngine, DEFAULT_RULES_PATH
+from fraud_detection.fraud_rules.streaming_detection import StreamingFraudDetection, SlidingWindowCounter
+
+
+def make_transaction(i, when, card='card_1', status='approved', ip_address=None):
+    return {
+        'transaction_id': f'txn_{i}',
+        'amount': 100,
+        'country': 'Canada',
+        'card_number': card,
+        'transaction_time': when,
+        'status': status,
+        'ip_address': ip_address,
+    }
+
+
+class TestStreamingFraudDetection(unittest.TestCase):
+
+    def test_counter_expires_old_buckets(self):
+        counter = SlidingWindowCounter(window_seconds=3600, bucket_seconds=60)
+        counter.add(0)
+        counter.add(30)
+        counter.add(1800)
+        self.assertEqual(counter.count(1800), 3)
+        self.assertEqual(counter.count(3600 + 120), 1)
+        self.assertEqual(len(counter.buckets), 1)
+
+    def test_high_frequency_and_declines(self):
+        detector = StreamingFraudDetection()
+        start = datetime(2024, 1, 1, 12, 0)
+        results = [detector.evaluate(make_transaction(i, start + timedelta(minutes=i))) for i in range(7)]
+        self.assertNotIn('high_frequency', results[4])
+        self.assertIn('high_frequency', results[5])
+
+        later = start + timedelta(hours=3)
+        declines = [
+            detector.evaluate(make_transaction(10 + i, later + timedelta(minutes=i), status='declined'))
+            for i in range(4)
+        ]
+        self.assertNotIn('multiple_declines', declines[2])
+        self.assertIn('multiple_declines', declines[3])
+        self.assertNotIn('high_frequency', declines[0])
+
+    def test_idle_keys_are_evicted(self):
+        detector = StreamingFraudDetection()
+        start = datetime(2024, 1, 1)
+        detector.evaluate(make_transaction(1, start, card='card_a'))
+        detector.evaluate(make_transaction(2, start + timedelta(hours=2), card='card_b'))
+        self.assertEqual(len(detector.windows['high_frequency'].counters), 1)
+
+    def test_snapshot_round_trip(self):
+        start = datetime(2024, 1, 1, 12, 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fraud_state.json')
+            detector = StreamingFraudDetection()
+            for i in range(5):
+                detector.evaluate(make_transaction(i, start + timedelta(minutes=i)))
+            detector.save_snapshot(path)
+
+            restored = StreamingFraudDetection(snapshot_path=path)
+            self.assertIn('high_frequency', restored.evaluate(make_transaction(5, start + timedelta(minutes=5))))
+            restored.close()
+            with open(path) as f:
+                self.assertNotIn('card_1', f.read())
+
+    def test_snapshots_are_taken_off_the_request_path(self):
+        logging.getLogger("StreamingFraudDetection").setLevel(logging.WARNING)
+        self.addCleanup(logging.getLogger("StreamingFraudDetection").setLevel, logging.NOTSET)
+        start = datetime(2024, 1, 1, 12, 0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'fraud_state.json')
+            detector = StreamingFraudDetection(snapshot_path=path, snapshot_interval=3600)
+            with mock.patch.object(detector, 'save_snapshot', wraps=detector.save_snapshot) as save:
+                for i in range(2500):
+                    detector.evaluate(make_transaction(i, start + timedelta(seconds=i), card=f'card_{i}'))
+                save.assert_not_called()
+
+                # Keys are copied in chunks, yet every key makes it into the snapshot
+                with mock.patch.object(streaming_detection, 'SNAPSHOT_CHUNK_KEYS', 100):
+                    detector.close()
+                save.assert_called_once_with(path)
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)['windows']['high_frequency']['state']), 2500)
+
+    def test_rules_come_from_the_engine_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            rules_path = os.path.join(directory, 'fraud_rules.yaml')
+            shutil.copy(DEFAULT_RULES_PATH, rules_path)
+            detector = StreamingFraudDetection(rule_engine=RuleEngine(rules_path, reload_interval=0))
+            start = datetime(2024, 1, 1, 12, 0)
+            results = [detector.evaluate(make_transaction(i, start + timedelta(minutes=i))) for i in range(3)]
+            self.assertEqual(results, [[], [], []])
+
+            with open(rules_path) as f:
+                content = f.read()
+            with open(rules_path, 'w') as f:
+                f.write(content.replace("window_seconds: 3600\n    limit: 5\n", "window_seconds: 3600\n    limit: 1\n", 1))
+            mtime = os.path.getmtime(rules_path) + 1
+            os.utime(rules_path, (mtime, mtime))
+
+            # The edited limit applies online at once, over the window kept across the reload
+            self.assertEqual(detector.evaluate(make_transaction(3, start + timedelta(minutes=3))),
+                             ['high_frequency'])
+
+
+if __name__ == '__main__':
+    unittest.main()
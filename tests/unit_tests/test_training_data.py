@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None and importlib.util.find_spec('pandas') is not None
+
+
+@unittest.skipUnless(HAS_PYARROW, "pandas and pyarrow are required for the training data cache")
+class TestTrainingDataCache(unittest.TestCase):
+
+    def setUp(self):
+        import numpy as np
+        import pandas as pd
+
+        self.directory = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.directory, 'transactions.csv')
+        self.cache_dir = os.path.join(self.directory, 'cache')
+        rng = np.random.default_rng(1)
+        self.frame = pd.DataFrame({
+            'transaction_amount': np.round(rng.gamma(2.0, 800.0, 5000), 2),
+            'merchant_id': rng.integers(0, 300, 5000),
+            'country': rng.integers(0, 5, 5000),
+            'is_fraud': (rng.random(5000) < 0.1).astype(int),
+        })
+        self.frame.to_csv(self.csv_path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cache_is_downcast_and_reused(self):
+        import pandas as pd
+        from fraud_detection.fraud_rules import training_data
+
+        X, y = training_data.load_training_data(self.csv_path, self.cache_dir, chunksize=1000)
+        self.assertEqual(str(X['transaction_amount'].dtype), 'float32')
+        self.assertEqual(str(X['merchant_id'].dtype), 'uint16')
+        self.assertEqual(str(y.dtype), 'uint8')
+        pd.testing.assert_series_equal(X['merchant_id'].astype('int64'), self.frame['merchant_id'])
+
+        with mock.patch.object(training_data.pd, 'read_csv', side_effect=AssertionError("CSV parsed")):
+            X_cached, _ = training_data.load_training_data(self.csv_path, self.cache_dir, chunksize=1000)
+        self.assertEqual(len(X_cached), len(self.frame))
+
+    def test_stratified_sample_keeps_label_ratio(self):
+        from fraud_detection.fraud_rules.training_data import load_training_data
+
+        _, y = load_training_data(self.csv_path, self.cache_dir, sample_fraction=0.2, chunksize=1000)
+        self.assertEqual(int(y.sum()), sum(round(0.2 * count) for count in self._fraud_counts_per_chunk(1000)))
+        self.assertAlmostEqual(len(y), 1000, delta=5)
+
+    def _fraud_counts_per_chunk(self, chunksize):
+        labels = self.frame['is_fraud']
+        return [int(labels[start:start + chunksize].sum()) for start in range(0, len(labels), chunksize)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import importlib.util
+from unittest import mock
+from datetime import date, datetime, timedelta
+
+HAS_SQLALCHEMY = importlib.util.find_spec('sqlalchemy') is not None
+
+
+@unittest.skipUnless(HAS_SQLALCHEMY, "sqlalchemy is required for transaction reports")
+class TestTransactionTotals(unittest.TestCase):
+
+    def setUp(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        # The module creates its tables on import; keep that off the reporting database
+        with mock.patch.dict(os.environ, {'REPORTING_DATABASE_URL': 'sqlite://'}):
+            from reporting.user_activity import transaction_history
+        self.history = transaction_history
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # A file database so the per-month worker sessions can share it across threads
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'reports.db')}",
+                               connect_args={'check_same_thread': False})
+        self.addCleanup(engine.dispose)
+        transaction_history.Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.session = self.Session()
+        self.addCleanup(self.session.close)
+
+        self.session.add(transaction_history.User(id=1, username='ada', email='ada@example.com'))
+        rng = random.Random(7)
+        start = datetime(2023, 12, 1)
+        self.transactions = [
+            transaction_history.Transaction(
+                id=i, user_id=1, transaction_type='payment', amount=rng.randint(1, 10000),
+                currency=rng.choice(['USD', 'EUR', 'GBP']), status='successful',
+                created_at=start + timedelta(hours=rng.randint(0, 24 * 240))
+            ) for i in range(1, 301)
+        ]
+        # Rows on the month boundaries are counted once
+        self.transactions += [
+            transaction_history.Transaction(id=301, user_id=1, transaction_type='payment', amount=5,
+                                            currency='USD', status='successful', created_at=datetime(2024, 3, 1)),
+            transaction_history.Transaction(id=302, user_id=1, transaction_type='refund', amount=7,
+                                            currency='EUR', status='failed', created_at=datetime(2024, 5, 1)),
+        ]
+        self.session.add_all(self.transactions)
+        self.session.commit()
+
+    def expected(self, start_date, end_date, max_id=None):
+        totals = {}
+        for transaction in self.transactions:
+            if start_date <= transaction.created_at <= end_date and (max_id is None or transaction.id <= max_id):
+                amount, count = totals.get(transaction.currency, (0, 0))
+                totals[transaction.currency] = (amount + transaction.amount, count + 1)
+        return [(currency, amount, count) for currency, (amount, count) in sorted(totals.items())]
+
+    def test_month_partitions_accept_dates(self):
+        partitions = self.history.month_partitions(date(2024, 1, 15), date(2024, 3, 10))
+        self.assertEqual(partitions, [
+            (datetime(2024, 1, 15), datetime(2024, 2, 1), False),
+            (datetime(2024, 2, 1), datetime(2024, 3, 1), False),
+            (datetime(2024, 3, 1), datetime(2024, 3, 10), True),
+        ])
+        self.assertEqual(self.history.month_partitions(datetime(2023, 12, 5), datetime(2024, 1, 1)), [
+            (datetime(2023, 12, 5), datetime(2024, 1, 1), False),
+            (datetime(2024, 1, 1), datetime(2024, 1, 1), True),
+        ])
+
+    def test_parallel_totals_match_row_by_row_totals(self):
+        start, end = datetime(2023, 12, 10), datetime(2024, 7, 20, 12)
+        self.assertGreaterEqual(len(self.history.month_partitions(start, end)), self.history.PARALLEL_MIN_MONTHS)
+
+        parallel = self.history.transaction_totals(start, end, self.session, workers=3)
+        serial = self.history.transaction_totals(start, end, self.session, workers=1)
+        self.assertEqual([tuple(row) for row in parallel], self.expected(start, end))
+        self.assertEqual(sorted(tuple(row) for row in serial), self.expected(start, end))
+
+        # Dates work on both paths and mean midnight
+        by_date = self.history.transaction_totals(date(2023, 12, 10), date(2024, 7, 20), self.session, workers=3)
+        self.assertEqual([tuple(row) for row in by_date], self.expected(start, datetime(2024, 7, 20)))
+
+    def test_parallel_totals_leave_out_rows_added_after_the_start(self):
+        start, end = datetime(2023, 12, 1), datetime(2024, 8, 1)
+        session_factory = self.history.sessionmaker(bind=self.session.get_bind())
+        totals = self.history.parallel_currency_totals(start, end, session_factory, workers=2, max_id=150)
+        self.assertEqual(totals, self.expected(start, end, max_id=150))
+
+        # A fanned-out report counts only the ids present when it started
+        original = self.history.parallel_currency_totals
+        late = self.history.Transaction(id=303, user_id=1, transaction_type='payment', amount=1000,
+                                        currency='USD', status='successful', created_at=datetime(2024, 1, 2))
+
+        def insert_then_aggregate(*args, **kwargs):
+            writer = self.Session()
+            writer.add(late)
+            writer.commit()
+            writer.close()
+            return original(*args, **kwargs)
+
+        with mock.patch.object(self.history, 'parallel_currency_totals', side_effect=insert_then_aggregate):
+            totals = self.history.transaction_totals(start, end, self.session, workers=2)
+        self.assertEqual(totals, self.expected(start, end))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import logging
+import unittest
+import importlib.util
+from types import SimpleNamespace
+from datetime import datetime, timezone
+
+HAS_SQLALCHEMY = importlib.util.find_spec('sqlalchemy') is not None
+
+
+@unittest.skipUnless(HAS_SQLALCHEMY, "sqlalchemy is required for usage ingestion")
+class TestUsageIngestion(unittest.TestCase):
+
+    def setUp(self):
+        from sqlalchemy import create_engine, text
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+
+        logging.getLogger("UsageIngestion").setLevel(logging.WARNING)
+        # One in-memory database shared with the aggregator's flush thread
+        engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+        self.session.execute(text("CREATE TABLE meters (name VARCHAR(100) PRIMARY KEY, unit_price NUMERIC)"))
+        self.session.execute(text("""
+            CREATE TABLE usage_aggregates (
+                subscription_id BIGINT, meter VARCHAR(100), period_start DATETIME,
+                quantity BIGINT, updated_at DATETIME,
+                PRIMARY KEY (subscription_id, meter, period_start))
+        """))
+        self.session.execute(text("INSERT INTO meters VALUES ('api_calls', 0.01), ('storage_gb', 0.5)"))
+        self.session.commit()
+        self.period_start = datetime(2024, 3, 1)
+        self.period_end = datetime(2024, 3, 31)
+
+    def tearDown(self):
+        logging.getLogger("UsageIngestion").setLevel(logging.NOTSET)
+
+    @staticmethod
+    def epoch(*args):
+        return datetime(*args, tzinfo=timezone.utc).timestamp()
+
+    def totals(self, subscription_id):
+        from billing.usage.usage_ingestion import get_usage_totals
+
+        rows = get_usage_totals(self.session, subscription_id, self.period_start, self.period_end)
+        return {row['meter']: row['quantity'] for row in rows}
+
+    def test_ingested_usage_reaches_usage_totals(self):
+        from billing.usage.usage_ingestion import UsageBuffer, UsageAggregator
+
+        buffer = UsageBuffer()
+        aggregator = UsageAggregator(buffer, flush_interval=3600, db_session=self.session)
+        aggregator.start()
+        buffer.append_many([
+            (1, 'api_calls', 5, self.epoch(2024, 3, 2, 10, 15)),
+            (1, 'api_calls', 7, self.epoch(2024, 3, 2, 10, 45)),
+            (1, 'storage_gb', 2, self.epoch(2024, 3, 20, 8)),
+            (2, 'api_calls', 100, self.epoch(2024, 3, 2, 10, 15)),
+            (1, 'api_calls', 1000, self.epoch(2024, 2, 28)),
+        ])
+        # Stopping flushes whatever the loop has not written yet
+        aggregator.stop()
+        self.assertEqual(len(buffer), 0)
+        self.assertEqual(self.totals(1), {'api_calls': 12, 'storage_gb': 2})
+
+        # Later flushes add to the buckets already stored
+        buffer.append(1, 'api_calls', 3, self.epoch(2024, 3, 2, 10, 59))
+        self.assertEqual(aggregator.flush(), 1)
+        self.assertEqual(self.totals(1), {'api_calls': 15, 'storage_gb': 2})
+        self.assertEqual(self.totals(2), {'api_calls': 100})
+
+    def test_aggregator_does_not_share_the_callers_scoped_session(self):
+        from unittest import mock
+        from sqlalchemy.orm import scoped_session, sessionmaker
+        from billing.usage import usage_ingestion
+
+        scoped = scoped_session(sessionmaker(bind=self.session.get_bind()))
+        self.addCleanup(scoped.remove)
+        with mock.patch.object(usage_ingestion, 'DBSession', scoped):
+            aggregator = usage_ingestion.UsageAggregator(usage_ingestion.UsageBuffer())
+        self.addCleanup(aggregator.db_session.close)
+        self.assertIsNot(aggregator.db_session, scoped())
+
+    def test_full_buffer_refuses_usage(self):
+        from billing.usage.usage_ingestion import UsageBuffer, UsageBufferFull
+
+        buffer = UsageBuffer(max_records=3)
+        buffer.append_many([(1, 'api_calls', 1, None)] * 2)
+        with self.assertRaises(UsageBufferFull):
+            buffer.append_many([(1, 'api_calls', 1, None)] * 2)
+        buffer.append(1, 'api_calls', 1)
+        self.assertEqual(len(buffer), 3)
+
+        # Fractions would be truncated by the integer quantity column
+        with self.assertRaises(ValueError):
+            UsageBuffer().append(1, 'api_calls', 0.5)
+
+    def test_unknown_meters_and_billed_periods_are_rejected(self):
+        from billing.usage.usage_ingestion import validate_usage, MeterCatalog, InvalidUsage
+
+        known = MeterCatalog(self.session).names()
+        self.assertEqual(known, {'api_calls', 'storage_gb'})
+        open_since = self.epoch(2024, 3, 1)
+        self.assertEqual(
+            validate_usage(1, [{'meter': 'api_calls', 'quantity': 3, 'timestamp': open_since}], known, open_since),
+            [(1, 'api_calls', 3, open_since)],
+        )
+        # Quantities are stored as integers: whole floats are accepted, fractions are not
+        self.assertEqual(validate_usage(1, [{'meter': 'api_calls', 'quantity': 2.0}], known), [(1, 'api_calls', 2, None)])
+        for record in ({'meter': 'api_call', 'quantity': 3},
+                       {'meter': 'api_calls', 'quantity': -1},
+                       {'meter': 'api_calls', 'quantity': 0.5},
+                       {'meter': 'api_calls', 'quantity': 3, 'timestamp': open_since - 1},
+                       {'meter': 'api_calls', 'quantity': 3, 'timestamp': '2024-03-02'}):
+            with self.assertRaises(InvalidUsage):
+                validate_usage(1, [{'meter': 'storage_gb', 'quantity': 1}, record], known, open_since)
+
+    def test_subscription_access_is_cached_until_invalidated(self):
+        from billing.usage.usage_ingestion import SubscriptionAccessCache, SubscriptionClosed
+
+        subscription = SimpleNamespace(status='active', next_billing_date=datetime(2024, 3, 31))
+        loads = []
+
+        def load():
+            loads.append(1)
+            return subscription
+
+        cache = SubscriptionAccessCache(ttl=3600)
+        self.assertEqual(cache.open_period_start(7, 1, load), self.epoch(2024, 3, 1))
+        self.assertEqual(cache.open_period_start(7, 1, load), self.epoch(2024, 3, 1))
+        self.assertEqual(len(loads), 1)
+
+        # A cancellation invalidates the entry and the next report is refused
+        subscription.status = 'canceled'
+        cache.invalidate(1)
+        with self.assertRaises(SubscriptionClosed):
+            cache.open_period_start(7, 1, load)
+        self.assertEqual(len(loads), 2)
+
+        # Changes made elsewhere are picked up once the entry expires
+        expired = SubscriptionAccessCache(ttl=0)
+        subscription.status = 'active'
+        expired.open_period_start(7, 1, load)
+        subscription.status = 'canceled'
+        with self.assertRaises(SubscriptionClosed):
+            expired.open_period_start(7, 1, load)
+
+        # Another user is never served this user's entry
+        subscription.status = 'active'
+        cache.invalidate(1)
+        cache.open_period_start(7, 1, load)
+        cache.open_period_start(8, 1, load)
+        self.assertEqual(len(loads), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from fraud_detection.risk_assessment.risk_scoring import RiskScoringEngine, Transaction, UserBehavior
+from fraud_detection.risk_assessment.user_features import UserFeatureStore
+
+LOCATIONS = ["New York", "San Francisco", "Los Angeles", "Chicago", "Miami", "Las Vegas"]
+RULE_WEIGHTS = {"large_amount": 1.5, "unusual_location": 1.2, "transaction_time": 1.1}
+
+
+def make_transaction(rng, user_id, i, start=datetime(2024, 1, 1)):
+    return Transaction(
+        transaction_id=f"TX{user_id}-{i}",
+        user_id=user_id,
+        amount=rng.choice([20, 75.5, 150, 400, 2500]),
+        timestamp=start + timedelta(hours=rng.randrange(24 * 90)),
+        location=rng.choice(LOCATIONS),
+        card_type=rng.choice(["credit", "prepaid"]),
+        previous_fraud_score=rng.choice([0, 60]),
+    )
+
+
+class TestUserFeatureStore(unittest.TestCase):
+
+    def test_scores_match_full_history_scan(self):
+        rng = random.Random(4)
+        histories = {
+            f"user{u}": UserBehavior(f"user{u}", [make_transaction(rng, f"user{u}", i) for i in range(rng.randrange(0, 40))])
+            for u in range(20)
+        }
+        engine = RiskScoringEngine(histories, RULE_WEIGHTS)
+
+        for i in range(200):
+            transaction = make_transaction(rng, f"user{rng.randrange(22)}", 1000 + i)
+            behavior = histories.get(transaction.user_id)
+            features = engine.feature_store.get(transaction.user_id)
+            self.assertEqual(features is None, behavior is None)
+            if behavior is not None:
+                self.assertAlmostEqual(features.average_amount(), behavior.average_transaction_amount())
+                self.assertEqual(set(features.locations), behavior.frequent_locations())
+            engine.assess_risk(transaction)
+
+    def test_record_transaction_updates_running_aggregates(self):
+        rng = random.Random(5)
+        engine = RiskScoringEngine({}, RULE_WEIGHTS)
+        transactions = [make_transaction(rng, "user1", i) for i in range(30)]
+        for transaction in transactions:
+            engine.record_transaction(transaction)
+
+        features = engine.feature_store.get("user1")
+        self.assertEqual(features.count, 30)
+        self.assertAlmostEqual(features.amount_sum, sum(tx.amount for tx in transactions))
+        self.assertEqual(features.last_seen, max(tx.timestamp for tx in transactions).timestamp())
+
+    def test_location_table_is_bounded(self):
+        store = UserFeatureStore(top_k=3)
+        rng = random.Random(6)
+        for i in range(100):
+            transaction = make_transaction(rng, "user1", i)
+            transaction.location = "Home" if i % 2 else f"City{i}"
+            store.update(transaction)
+        features = store.get("user1")
+        self.assertEqual(len(features.locations), 3)
+        self.assertEqual(features.top_locations(1), ["Home"])
+
+    def test_save_and_load_round_trip(self):
+        rng = random.Random(7)
+        store = UserFeatureStore()
+        for i in range(50):
+            store.update(make_transaction(rng, f"user{i % 4}", i))
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'features.npz')
+            store.save(path)
+            loaded = UserFeatureStore.load(path)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(set(loaded.users), set(store.users))
+        for user_id, features in store.users.items():
+            restored = loaded.get(user_id)
+            self.assertEqual(restored.count, features.count)
+            self.assertEqual(restored.amount_sum, features.amount_sum)
+            self.assertEqual(restored.last_seen, features.last_seen)
+            self.assertEqual(restored.locations, features.locations)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import random
+from datetime import datetime, timedelta
+from fraud_detection.fraud_rules.velocity_index import VelocityIndex
+from fraud_detection.fraud_rules.rule_based_detection import RuleBasedFraudDetection
+
+
+def make_transactions(count, cards, seed=7):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        {
+            'transaction_id': f'txn_{i}',
+            'amount': rng.randint(1, 20000),
+            'country': rng.choice(['United States', 'Iran', 'Canada']),
+            'card_number': f'card_{rng.randrange(cards)}',
+            'transaction_time': start + timedelta(minutes=rng.randrange(3 * 24 * 60)),
+            'status': rng.choice(['approved', 'approved', 'declined']),
+        }
+        for i in range(count)
+    ]
+
+
+class TestVelocityIndex(unittest.TestCase):
+
+    def test_window_counts_match_brute_force(self):
+        transactions = make_transactions(400, cards=5)
+        index = VelocityIndex(transactions)
+
+        for txn in transactions:
+            t = txn['transaction_time']
+            same_card = [o for o in transactions if o['card_number'] == txn['card_number']]
+            expected_count = sum(1 for o in same_card if t - timedelta(hours=1) <= o['transaction_time'] <= t)
+            expected_declines = sum(
+                1 for o in same_card
+                if o['status'] == 'declined' and t - timedelta(hours=24) <= o['transaction_time'] <= t
+            )
+            self.assertEqual(index.count_in_window(txn['card_number'], t, timedelta(hours=1)), expected_count)
+            self.assertEqual(index.declines_in_window(txn['card_number'], t, timedelta(hours=24)), expected_declines)
+
+    def test_unknown_card(self):
+        index = VelocityIndex([])
+        self.assertEqual(index.count_in_window('missing', datetime(2024, 1, 1), timedelta(hours=1)), 0)
+        self.assertEqual(index.declines_in_window('missing', datetime(2024, 1, 1), timedelta(hours=24)), 0)
+
+    def test_later_transactions_do_not_count(self):
+        start = datetime(2024, 1, 1, 12, 0)
+        transactions = [
+            {'transaction_id': f'txn_{i}', 'amount': 10, 'country': 'Canada', 'card_number': 'card_1',
+             'transaction_time': start + timedelta(minutes=i), 'status': 'approved'}
+            for i in range(7)
+        ]
+        detector = RuleBasedFraudDetection(transactions)
+        flagged = {t['transaction_id'] for t in detector.detect_fraud()}
+        # Only the 6th and 7th transactions have more than 5 transactions in their trailing hour
+        self.assertEqual(flagged, {'txn_5', 'txn_6'})
+
+
+if __name__ == '__main__':
+    unittest.main()